@@ -0,0 +1,460 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+asyncio driver for the 23IOXX modules
+
+Notes:
+    The serial port is read without blocking through the event loop, the file descriptor of the pyserial port is watched with loop.add_reader so no thread or executor is needed. This needs a POSIX serial port, on Windows use ModbusDIO with a thread.
+    Frames are built and checked by the same ModbusFrameCodec and ModbusFrameReader as ModbusDIO and the model logic is the shared functions in eletech23iod.py.
+    Input changes are read from the async iterator inputchanges() instead of a callback.
+'''
+
+import asyncio
+from busTiming import BusTiming, SPIN_THRESHOLD_NS
+from ioState import IOStateStore, setbitnumbers
+from moduleHealth import ModuleHealth, ModuleQuarantinedException, QUARANTINED, DEFAULT_FAILURE_THRESHOLD, DEFAULT_INITIAL_BACKOFF, DEFAULT_MAXIMUM_BACKOFF
+from modbusFrameCodec import FUNCTIONCODES, ChecksumMismatchException, ModbusExceptionResponseException, ModbusTimeoutException, ModbusFrameCodec, ModbusFrameReader
+from eletech23iod import BAUDRATES, MODELS, MODEL_INPUTPOLLMODES, MODEL_WRITEMULTIPLEREGISTERS, INPUTPOLLMODES, TRANSACTION_EXCEPTIONS, ModbusModuleNotFoundException, openserial, baudratesearchorder, modelnumberinputoutputs, outputregisters, alloutputs, outputsfromlist, outputsfromhexstr, inputpollrequests, decodeinputvalues, inputchanges
+
+
+class AsyncSerialTransport():
+    def __init__(self, port, bustiming=None, ):
+        '''
+        One serial port shared by every module on the bus, transactions are run one at a time in the order they were asked for
+        '''
+        self.__port__ = port
+        self.__bustiming__ = bustiming
+        if self.__bustiming__ is None:
+            self.__bustiming__ = BusTiming()
+        self.__serial__ = None
+        self.__lock__ = asyncio.Lock()
+
+    @property
+    def bustiming(self):
+        return self.__bustiming__
+
+    def close(self):
+        if self.__serial__ is not None:
+            self.__serial__.close()
+            self.__serial__ = None
+
+    def __open__(self, baudrate):
+        if self.__serial__ is None:
+            self.__serial__ = openserial(self.__port__, baudrate, self.__bustiming__, timeout=0)
+        elif self.__serial__.baudrate != baudrate:
+            self.__serial__.baudrate = baudrate
+        return self.__serial__
+
+    async def send(self, baudrate, data):
+        '''
+        Send a frame that has no response
+        '''
+        async with self.__lock__:
+            serialport = self.__open__(baudrate)
+            await self.__waitforsilence__()
+            serialport.write(data)
+            self.__bustiming__.markactivity(baudrate)
+
+    async def __waitforsilence__(self):
+        '''
+        The event loop only wakes to the millisecond so any gap longer than that is slept and the last part is spun by BusTiming, at 115200 baud the whole gap is about 300 microseconds
+        '''
+        remaining = self.__bustiming__.remaining()
+        if remaining > SPIN_THRESHOLD_NS:
+            await asyncio.sleep((remaining - SPIN_THRESHOLD_NS) / 1000000000)
+        self.__bustiming__.waitforsilence()
+
+    async def transaction(self, codec, reader, baudrate, functioncode, address, value):
+        '''
+        Send one request and return the response as soon as it has fully arrived, the same as eletech23iod.transaction
+        '''
+        async with self.__lock__:
+            serialport = self.__open__(baudrate)
+            loop = asyncio.get_running_loop()
+
+            reader.clear()
+            if serialport.in_waiting > 0:
+                reader.discardedbytes += len(serialport.read(serialport.in_waiting))
+
+            data = codec.encode( functioncode, address, value )
+            timeout = self.__bustiming__.responsetimeout(baudrate, len(data), codec.responselength(functioncode, value))
+            code = FUNCTIONCODES[functioncode]
+            response = loop.create_future()
+
+            def readable():
+                reader.feed(serialport.read(max(1, serialport.in_waiting)))
+                frame = reader.frame(code)
+                if frame is not None and not response.done():
+                    response.set_result(frame)
+
+            await self.__waitforsilence__()
+            loop.add_reader(serialport.fileno(), readable)
+            try:
+                serialport.write(data)
+                x = await asyncio.wait_for(response, timeout)
+            except asyncio.TimeoutError:
+                raise(ModbusTimeoutException(f'''No complete response to function code {code} from Modbus address {codec.modbusaddress}'''))
+            finally:
+                loop.remove_reader(serialport.fileno())
+                self.__bustiming__.markactivity(baudrate)
+
+        if codec.isexception(x):
+            raise(ModbusExceptionResponseException(f'''Modbus address {codec.modbusaddress} replied to function code {functioncode} with exception code {x[2]}'''))
+        return x
+
+
+class AsyncModbusDIO():
+    def __init__(self, port, desiredbaudrate=115200, modbusaddress=1, inputpollmode=None, bustiming=None, baudratehint=None, transport=None, ):
+        '''
+        Call await connect() before using the module.
+        port is ignored when an AsyncSerialTransport shared with other modules is passed as transport.
+        '''
+        if inputpollmode is not None and inputpollmode not in INPUTPOLLMODES:
+            raise ValueError(f'''Unknown input poll mode {inputpollmode} expected one of {INPUTPOLLMODES}''')
+
+        self.__port__ = port
+        self.__desiredbaudrate__ = desiredbaudrate
+        self.__baudratehint__ = baudratehint
+        self.__modbusaddress__ = modbusaddress
+        self.__codec__ = ModbusFrameCodec(modbusaddress)
+        self.__reader__ = ModbusFrameReader(modbusaddress)
+        self.__transport__ = transport
+        if self.__transport__ is None:
+            self.__transport__ = AsyncSerialTransport(port, bustiming)
+        self.__model__ = None
+        self.__baudrate__ = None
+        self.__numberinputoutputs__ = None
+        self.__inputpollmode__ = inputpollmode
+        self.__writemultipleregisters__ = None
+        self.__inputs__ = None
+        self.__outputs__ = None
+        self.__subscribers__ = []
+
+    async def connect(self):
+        for baudrate in baudratesearchorder(self.__desiredbaudrate__, self.__baudratehint__):
+            model = await self.__probemodel__(baudrate)
+            if model in MODELS:
+                self.__model__ = model
+                self.__baudrate__ = baudrate
+                break
+        if self.__model__ is None:
+            raise(ModbusModuleNotFoundException(f'''No module found at Modbus address {self.__modbusaddress__} on {self.__port__}'''))
+        if self.__baudrate__ != self.__desiredbaudrate__ and self.__desiredbaudrate__ in BAUDRATES:
+            await self.__transport__.send(self.__baudrate__, self.__codec__.encode( 'WRITE_SPECIAL_FUNCTION', 0x00fe, BAUDRATES.index(self.__desiredbaudrate__) ))
+
+        self.__numberinputoutputs__ = modelnumberinputoutputs(self.__model__)
+        if self.__inputpollmode__ is None:
+            self.__inputpollmode__ = MODEL_INPUTPOLLMODES[self.__model__]
+        self.__writemultipleregisters__ = MODEL_WRITEMULTIPLEREGISTERS[self.__model__]
+
+        self.__inputs__ = IOStateStore(self.__numberinputoutputs__)
+        self.__outputs__ = IOStateStore(self.__numberinputoutputs__)
+        return self
+
+    def close(self):
+        self.__transport__.close()
+
+    async def __probemodel__(self, baudrate):
+        try:
+            modelresponse = await self.__transport__.transaction( self.__codec__, self.__reader__, baudrate, 'READ_SPECIAL_FUNCTION', 0x00f7, 0x0001 )
+            return self.__codec__.decoderegister(modelresponse)
+        except (ChecksumMismatchException, ModbusTimeoutException, ModbusExceptionResponseException):
+            return 0
+
+    async def __transaction__(self, functioncode, address, value):
+        return await self.__transport__.transaction( self.__codec__, self.__reader__, self.__baudrate__, functioncode, address, value )
+
+
+    @property
+    def numberinputoutputs(self):
+        return self.__numberinputoutputs__
+
+    @property
+    def model(self):
+        return self.__model__
+
+    @property
+    def baudrate(self):
+        return self.__baudrate__
+
+    @property
+    def modbusaddress(self):
+        return self.__modbusaddress__
+
+    @property
+    def inputpollmode(self):
+        return self.__inputpollmode__
+
+
+    def inputchanges(self):
+        '''
+        Async iterator of (modbusaddress, input, state) for every input that changes after it is made, each iterator gets every change
+        '''
+        queue = asyncio.Queue()
+        self.subscribe(queue)
+        return self.__iteratequeue__(queue)
+
+    async def __iteratequeue__(self, queue):
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.unsubscribe(queue)
+
+    def subscribe(self, queue):
+        '''
+        Put the input changes on queue, for collecting the changes of several modules in one place
+        '''
+        self.__subscribers__.append(queue)
+
+    def unsubscribe(self, queue):
+        if queue in self.__subscribers__:
+            self.__subscribers__.remove(queue)
+
+    def __publish__(self, bitsgonehigh, bitsgonelow):
+        if len(self.__subscribers__) == 0:
+            return None
+        for i in setbitnumbers(bitsgonehigh):
+            for queue in self.__subscribers__:
+                queue.put_nowait( (self.__modbusaddress__, i, True) )
+        for i in setbitnumbers(bitsgonelow):
+            for queue in self.__subscribers__:
+                queue.put_nowait( (self.__modbusaddress__, i, False) )
+
+    async def pollreadinputs(self):
+        '''
+        Read the inputs and queue any changes, returns False when the module did not give a valid response
+        '''
+        try:
+            responses = []
+            for functioncode, address, value in inputpollrequests(self.__model__, self.__inputpollmode__):
+                responses.append( await self.__transaction__( functioncode, address, value ) )
+        except TRANSACTION_EXCEPTIONS:
+            return False
+
+        bitsgonehigh, bitsgonelow = inputchanges(self.__inputs__, decodeinputvalues(self.__codec__, self.__inputpollmode__, responses))
+        self.__publish__(bitsgonehigh, bitsgonelow)
+        return True
+
+    async def updateOutput(self,output,value):
+        if isinstance(value,str):
+            if value.upper() == 'TOGGLE':
+                value = not self.__outputs__.value(output)
+
+        self.__outputs__.set(output, value)
+
+        if value == True:
+            value = 0xFF00
+        else:
+            value = 0x0000
+        await self.__transaction__( 'WRITE_DO', output, value )
+
+    async def __writeoutputregisters__(self, outputs):
+        registers = outputregisters(self.__model__, outputs)
+
+        if self.__writemultipleregisters__:
+            try:
+                await self.__transaction__( 'WRITE_MULTIPLE_SPECIAL_FUNCTION', 0x0080, registers )
+                return None
+            except ModbusExceptionResponseException:
+                self.__writemultipleregisters__ = False
+
+        for i, register in enumerate(registers):
+            await self.__transaction__( 'WRITE_SPECIAL_FUNCTION', 0x0080 + i, register )
+
+    async def updateOutputs(self,value):
+        bits = alloutputs(self.__model__, value)
+        self.__outputs__.update(bits)
+        await self.__writeoutputregisters__(bits)
+
+    async def updateOutputsByList(self,outputlist):
+        bits = outputsfromlist(outputlist, self.__numberinputoutputs__)
+        self.__outputs__.update(bits)
+        await self.__writeoutputregisters__(bits)
+
+    async def updateOutputsByHexStr(self,hexStr, outputValue=True, keepCurrent=False, ):
+        value = outputsfromhexstr(hexStr, self.__outputs__.values, self.__numberinputoutputs__, outputValue=outputValue, keepCurrent=keepCurrent)
+        if value is None:
+            return None
+        self.__outputs__.update(value)
+        await self.__writeoutputregisters__(value)
+
+    def getInput(self, inputnumber):
+        if inputnumber < self.__numberinputoutputs__ and inputnumber >= 0:
+            return self.__inputs__.get(inputnumber)
+
+    def getInputs(self, inputnumbers=None):
+        if inputnumbers is None:
+            return self.__inputs__.getall()
+        if isinstance(inputnumbers,list):
+            return [ self.getInput(inputnumber) for inputnumber in inputnumbers ]
+        if isinstance(inputnumbers, int):
+            return self.getInput(inputnumbers)
+
+    def getOutputs(self, outputnumbers=None):
+        if outputnumbers is None:
+            return self.__outputs__.getall()
+        if isinstance(outputnumbers,list):
+            return [ self.__outputs__.get(outputnumber) for outputnumber in outputnumbers ]
+        if isinstance(outputnumbers, int):
+            return self.__outputs__.get(outputnumbers)
+
+
+class AsyncMultipleModuleManager():
+    def __init__(self, port, desiredbaudrate=115200, modbusaddresses=[], intermoduledelay=None, inputpollmode=None, failurethreshold=DEFAULT_FAILURE_THRESHOLD, initialbackoff=DEFAULT_INITIAL_BACKOFF, maximumbackoff=DEFAULT_MAXIMUM_BACKOFF, ):
+        '''
+        Call await connect() before using the modules. All modules share one AsyncSerialTransport, a write asked for during a poll sweep goes out after the poll in progress.
+        Modules are quarantined after failurethreshold failed polls in a row the same as MultipleModuleManager, writes to a quarantined module fail with ModuleQuarantinedException.
+        '''
+        if intermoduledelay is None:
+            intermoduledelay = 0
+        self.__port__ = port
+        self.__desiredbaudrate__ = desiredbaudrate
+        self.__modbusaddresses__ = list(modbusaddresses)
+        self.__inputpollmode__ = inputpollmode
+        self.__transport__ = AsyncSerialTransport(port, BusTiming(minimuminterframedelay=intermoduledelay))
+        self.__modules__ = {}
+        self.__health__ = {}
+        self.__healthsettings__ = (failurethreshold, initialbackoff, maximumbackoff)
+        self.__subscribers__ = []
+
+    async def connect(self):
+        for modbusaddress in self.__modbusaddresses__:
+            module = AsyncModbusDIO(self.__port__, desiredbaudrate=self.__desiredbaudrate__, modbusaddress=modbusaddress, inputpollmode=self.__inputpollmode__, transport=self.__transport__)
+            await module.connect()
+            self.__modules__[modbusaddress] = module
+            self.__health__[modbusaddress] = ModuleHealth(*self.__healthsettings__)
+            for queue in self.__subscribers__:
+                module.subscribe(queue)
+        return self
+
+    def close(self):
+        self.__transport__.close()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def inputchanges(self):
+        '''
+        Async iterator of (modbusaddress, input, state) for every input of every module that changes after it is made
+        '''
+        queue = asyncio.Queue()
+        self.__subscribers__.append(queue)
+        for module in self.__modules__.values():
+            module.subscribe(queue)
+        return self.__iteratequeue__(queue)
+
+    async def __iteratequeue__(self, queue):
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self.__subscribers__.remove(queue)
+            for module in self.__modules__.values():
+                module.unsubscribe(queue)
+
+    def getModbusAddresses( self, ):
+        return list(self.__modules__.keys())
+
+    def getModuleHealths(self):
+        return {modbusaddress: health.state for modbusaddress, health in self.__health__.items()}
+
+    async def __pollmodule__(self, modbusaddress, now):
+        health = self.__health__[modbusaddress]
+        if not health.shouldpoll(now):
+            return None
+        if await self.__modules__[modbusaddress].pollreadinputs():
+            health.recordsuccess()
+        else:
+            health.recordfailure(now)
+
+    async def pollReadInputs(self,modbusaddress=None):
+        now = asyncio.get_running_loop().time()
+        if modbusaddress is None:
+            for module in list(self.__modules__):
+                await self.__pollmodule__(module, now)
+            return None
+        if modbusaddress in self.__modules__:
+            await self.__pollmodule__(modbusaddress, now)
+
+    async def __writemodules__(self, modbusaddress, method, *args, **kwargs):
+        '''
+        Run a write on each module, the healthy modules are written before ModuleQuarantinedException is raised for any that are quarantined
+        '''
+        if modbusaddress is None:
+            modbusaddresses = list(self.__modules__)
+        elif modbusaddress in self.__modules__:
+            modbusaddresses = [ modbusaddress ]
+        else:
+            return None
+        quarantined = []
+        for address in modbusaddresses:
+            health = self.__health__[address]
+            if health.state == QUARANTINED:
+                quarantined.append(address)
+                continue
+            try:
+                await method(self.__modules__[address], *args, **kwargs)
+            except TRANSACTION_EXCEPTIONS:
+                health.recordfailure()
+                raise
+            health.recordsuccess()
+        if quarantined:
+            raise ModuleQuarantinedException(f'Module {", ".join(str(address) for address in quarantined)} is quarantined, write not sent')
+
+    async def updateOutput(self,modbusaddress,output,value):
+        if modbusaddress is None:
+            return None
+        await self.__writemodules__(modbusaddress, AsyncModbusDIO.updateOutput, output, value)
+
+    async def updateOutputs(self, modbusaddress, value):
+        await self.__writemodules__(modbusaddress, AsyncModbusDIO.updateOutputs, value)
+
+    async def updateOutputsByList(self, modbusaddress, valueList):
+        await self.__writemodules__(modbusaddress, AsyncModbusDIO.updateOutputsByList, valueList)
+
+    async def updateOutputsByHexStr(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False,):
+        await self.__writemodules__(modbusaddress, AsyncModbusDIO.updateOutputsByHexStr, hexStr, outputValue=outputValue, keepCurrent=keepCurrent)
+
+    def getInput(self, modbusaddress, inputnumber):
+        if modbusaddress not in self.__modules__:
+            return None
+        return self.__modules__[modbusaddress].getInput(inputnumber)
+
+    def getInputs(self, modbusaddress, inputnumbers=None):
+        if modbusaddress not in self.__modules__:
+            return None
+        return self.__modules__[modbusaddress].getInputs(inputnumbers)
+
+    def getOutputs(self, modbusaddress, outputnumbers=None):
+        if modbusaddress not in self.__modules__:
+            return None
+        return self.__modules__[modbusaddress].getOutputs(outputnumbers)
@@ -0,0 +1,250 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Priority scheduler for the transactions on one RS485 bus
+
+Notes:
+    Only one transaction can be on the bus at a time so every poll and write for a port is queued here and run highest priority first.
+    Output writes asked for by a user are run before scheduled writes, then input polls, then diagnostics such as probes of quarantined modules.
+    A transaction that has not started by its deadline is dropped instead of being run late.
+    With start() a worker thread owns the port and runs the queue, transactions can then be submitted from any thread.
+'''
+
+import heapq
+import itertools
+import time
+import threading
+from concurrent.futures import Future
+
+
+PRIORITY_OUTPUT = 0
+PRIORITY_SCHEDULED = 1
+PRIORITY_POLL = 2
+PRIORITY_DIAGNOSTIC = 3
+
+PRIORITIES = {
+                PRIORITY_OUTPUT:        'OUTPUT',
+                PRIORITY_SCHEDULED:     'SCHEDULED',
+                PRIORITY_POLL:          'POLL',
+                PRIORITY_DIAGNOSTIC:    'DIAGNOSTIC',
+            }
+
+
+class BusDeadlineExpiredException(Exception):
+    pass
+
+
+def gatherfutures(futures):
+    '''
+    A Future of the list of results of futures, it raises the first exception of any of them
+    '''
+    gathered = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(future):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+        try:
+            gathered.set_result([future.result() for future in futures])
+        except BaseException as exception:
+            gathered.set_exception(exception)
+
+    if not futures:
+        gathered.set_result([])
+    for future in futures:
+        future.add_done_callback(done)
+    return gathered
+
+
+class BusTransaction():
+    __slots__ = ('priority', 'deadline', 'function', 'args', 'kwargs', 'future', 'submittedns', )
+
+    def __init__(self, priority, deadline, function, args, kwargs, ):
+        self.priority = priority
+        self.deadline = deadline
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.submittedns = time.monotonic_ns()
+
+
+class BusScheduler():
+    def __init__(self, betweencallback=None, ):
+        '''
+        betweencallback() is called by runpending() between transactions, a single threaded caller can use it to service MQTT so that output commands go out between polls instead of after a whole poll sweep.
+        It is not called by runnext() or rununtil() so a write made from inside it does not call it again.
+        '''
+        self.__queue__ = []
+        self.__sequence__ = itertools.count()
+        self.__betweencallback__ = betweencallback
+        self.__condition__ = threading.Condition()
+        self.__worker__ = None
+        self.__stopping__ = False
+
+        self.maximumdepth = 0
+        self.submitted = dict.fromkeys(PRIORITIES, 0)
+        self.completed = dict.fromkeys(PRIORITIES, 0)
+        self.expired = dict.fromkeys(PRIORITIES, 0)
+        self.waitedns = dict.fromkeys(PRIORITIES, 0)
+        self.maximumwaitns = dict.fromkeys(PRIORITIES, 0)
+
+    def __workerloop__(self):
+        while True:
+            with self.__condition__:
+                while not self.__queue__ and not self.__stopping__:
+                    self.__condition__.wait()
+                if not self.__queue__:
+                    return
+            self.runnext()
+
+    def start(self, name='BusScheduler'):
+        '''
+        Start a worker thread that runs the queue
+        '''
+        if self.__worker__ is not None:
+            return
+        self.__stopping__ = False
+        self.__worker__ = threading.Thread(target=self.__workerloop__, name=name, daemon=True)
+        self.__worker__.start()
+
+    def stop(self, timeout=None):
+        '''
+        Stop the worker thread once the queue is empty
+        '''
+        if self.__worker__ is None:
+            return
+        with self.__condition__:
+            self.__stopping__ = True
+            self.__condition__.notify_all()
+        self.__worker__.join(timeout)
+        self.__worker__ = None
+
+    @property
+    def running(self):
+        return self.__worker__ is not None
+
+    def isworkerthread(self):
+        return self.__worker__ is not None and threading.current_thread() is self.__worker__
+
+    def __len__(self):
+        return len(self.__queue__)
+
+    @property
+    def depth(self):
+        return len(self.__queue__)
+
+    def submit(self, function, *args, priority=PRIORITY_POLL, deadline=None, **kwargs):
+        '''
+        Queue function(*args, **kwargs) and return a concurrent.futures.Future of its result
+        deadline is a time.monotonic() after which the transaction is dropped if it has not started
+        '''
+        transaction = BusTransaction(priority, deadline, function, args, kwargs)
+        with self.__condition__:
+            heapq.heappush(self.__queue__, (priority, next(self.__sequence__), transaction))
+            self.submitted[priority] += 1
+            if len(self.__queue__) > self.maximumdepth:
+                self.maximumdepth = len(self.__queue__)
+            self.__condition__.notify()
+        return transaction.future
+
+    def runnext(self):
+        '''
+        Run the highest priority transaction, returns False when there was nothing queued
+        '''
+        with self.__condition__:
+            if not self.__queue__:
+                return False
+            priority, sequence, transaction = heapq.heappop(self.__queue__)
+
+        if transaction.deadline is not None and time.monotonic() > transaction.deadline:
+            self.expired[priority] += 1
+            transaction.future.set_exception(BusDeadlineExpiredException(f'''{PRIORITIES[priority]} transaction not started by its deadline'''))
+            return True
+
+        if not transaction.future.set_running_or_notify_cancel():
+            return True
+
+        waitedns = time.monotonic_ns() - transaction.submittedns
+        self.waitedns[priority] += waitedns
+        if waitedns > self.maximumwaitns[priority]:
+            self.maximumwaitns[priority] = waitedns
+
+        try:
+            result = transaction.function(*transaction.args, **transaction.kwargs)
+        except Exception as exception:
+            transaction.future.set_exception(exception)
+        else:
+            transaction.future.set_result(result)
+        self.completed[priority] += 1
+        return True
+
+    def runpending(self):
+        while self.runnext():
+            if self.__betweencallback__ is not None and self.__queue__:
+                self.__betweencallback__()
+
+    def rununtil(self, future):
+        '''
+        Run transactions until future is done
+        '''
+        while not future.done():
+            if not self.runnext():
+                break
+
+    def wait(self, future):
+        '''
+        Return the result of future, the queue is run on this thread unless the worker thread is running it
+        '''
+        if self.__worker__ is not None and not self.isworkerthread():
+            return future.result()
+        self.rununtil(future)
+        return future.result()
+
+    def stats(self):
+        '''
+        Queue depth and per priority counts and wait times in milliseconds
+        '''
+        priorities = {}
+        for priority, name in PRIORITIES.items():
+            started = self.completed[priority]
+            priorities[name] = {
+                                'submitted':        self.submitted[priority],
+                                'completed':        started,
+                                'expired':          self.expired[priority],
+                                'meanwait':         self.waitedns[priority] / started / 1e6 if started else 0.0,
+                                'maximumwait':      self.maximumwaitns[priority] / 1e6,
+                                }
+        return {
+                'depth':            len(self.__queue__),
+                'maximumdepth':     self.maximumdepth,
+                'priorities':       priorities,
+                }
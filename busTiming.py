@@ -0,0 +1,121 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+RS485 bus timing
+
+Notes:
+    Modbus RTU frames must be separated by at least 3.5 character times of silence, one character being 10 bits (start, 8 data, stop) on an 8N1 line.
+    At 115200 baud that is about 300 microseconds so the gap is waited out with a short sleep followed by a spin on time.monotonic_ns() for the last part, time.sleep() alone overshoots by far more than the gap.
+    One BusTiming object is shared by every module on a bus so the gap is honoured whichever module is addressed next.
+'''
+
+import time
+
+
+BITS_PER_CHARACTER = 10
+
+'''
+Silence in characters required between Modbus RTU frames
+'''
+INTERFRAME_CHARACTERS = 3.5
+
+'''
+Time allowed for a module to start replying once it has received a request, on top of the time the frames take on the line
+'''
+DEFAULT_TURNAROUND_TIME = 0.05
+
+'''
+Waits longer than this are slept, the remainder is spun
+'''
+SPIN_THRESHOLD_NS = 1000000
+
+
+def charactertime(baudrate):
+    return BITS_PER_CHARACTER / baudrate
+
+def frametime(baudrate, length):
+    return length * charactertime(baudrate)
+
+
+class BusTiming():
+    def __init__(self, turnaroundtime=DEFAULT_TURNAROUND_TIME, minimuminterframedelay=0, ):
+        '''
+        turnaroundtime is in seconds and minimuminterframedelay is in microseconds, the larger of minimuminterframedelay and 3.5 character times is used as the gap between frames
+        '''
+        self.__turnaroundtime__ = turnaroundtime
+        self.__minimuminterframedelay__ = minimuminterframedelay * 1000
+        self.__lastactivity__ = 0
+        self.__requiredgap__ = 0
+
+        self.waits = 0
+        self.waitedns = 0
+
+    @property
+    def turnaroundtime(self):
+        return self.__turnaroundtime__
+
+    def interframedelay(self, baudrate):
+        '''
+        Required silence between frames in nanoseconds
+        '''
+        return max(int(INTERFRAME_CHARACTERS * charactertime(baudrate) * 1000000000), self.__minimuminterframedelay__)
+
+    def responsetimeout(self, baudrate, requestlength, responselength):
+        '''
+        Seconds from starting to send a request until the whole response should have arrived
+        '''
+        return frametime(baudrate, requestlength + responselength) + self.__turnaroundtime__
+
+    def markactivity(self, baudrate):
+        '''
+        Record that a frame has just finished on the line
+        '''
+        self.__lastactivity__ = time.monotonic_ns()
+        self.__requiredgap__ = self.interframedelay(baudrate)
+
+    def remaining(self):
+        '''
+        Nanoseconds of silence still needed before the next frame can be sent
+        '''
+        return self.__lastactivity__ + self.__requiredgap__ - time.monotonic_ns()
+
+    def waitforsilence(self):
+        '''
+        Wait only for whatever is left of the inter frame gap
+        '''
+        remaining = self.remaining()
+        if remaining <= 0:
+            return None
+
+        self.waits += 1
+        self.waitedns += remaining
+        deadline = time.monotonic_ns() + remaining
+        if remaining > SPIN_THRESHOLD_NS:
+            time.sleep((remaining - SPIN_THRESHOLD_NS) / 1000000000)
+        while time.monotonic_ns() < deadline:
+            pass
@@ -0,0 +1,141 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Cached JSON of the device status
+
+Notes:
+    A dashboard polling the device status every second asks for the same state over and over, while most modules have not changed in between.
+    DeviceStatusCache keeps the JSON of every module together with the published snapshot it was encoded from. A snapshot is never changed once published, so a module whose snapshot is the same object as last time has not changed and its JSON is used again. Only the modules polled or written to since the last request are encoded again, and a request for everything when no module changed is answered with the JSON built last time.
+    The JSON of each input and output is kept apart as well, so a request for some modules, inputs or outputs joins the cached pieces without encoding anything.
+    Each input and output is {"number": 0, "value": true, "lastChanged": "2024-01-01T00:00:00.000000Z+0000"} and each module {"modbusAddress": 1, "inputs": [...], "outputs": [...]}.
+'''
+
+import threading
+from json.encoder import encode_basestring
+
+
+def iostatus(states):
+    '''
+    JSON of each input or output of an IOStateSnapshot, in order of number
+    '''
+    encoded = []
+    for number in range(0, len(states)):
+        state = states.get(number)
+        encoded.append(f'''{{"number": {number}, "value": {'true' if state['value'] else 'false'}, "lastChanged": {encode_basestring(state['lastchangestr'])}}}''')
+    return encoded
+
+
+def selectstatus(encoded, numbers):
+    '''
+    numbers is None for every input or output, a number or a list of numbers, numbers out of range are left out
+    '''
+    if numbers is None:
+        return encoded
+    if not isinstance(numbers, list):
+        numbers = [numbers]
+    return [encoded[number] for number in numbers if isinstance(number, int) and 0 <= number < len(encoded)]
+
+
+class ModuleStatus():
+    __slots__ = ('snapshot', 'inputs', 'outputs', 'json', )
+
+    def __init__(self, modbusaddress, snapshot, previous=None):
+        self.snapshot = snapshot
+        if snapshot is None:
+            self.inputs = []
+            self.outputs = []
+        else:
+            '''
+            A write publishes new outputs with the same inputs and a poll new inputs with the same outputs
+            '''
+            if previous is not None and previous.snapshot is not None and previous.snapshot['inputs'] is snapshot['inputs']:
+                self.inputs = previous.inputs
+            else:
+                self.inputs = iostatus(snapshot['inputs'])
+            if previous is not None and previous.snapshot is not None and previous.snapshot['outputs'] is snapshot['outputs']:
+                self.outputs = previous.outputs
+            else:
+                self.outputs = iostatus(snapshot['outputs'])
+        self.json = modulestatus(modbusaddress, self.inputs, self.outputs)
+
+
+def modulestatus(modbusaddress, inputs, outputs):
+    return f'''{{"modbusAddress": {int(modbusaddress)}, "inputs": [{', '.join(inputs)}], "outputs": [{', '.join(outputs)}]}}'''
+
+
+class DeviceStatusCache():
+    def __init__(self, ):
+        self.__modules__ = {}
+        self.__cached__ = None
+        self.__cachedfrom__ = None
+        self.__lock__ = threading.Lock()
+
+        self.requests = 0
+        self.encoded = 0
+
+    def __modulestatus__(self, modbusaddress, snapshot):
+        status = self.__modules__.get(modbusaddress)
+        if status is None or status.snapshot is not snapshot:
+            status = ModuleStatus(modbusaddress, snapshot, status)
+            self.__modules__[modbusaddress] = status
+            self.encoded += 1
+        return status
+
+    def modules(self, snapshots, modbusaddresses, inputnumbers=None, outputnumbers=None):
+        '''
+        JSON list of the status of modbusaddresses, snapshots is getSnapshots() of the manager
+        inputnumbers and outputnumbers are None for all, a number or a list of numbers
+        '''
+        with self.__lock__:
+            self.requests += 1
+            unfiltered = inputnumbers is None and outputnumbers is None
+            current = [(modbusaddress, snapshots.get(modbusaddress)) for modbusaddress in modbusaddresses]
+            if unfiltered and self.__cachedfrom__ is not None and len(current) == len(self.__cachedfrom__) and all(modbusaddress == cachedaddress and snapshot is cached for (modbusaddress, snapshot), (cachedaddress, cached) in zip(current, self.__cachedfrom__)):
+                return self.__cached__
+
+            encoded = []
+            for modbusaddress, snapshot in current:
+                status = self.__modulestatus__(modbusaddress, snapshot)
+                if unfiltered:
+                    encoded.append(status.json)
+                else:
+                    encoded.append(modulestatus(modbusaddress, selectstatus(status.inputs, inputnumbers), selectstatus(status.outputs, outputnumbers)))
+            result = f'''[{', '.join(encoded)}]'''
+
+            if unfiltered:
+                self.__cached__ = result
+                self.__cachedfrom__ = current
+            return result
+
+    def stats(self):
+        with self.__lock__:
+            return {
+                    'requests': self.requests,
+                    'encoded':  self.encoded,
+                    'modules':  len(self.__modules__),
+                    }
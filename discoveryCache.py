@@ -0,0 +1,94 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Persisted cache of the modules found on each serial port
+
+Notes:
+    The cache is a JSON file of {port: {modbusaddress: {"model": model, "baudrate": baudrate}}}.
+    It lets MultipleModuleManager try the baud rate a module answered at last time before searching, so a known bus starts with one model request per module.
+    MultiBusManager connects its buses on several threads sharing one cache, so changes and saves are made holding a lock.
+'''
+
+import json
+import os
+import threading
+
+
+class DiscoveryCache():
+    def __init__(self, path):
+        self.__path__ = path
+        self.__ports__ = {}
+        self.__dirty__ = False
+        self.__lock__ = threading.RLock()
+
+        try:
+            with open(path, 'r') as cachefile:
+                data = json.load(cachefile)
+            if isinstance(data, dict):
+                self.__ports__ = data
+        except (OSError, ValueError):
+            self.__ports__ = {}
+
+    @property
+    def path(self):
+        return self.__path__
+
+    def get(self, port, modbusaddress):
+        with self.__lock__:
+            return self.__ports__.get(port, {}).get(str(modbusaddress))
+
+    def getModbusAddresses(self, port):
+        with self.__lock__:
+            return sorted(int(modbusaddress) for modbusaddress in self.__ports__.get(port, {}))
+
+    def set(self, port, modbusaddress, model, baudrate):
+        entry = {'model': model, 'baudrate': baudrate}
+        with self.__lock__:
+            if self.get(port, modbusaddress) != entry:
+                self.__ports__.setdefault(port, {})[str(modbusaddress)] = entry
+                self.__dirty__ = True
+
+    def remove(self, port, modbusaddress):
+        with self.__lock__:
+            if self.__ports__.get(port, {}).pop(str(modbusaddress), None) is not None:
+                self.__dirty__ = True
+
+    def save(self):
+        '''
+        Write the cache if it has changed, via a temporary file so a crash never leaves a half written cache.
+        The temporary file is named after the process so bus worker processes saving at the same time do not write into the same file.
+        Threads of one process saving at the same time take turns on the lock.
+        '''
+        with self.__lock__:
+            if not self.__dirty__:
+                return None
+            temporarypath = f'''{self.__path__}.{os.getpid()}.tmp'''
+            with open(temporarypath, 'w') as cachefile:
+                json.dump(self.__ports__, cachefile, indent=4, sort_keys=True)
+            os.replace(temporarypath, self.__path__)
+            self.__dirty__ = False
@@ -48,158 +48,417 @@ Notes:
 import serial
 from serial import SerialException
 import time
-import datetime
 import sys
-from fastcrc import crc16
+from busTiming import BusTiming, frametime
+from ioState import IOStateStore, DATETIME_STRING_FORMAT, setbitnumbers
+from modbusFrameCodec import FUNCTIONCODES, ChecksumMismatchException, ModbusExceptionResponseException, ModbusTimeoutException, ModbusFrameCodec, ModbusFrameReader
 
 
 BAUDRATES = [1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200]
 MODELS = [2308, 2316, 2324, 2332, 2348]
-FUNCTIONCODES = {
-    'READ_DO': 0x01,
-    'READ_DI': 0x02,
-    'READ_SPECIAL_FUNCTION': 0x03,
-    'WRITE_DO': 0x05,
-    'WRITE_SPECIAL_FUNCTION': 0x06,
-    'WRITE_MULTIPLE_DO': 0x0F,
-    'WRITE_MULTIPLE_SPECIAL_FUNCTION': 0x10,
+
+'''
+Longest request (WRITE_MULTIPLE_SPECIAL_FUNCTION of three registers) and response (three registers or 48 inputs) sent to and from a module, used to size the serial timeout
+'''
+MAXIMUM_REQUEST_LENGTH = 15
+MAXIMUM_RESPONSE_LENGTH = 11
+
+'''
+Number of 16 bit input / output registers (0x0080-0x0082 and 0x0090-0x0092) used by each model
+'''
+MODEL_REGISTERS = {
+    2308: 1,
+    2316: 1,
+    2324: 2,
+    2332: 2,
+    2348: 3,
+}
+
+'''
+How pollreadinputs reads the inputs
+    SINGLE_REGISTER     one READ_SPECIAL_FUNCTION request per input register
+    MULTIPLE_REGISTERS  one READ_SPECIAL_FUNCTION request covering every input register of the model
+    READ_DI             one READ_DI request covering every input of the model
+'''
+INPUTPOLLMODES = ['SINGLE_REGISTER', 'MULTIPLE_REGISTERS', 'READ_DI']
+MODEL_INPUTPOLLMODES = {
+    2308: 'MULTIPLE_REGISTERS',
+    2316: 'MULTIPLE_REGISTERS',
+    2324: 'MULTIPLE_REGISTERS',
+    2332: 'MULTIPLE_REGISTERS',
+    2348: 'MULTIPLE_REGISTERS',
 }
-DATETIME_STRING_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ%z'
 
-class ChecksumMismatchException(Exception):
-    """Computed checksum does not match the checksum provided"""
+'''
+How pollreadoutputs reads the outputs back
+    SINGLE_REGISTER     one READ_SPECIAL_FUNCTION request per output register
+    MULTIPLE_REGISTERS  one READ_SPECIAL_FUNCTION request covering every output register of the model
+    READ_DO             one READ_DO request covering every output of the model
+'''
+OUTPUTPOLLMODES = ['SINGLE_REGISTER', 'MULTIPLE_REGISTERS', 'READ_DO']
+MODEL_OUTPUTPOLLMODES = {
+    2308: 'MULTIPLE_REGISTERS',
+    2316: 'MULTIPLE_REGISTERS',
+    2324: 'MULTIPLE_REGISTERS',
+    2332: 'MULTIPLE_REGISTERS',
+    2348: 'MULTIPLE_REGISTERS',
+}
+
+'''
+Models that accept WRITE_MULTIPLE_SPECIAL_FUNCTION for the output registers, others are written one register at a time
+'''
+MODEL_WRITEMULTIPLEREGISTERS = {
+    2308: True,
+    2316: True,
+    2324: True,
+    2332: True,
+    2348: True,
+}
+
+
+'''
+Addresses a 23IOXX module can be set to with its DIP switches and the turnaround allowed for each probe when scanning
+'''
+SCAN_ADDRESSES = range(0x01, 0x40)
+SCAN_TURNAROUND_TIME = 0.02
+PROBE_REQUEST_LENGTH = 8
+PROBE_RESPONSE_LENGTH = 7
+
+
+class ModbusModuleNotFoundException(Exception):
+    """No module answered at the Modbus address at any baud rate tried"""
+
+'''
+Exceptions a single request / response can fail with
+'''
+TRANSACTION_EXCEPTIONS = (SerialException, ChecksumMismatchException, ModbusTimeoutException, ModbusExceptionResponseException)
+
+
+def openserial(port, baudrate, bustiming, timeout=None):
+    '''
+    Open the port 8N1, by default the timeout allows for the longest request and response
+    '''
+    if timeout is None:
+        timeout = bustiming.responsetimeout(baudrate, MAXIMUM_REQUEST_LENGTH, MAXIMUM_RESPONSE_LENGTH)
+    return serial.Serial(
+        port=port,
+        baudrate=baudrate,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        bytesize=serial.EIGHTBITS,
+        timeout = timeout,
+    )
+
+def transaction(serialport, codec, reader, bustiming, functioncode, address, value):
+    '''
+    Send one request and return the response as soon as it has fully arrived.
+
+    Anything still sitting in the input buffer is left over from an earlier request so it is discarded before the request goes out.
+    '''
+    reader.clear()
+    if serialport.in_waiting > 0:
+        reader.discardedbytes += len(serialport.read(serialport.in_waiting))
+
+    data = codec.encode( functioncode, address, value )
+    timeout = bustiming.responsetimeout(serialport.baudrate, len(data), codec.responselength(functioncode, value))
+
+    bustiming.waitforsilence()
+    serialport.write(data)
+    try:
+        x = reader.read(serialport, functioncode, timeout)
+    finally:
+        bustiming.markactivity(serialport.baudrate)
+    if codec.isexception(x):
+        raise(ModbusExceptionResponseException(f'''Modbus address {codec.modbusaddress} replied to function code {functioncode} with exception code {x[2]}'''))
+    return x
+
+def probemodel(serialport, modbusaddress, bustiming):
+    '''
+    Ask the module at modbusaddress for its product ID, returns 0 when nothing valid comes back
+    '''
+    codec = ModbusFrameCodec(modbusaddress)
+    try:
+        modelresponse = transaction( serialport, codec, ModbusFrameReader(modbusaddress), bustiming, 'READ_SPECIAL_FUNCTION', 0x00f7, 0x0001 )
+        return codec.decoderegister(modelresponse)
+    except (ChecksumMismatchException, ModbusTimeoutException, ModbusExceptionResponseException):
+        return 0
+
+def scanBus(port, modbusaddresses=SCAN_ADDRESSES, baudrates=None, bustiming=None):
+    '''
+    Find the modules on a bus in one sweep, every address not yet found is probed once at each baud rate starting from the fastest.
+    Each probe waits up to the time of the request and response on the line plus the turnaround, so a full sweep of every address at every baud rate takes tens of seconds, mostly at the slowest baud rates. Pass fewer baudrates when the possible rates are known.
+
+    Returns {modbusaddress: {'model': model, 'baudrate': baudrate}} for every module that answered.
+    '''
+    if baudrates is None:
+        baudrates = list(reversed(BAUDRATES))
+    if bustiming is None:
+        bustiming = BusTiming(turnaroundtime=SCAN_TURNAROUND_TIME)
+
+    found = {}
+    for baudrate in baudrates:
+        remaining = [modbusaddress for modbusaddress in modbusaddresses if modbusaddress not in found]
+        if len(remaining) == 0:
+            break
+
+        serialport = openserial(port, baudrate, bustiming, timeout=bustiming.responsetimeout(baudrate, PROBE_REQUEST_LENGTH, PROBE_RESPONSE_LENGTH))
+        try:
+            for modbusaddress in remaining:
+                model = probemodel(serialport, modbusaddress, bustiming)
+                if model in MODELS:
+                    found[modbusaddress] = {'model': model, 'baudrate': baudrate}
+        finally:
+            serialport.close()
+    return found
+
+
+'''
+Model logic shared by ModbusDIO and AsyncModbusDIO, none of these touch the serial port
+'''
+def baudratesearchorder(desiredbaudrate, baudratehint=None):
+    '''
+    Baud rates to look for a module at in turn, baudratehint first then desiredbaudrate and each lower rate
+    '''
+    order = []
+    if baudratehint in BAUDRATES:
+        order.append(baudratehint)
+    for baudrate in reversed(BAUDRATES[:BAUDRATES.index(desiredbaudrate) + 1]):
+        if baudrate not in order:
+            order.append(baudrate)
+    return order
+
+def modelnumberinputoutputs(model):
+    return int(str(model)[-2:])
+
+def outputregisters(model, outputs):
+    '''
+    Split an int with output 0 in bit 0 into the values of the output registers of the model
+    '''
+    return [ (outputs >> (16 * i)) & 0xFFFF for i in range(0, MODEL_REGISTERS[model]) ]
+
+def alloutputs(model, value):
+    if value == True:
+        return (1 << (16 * MODEL_REGISTERS[model])) - 1
+    return 0
+
+def outputsfromlist(outputlist, numberinputoutputs):
+    '''
+    Convert list of bools to single int
+    '''
+    bits = 0
+    for count,item in enumerate(outputlist[0:numberinputoutputs]):
+        if item is False:
+            continue
+        bits = bits | (item << count)
+    return bits
+
+def outputsfromchanges(currentoutputs, changes):
+    '''
+    The outputs after applying [(output, value)] in order to currentoutputs, a value of 'TOGGLE' inverts the output as left by the changes before it
+    '''
+    bits = currentoutputs
+    for output, value in changes:
+        if isinstance(value,str) and value.upper() == 'TOGGLE':
+            value = (bits >> output) & 1 == 0
+        if value == True:
+            bits = bits | (1 << output)
+        else:
+            bits = bits & ~(1 << output)
+    return bits
+
+def outputsfromhexstr(hexStr, currentoutputs, numberinputoutputs, outputValue=True, keepCurrent=False, ):
+    '''
+    The outputs after applying hexStr to currentoutputs, None when hexStr is not valid
+    '''
+    allbits = (1 << max(32, numberinputoutputs)) - 1
+    bitwiseORMask = 0x0000000
+    outputMask = 0x0000000
+
+    if outputValue == True:
+        outputMask = allbits
+
+    try:
+        value = int(hexStr, 16)
+        if value > allbits:
+            return None
+    except ValueError:
+        return None
+
+    if keepCurrent == True:
+        bitwiseORMask = currentoutputs
+        bitwiseORMask = ((value & bitwiseORMask) ^ allbits) & bitwiseORMask
+  
+    return (value & outputMask)| bitwiseORMask
+
+def inputpollrequests(model, inputpollmode):
+    '''
+    The (functioncode, address, value) requests that read every input of the model
+    '''
+    numberregisters = MODEL_REGISTERS[model]
+    if inputpollmode == 'READ_DI':
+        return [ ('READ_DI', 0x0000, modelnumberinputoutputs(model)) ]
+    if inputpollmode == 'MULTIPLE_REGISTERS':
+        return [ ('READ_SPECIAL_FUNCTION', 0x0090, numberregisters) ]
+    return [ ('READ_SPECIAL_FUNCTION', 0x0090 + i, 0x0001) for i in range(0, numberregisters) ]
+
+def decodeinputvalues(codec, inputpollmode, responses):
+    '''
+    The inputs as a single int with input 0 in bit 0 from the responses to inputpollrequests
+    '''
+    if inputpollmode == 'READ_DI':
+        return codec.decodebits(responses[0])
+    if inputpollmode == 'MULTIPLE_REGISTERS':
+        return codec.decoderegisters(responses[0])
+    inputs = 0
+    for i, x in enumerate(responses):
+        inputs = inputs | (codec.decoderegister(x) << (16 * i))
+    return inputs
+
+def outputpollrequests(model, outputpollmode):
+    '''
+    The (functioncode, address, value) requests that read back every output of the model
+    '''
+    numberregisters = MODEL_REGISTERS[model]
+    if outputpollmode == 'READ_DO':
+        return [ ('READ_DO', 0x0000, modelnumberinputoutputs(model)) ]
+    if outputpollmode == 'MULTIPLE_REGISTERS':
+        return [ ('READ_SPECIAL_FUNCTION', 0x0080, numberregisters) ]
+    return [ ('READ_SPECIAL_FUNCTION', 0x0080 + i, 0x0001) for i in range(0, numberregisters) ]
+
+def decodeoutputvalues(codec, outputpollmode, responses):
+    '''
+    The outputs as a single int with output 0 in bit 0 from the responses to outputpollrequests
+    '''
+    if outputpollmode == 'READ_DO':
+        return codec.decodebits(responses[0])
+    return decodeinputvalues(codec, outputpollmode, responses)
+
+def inputchanges(store, inputs):
+    '''
+    Store a poll of the inputs, returns the bitmasks of the inputs that went high and low
+    '''
+    previousinputs = store.values
+    changed = store.update(inputs)
+    return changed & inputs, changed & previousinputs
 
 
 class ModbusDIO():
-    def __init__(self, port, desiredbaudrate=115200, modbusaddress=1, inputchangecallback=None):
+    def __init__(self, port, desiredbaudrate=115200, modbusaddress=1, inputchangecallback=None, inputpollmode=None, bustiming=None, inputschangecallback=None, baudratehint=None, reassertinterval=None, outputpollmode=None, outputchangecallback=None):
+        '''
+        baudratehint is a baud rate the module is expected to be at, such as one found by scanBus or held in a DiscoveryCache, it is tried before searching down from desiredbaudrate.
+        inputchangecallback(modbusaddress, input, state) is called for every input that changes.
+        inputschangecallback(modbusaddress, risingbits, fallingbits) is called once per poll that sees any change with the bitmasks of the inputs that went high and low.
+
+        Writes go through a shadow image of the output registers as last acknowledged by the module, a write that would not change it is skipped and a register write is narrowed to the registers that differ.
+        With reassertinterval in seconds a register whose shadow is older than that is written again even when it matches, see duereasserts.
+
+        pollreadoutputs reads the outputs back in outputpollmode, the output state and the shadow image follow what the module holds and outputchangecallback(modbusaddress, output, state) is called for every output found to differ from what it last acknowledged.
+        '''
+        if inputpollmode is not None and inputpollmode not in INPUTPOLLMODES:
+            raise ValueError(f'''Unknown input poll mode {inputpollmode} expected one of {INPUTPOLLMODES}''')
+        if outputpollmode is not None and outputpollmode not in OUTPUTPOLLMODES:
+            raise ValueError(f'''Unknown output poll mode {outputpollmode} expected one of {OUTPUTPOLLMODES}''')
+
         self.__port__ = port
         self.__modbusaddress__ = modbusaddress
+        self.__codec__ = ModbusFrameCodec(modbusaddress)
+        self.__reader__ = ModbusFrameReader(modbusaddress)
+        self.__bustiming__ = bustiming
+        if self.__bustiming__ is None:
+            self.__bustiming__ = BusTiming()
         self.__serial__ = None
         self.__model__ = None
         self.__baudrate__ = None
-        self.__inputvalues__ = 0
-        self.__inputs__ = []
-        self.__outputs__ = []
+        self.__inputs__ = None
+        self.__outputs__ = None
         self.__inputchangecallback__ = inputchangecallback
+        self.__inputschangecallback__ = inputschangecallback
+        self.__reassertinterval__ = reassertinterval
+        self.__outputchangecallback__ = outputchangecallback
 
-        self.__serialconnect__(desiredbaudrate)
+        '''
+        Shadow image of the outputs, only the bits set in __shadowknown__ have been acknowledged by the module
+        '''
+        self.__shadow__ = 0
+        self.__shadowknown__ = 0
+        self.__shadowat__ = []
+
+        self.writessent = 0
+        self.writesskipped = 0
+        self.writesnarrowed = 0
+        self.savedlinetime = 0.0
+        self.outputpolls = 0
+        self.outputdrifts = 0
+
+        for baudrate in baudratesearchorder(desiredbaudrate, baudratehint):
+            if self.__serialconnect__(baudrate):
+                break
+        if self.__model__ is None:
+            raise(ModbusModuleNotFoundException(f'''No module found at Modbus address {modbusaddress} on {port}'''))
         if self.__baudrate__ != desiredbaudrate:
             self.__setdefaultbaudrate__(desiredbaudrate)
 
-        self.__numberinputoutputs__ = int(str(self.__model__)[-2:])
+        self.__numberinputoutputs__ = modelnumberinputoutputs(self.__model__)
 
-        
-        for i in range(0,self.__numberinputoutputs__):
-            initialvalue = { 
-                            'number': i, 
-                            'lastchange': datetime.datetime.now(datetime.UTC),
-                            'lastOn': datetime.datetime.now(datetime.UTC),
-                            'lastOff': datetime.datetime.now(datetime.UTC),
-                            'lastchangestr': datetime.datetime.now(datetime.UTC).strftime(DATETIME_STRING_FORMAT), 
-                            'value': False, 
-                            }
-            self.__inputs__.append( initialvalue )
-            self.__outputs__.append( initialvalue )
+        self.__inputpollmode__ = inputpollmode
+        if self.__inputpollmode__ is None:
+            self.__inputpollmode__ = MODEL_INPUTPOLLMODES[self.__model__]
+        self.__outputpollmode__ = outputpollmode
+        if self.__outputpollmode__ is None:
+            self.__outputpollmode__ = MODEL_OUTPUTPOLLMODES[self.__model__]
+        self.__writemultipleregisters__ = MODEL_WRITEMULTIPLEREGISTERS[self.__model__]
+        self.__shadowat__ = [0.0] * MODEL_REGISTERS[self.__model__]
+
+        self.__inputs__ = IOStateStore(self.__numberinputoutputs__)
+        self.__outputs__ = IOStateStore(self.__numberinputoutputs__)
 
     def __str__(self):
         outstring = ''
         for i in range(0,self.__numberinputoutputs__):
-            outstring += f'''Input: {i} State: {self.__inputs__[i]['value']} LastChanged: {self.__inputs__[i]['lastchange']} Output: {i} State: {self.__outputs__[i]['value']} LastChanged: {self.__outputs__[i]['lastchange']}\n'''
+            inputstate = self.__inputs__.get(i)
+            outputstate = self.__outputs__.get(i)
+            outstring += f'''Input: {i} State: {inputstate['value']} LastChanged: {inputstate['lastchange']} Output: {i} State: {outputstate['value']} LastChanged: {outputstate['lastchange']}\n'''
 
         return outstring
     
-    def __appendModbusChecksum__(self, data):
-        checksum = crc16.modbus(data).to_bytes(2,'little')
-        return data + checksum
-
     def __validateModbusChecksum__(self,data):
-        if data is None:
-            return False
-        message = data[:-2]
-        checksum = data[-2:]
-        calculatedchecksum = crc16.modbus(message).to_bytes(2,'little')
-
-        if calculatedchecksum == checksum:
-            return True
-        
-        raise(ChecksumMismatchException(f'''CHECKSUM DOES NOT MATCH got: {checksum} expected {calculatedchecksum}'''))
-        return False
+        return self.__codec__.validate(data)
         
 
     def __setdefaultbaudrate__(self, newbaudrate,):
         if self.__serial__.isOpen() and newbaudrate in BAUDRATES:
             value = BAUDRATES.index(newbaudrate)
             data = self.__generatemodbusmessage__( 'WRITE_SPECIAL_FUNCTION', 0x00fe, value )
+            self.__bustiming__.waitforsilence()
             self.__serial__.write( data )
+            self.__bustiming__.markactivity(self.__serial__.baudrate)
 
     def __serialconnect__(self,baudrate):
+        '''
+        Open the port at baudrate and ask the module for its model, returns False and closes the port when it does not answer
+        '''
+        ser = openserial(self.__port__, baudrate, self.__bustiming__)
 
-        ser = serial.Serial(
-            port=self.__port__,
-            baudrate=baudrate,
-            parity=serial.PARITY_NONE,
-            stopbits=serial.STOPBITS_ONE,
-            bytesize=serial.EIGHTBITS,
-            timeout = 0.35,
-        )
-
-        
         if ser.isOpen():
-            self.__serial__ = ser
-            data = self.__generatemodbusmessage__( 'READ_SPECIAL_FUNCTION', 0x00f7, 0x0001 )
-            self.__serial__.write( data )
-            modelresponse = self.__serial__.read(8)
-
-            try:
-                self.__validateModbusChecksum__(modelresponse)
-                self.__serial__.reset_input_buffer()
+            modelint = probemodel(ser, self.__modbusaddress__, self.__bustiming__)
 
-                modelbytes = modelresponse[3:5]
-                modelint = int.from_bytes(modelbytes, signed=False,byteorder='big')
-            except ChecksumMismatchException:
-                modelint = 0
-
-            
             if modelint in MODELS:
+                self.__serial__ = ser
                 self.__model__ = modelint
                 self.__baudrate__ = baudrate
-            else:
-                currentindex = BAUDRATES.index(baudrate)
-                if currentindex > 0:
-                    self.__serialconnect__( BAUDRATES[currentindex - 1] )
+                return True
+            ser.close()
+        return False
                 
-    def __generatemodbusmessage__(self,functioncode,address,value=None):
-        message = ''
-        if functioncode in FUNCTIONCODES:
-            message = self.__modbusaddress__.to_bytes(1,'little') 
-            message += FUNCTIONCODES[functioncode].to_bytes(1,'little')
-
-            message += address.to_bytes(2,'big')[0].to_bytes(1)
-            message += address.to_bytes(2,'big')[1].to_bytes(1)
-
-            if value is not None:
-                message += value.to_bytes(2,'big')[0].to_bytes(1)
-                message += value.to_bytes(2,'big')[1].to_bytes(1)
-
-            message = self.__appendModbusChecksum__(message)
-        return message
-
-
-    def __updateinput__(self,number,newvalue):
-        fieldName = 'lastOff'
-        oppFieldName = 'lastOn'
-        if newvalue == True:
-            fieldName = 'lastOn'
-            oppFieldName = 'lastOff'
+    def close(self):
+        '''
+        Close the serial port of the module, the module can not be used after
+        '''
+        if self.__serial__ is not None:
+            self.__serial__.close()
 
-        self.__inputs__[number] = { 
-                                   'number': number, 
-                                   'lastchange': datetime.datetime.now(datetime.UTC), 
-                                   'lastchangestr': datetime.datetime.now(datetime.UTC).strftime(DATETIME_STRING_FORMAT), 
-                                   'value': newvalue, 
-                                   fieldName : datetime.datetime.now(datetime.UTC),
-                                   oppFieldName : self.__inputs__[number][oppFieldName],
-                                   }
+    def __generatemodbusmessage__(self,functioncode,address,value=None):
+        return self.__codec__.encode(functioncode, address, value)
 
 
     @property
@@ -218,214 +477,253 @@ class ModbusDIO():
     def modbusaddress(self):
         return self.__modbusaddress__
 
+    @property
+    def bustiming(self):
+        return self.__bustiming__
 
-    def updateOutput(self,output,value):
+    @property
+    def inputpollmode(self):
+        return self.__inputpollmode__
 
-        if isinstance(value,str):
-            if value.upper() == 'TOGGLE':
-                value = not self.__outputs__[output]['value']
+    @property
+    def outputpollmode(self):
+        return self.__outputpollmode__
 
-        fieldName = 'lastOff'
-        oppFieldName = 'lastOn'
-        if value == True:
-            fieldName = 'lastOn'
-            oppFieldName = 'lastOff'
+    @property
+    def inputstate(self):
+        '''
+        The IOStateStore of the inputs
+        '''
+        return self.__inputs__
 
-        self.__outputs__[output] = { 
-                                    'number': output, 
-                                    'lastchange': datetime.datetime.now(datetime.UTC), 
-                                    'lastchangestr': datetime.datetime.now(datetime.UTC).strftime(DATETIME_STRING_FORMAT), 
-                                    'value': value,
-                                    fieldName : datetime.datetime.now(datetime.UTC),
-                                    oppFieldName : self.__outputs__[output][oppFieldName],
-                                    }
+    @property
+    def outputstate(self):
+        return self.__outputs__
 
 
-        if value == True:
-            value = 0xFF00
-        else:
-            value = 0x0000
-        data = self.__generatemodbusmessage__( 'WRITE_DO', output, value )
-        self.__serial__.write(data)
-        x = self.__serial__.read(8)
-        self.__validateModbusChecksum__(x)
-        self.__serial__.reset_input_buffer()
+    def __linetime__(self, functioncode, address, value):
+        '''
+        Seconds the request and response of a write take on the line with the gap after them, the bus time saved by not sending it
+        '''
+        length = len(self.__codec__.encode( functioncode, address, value )) + self.__codec__.responselength( functioncode, value )
+        return frametime(self.__baudrate__, length) + self.__bustiming__.interframedelay(self.__baudrate__) / 1000000000
 
-    def updateOutputs(self,value):
-        def performupdate(addr):
-            data = self.__generatemodbusmessage__( 'WRITE_SPECIAL_FUNCTION', addr, value, )
-            self.__serial__.write(data)
-            x = self.__serial__.read(8)
-            self.__validateModbusChecksum__(x)
-            self.__serial__.reset_input_buffer()
+    def estimatepolltime(self, registers=None):
+        '''
+        Seconds the requests and responses of one input poll take on the line, used as the poll time until one has been measured
+        '''
+        requests = inputpollrequests(self.__model__, self.__inputpollmode__)
+        if registers is not None and self.__inputpollmode__ == 'SINGLE_REGISTER':
+            requests = [ ('READ_SPECIAL_FUNCTION', 0x0090 + register, 0x0001) for register in registers ]
+        return sum( self.__linetime__(*request) for request in requests )
 
+    def __registerwrites__(self, registers, values):
+        '''
+        Requests that write exactly the given registers, one WRITE_MULTIPLE_SPECIAL_FUNCTION per run of adjacent registers when the model takes it and one WRITE_SPECIAL_FUNCTION per register otherwise.
+        A register between two given ones is never written, its outputs may not be known.
+        '''
+        if not self.__writemultipleregisters__:
+            return [ ('WRITE_SPECIAL_FUNCTION', 0x0080 + register, values[register]) for register in registers ]
 
-        for i in range(0,self.__numberinputoutputs__):
-            fieldName = 'lastOff'
-            oppFieldName = 'lastOn'
-            if value == True:
-                fieldName = 'lastOn'
-                oppFieldName = 'lastOff'
-
-            self.__outputs__[i] = { 
-                                   'number': i, 
-                                   'lastchange': datetime.datetime.now(datetime.UTC), 
-                                   'lastchangestr': datetime.datetime.now(datetime.UTC).strftime(DATETIME_STRING_FORMAT), 
-                                   'value': value,
-                                   fieldName : datetime.datetime.now(datetime.UTC),
-                                   oppFieldName : self.__outputs__[i][oppFieldName],
-                                   }
-        
-        if value == True:
-            value = 0xFFFF
-        else:
-            value = 0x0000
+        runs = []
+        for register in sorted(registers):
+            if runs and runs[-1][-1] == register - 1:
+                runs[-1].append(register)
+            else:
+                runs.append([register])
 
-        performupdate(0x0080)
-        if self.__model__ in [2324, 2332, 2348]:
-            performupdate(0x0081)
+        requests = []
+        for run in runs:
+            if len(run) == 1:
+                requests.append( ('WRITE_SPECIAL_FUNCTION', 0x0080 + run[0], values[run[0]]) )
+            else:
+                requests.append( ('WRITE_MULTIPLE_SPECIAL_FUNCTION', 0x0080 + run[0], values[run[0]:run[-1] + 1]) )
+        return requests
 
-        if self.__model__ in [2348]:
-            performupdate(0x0082)
+    def __shadowcurrent__(self, mask, register, now):
+        '''
+        True when every bit of mask is in the shadow and the register holding them is not due to be written again
+        '''
+        if self.__shadowknown__ & mask != mask:
+            return False
+        return self.__reassertinterval__ is None or now - self.__shadowat__[register] <= self.__reassertinterval__
 
-    def updateOutputsByList(self,outputlist):
+    def __writeoutput__(self, output, value):
         '''
-        Update all outputs using a list of Bools
+        Write one output with WRITE_DO unless the module already has it
         '''
+        bit = 1 << output
+        value = bit if value == True else 0
+        if self.__shadowcurrent__(bit, output // 16, time.monotonic()) and self.__shadow__ & bit == value:
+            self.writesskipped += 1
+            self.savedlinetime += self.__linetime__( 'WRITE_DO', output, 0xFF00 )
+            return None
 
-        for i in range(0,self.__numberinputoutputs__):
-            if self.__outputs__[i]['value'] != outputlist[i]:
-        
-                fieldName = 'lastOff'
-                oppFieldName = 'lastOn'
-                if outputlist[i] == True:
-                    fieldName = 'lastOn'
-                    oppFieldName = 'lastOff'
+        self.__shadowknown__ &= ~bit
+        self.__transaction__( 'WRITE_DO', output, 0xFF00 if value else 0x0000 )
+        self.writessent += 1
+        self.__shadow__ = (self.__shadow__ & ~bit) | value
+        self.__shadowknown__ |= bit
 
-                self.__outputs__[i] = { 
-                                        'number': i, 
-                                       'lastchange': datetime.datetime.now(datetime.UTC), 
-                                       'lastchangestr': datetime.datetime.now(datetime.UTC).strftime(DATETIME_STRING_FORMAT), 
-                                       'value': outputlist[i], 
-                                       fieldName : datetime.datetime.now(datetime.UTC),
-                                       oppFieldName : self.__outputs__[i][oppFieldName],
-                                       }
+    def __writeoutputregisters__(self, outputs, registers=None, force=False):
+        '''
+        Write the output registers of the model from a single int with output 0 in bit 0, registers limits the write to those registers.
 
-        def performupdate(addr, value):
-            data = self.__generatemodbusmessage__( 'WRITE_SPECIAL_FUNCTION', addr, value, )
-            self.__serial__.write(data)
-            x = self.__serial__.read(8)
-            self.__validateModbusChecksum__(x)
-            self.__serial__.reset_input_buffer()
+        Only the registers that differ from the shadow image are written, using one WRITE_MULTIPLE_SPECIAL_FUNCTION request per run of adjacent registers so their outputs change together and falling back to one WRITE_SPECIAL_FUNCTION request per register when the model does not support it.
+        force writes every register whatever the shadow holds.
+        '''
+        values = outputregisters(self.__model__, outputs)
+        if registers is None:
+            registers = range(0, len(values))
+        now = time.monotonic()
+
+        stale = []
+        for register in registers:
+            mask = 0xFFFF << (16 * register)
+            if force or not self.__shadowcurrent__(mask, register, now) or (self.__shadow__ & mask) != (outputs & mask):
+                stale.append(register)
+
+        unsuppressed = self.__registerwrites__(list(registers), values)
+        if not stale:
+            self.writesskipped += 1
+            self.savedlinetime += sum( self.__linetime__(*request) for request in unsuppressed )
+            return None
+
+        requests = self.__registerwrites__(stale, values)
+        saved = sum( self.__linetime__(*request) for request in unsuppressed ) - sum( self.__linetime__(*request) for request in requests )
+        if saved > 0:
+            self.writesnarrowed += 1
+            self.savedlinetime += saved
+
+        for functioncode, address, value in requests:
+            if functioncode == 'WRITE_MULTIPLE_SPECIAL_FUNCTION':
+                written = list(range(address - 0x0080, address - 0x0080 + len(value)))
+            else:
+                written = [ address - 0x0080 ]
+            mask = 0
+            for register in written:
+                mask |= 0xFFFF << (16 * register)
 
+            self.__shadowknown__ &= ~mask
+            try:
+                self.__transaction__( functioncode, address, value )
+            except ModbusExceptionResponseException:
+                if functioncode != 'WRITE_MULTIPLE_SPECIAL_FUNCTION':
+                    raise
+                self.__writemultipleregisters__ = False
+                return self.__writeoutputregisters__(outputs, registers=stale, force=True)
+            self.writessent += 1
+            self.__shadow__ = (self.__shadow__ & ~mask) | (outputs & mask)
+            self.__shadowknown__ |= mask
+            for register in written:
+                self.__shadowat__[register] = now
+
+    def duereasserts(self, now=None):
+        '''
+        Registers written before that are due to be written again under reassertinterval, a register never written is left alone
         '''
-        Handle these extra 16 bits for 2348 model as int is 32 bits 
+        if self.__reassertinterval__ is None:
+            return []
+        if now is None:
+            now = time.monotonic()
+        due = []
+        for register in range(0, len(self.__shadowat__)):
+            mask = 0xFFFF << (16 * register)
+            if self.__shadowknown__ & mask == mask and now - self.__shadowat__[register] > self.__reassertinterval__:
+                due.append(register)
+        return due
+
+    def reassertoutputs(self, registers=None):
         '''
-        if self.__model__ in [2348]:
-            highlist = outputlist[32:47]
-            outputlist = outputlist[0:31]
+        Write the output registers again from the output store whatever the shadow holds, every register when registers is None
+        '''
+        self.__writeoutputregisters__(self.__outputs__.values, registers=registers, force=True)
+
+    def writestats(self):
+        return {
+                'sent':             self.writessent,
+                'skipped':          self.writesskipped,
+                'narrowed':         self.writesnarrowed,
+                'savedlinetime':    self.savedlinetime,
+                'outputpolls':      self.outputpolls,
+                'outputdrifts':     self.outputdrifts,
+                }
 
+    def updateOutput(self,output,value):
 
+        if isinstance(value,str):
+            if value.upper() == 'TOGGLE':
+                value = not self.__outputs__.value(output)
+
+        self.__outputs__.set(output, value)
+        self.__writeoutput__(output, value)
+
+    def updateOutputsByChanges(self, changes):
         '''
-        Convert list of bools to single int
+        Apply [(output, value)] in order with the fewest writes, one WRITE_DO when a single output is named and otherwise only the registers holding the named outputs
+
+        A register write also sets the outputs of the register that were not named, so it is only used once the module has acknowledged every output of the register.
+        Otherwise the outputs are read back first, and when that fails each named output is written on its own so an output switched on before startup is never forced off.
         '''
-        bits = 0
-        for count,item in enumerate(outputlist):
-            if item is False:
-                continue
-            bits = bits | (item << count)
+        outputs = set( output for output, value in changes )
+        registers = sorted(set( output // 16 for output in outputs ))
+
+        if len(outputs) > 1:
+            implemented = (1 << self.__numberinputoutputs__) - 1
+            unknown = 0
+            for register in registers:
+                mask = (0xFFFF << (16 * register)) & implemented
+                unknown |= mask & ~self.__shadowknown__
+            if unknown and not self.pollreadoutputs():
+                bits = outputsfromchanges(self.__outputs__.values, changes)
+                self.__outputs__.update(bits)
+                for output in sorted(outputs):
+                    self.__writeoutput__(output, (bits >> output) & 1 == 1)
+                return None
 
-        lower16bits = bits & 0x0000FFFF
-        performupdate(0x0080, lower16bits)
+        bits = outputsfromchanges(self.__outputs__.values, changes)
+        self.__outputs__.update(bits)
 
+        if len(outputs) == 1:
+            output = outputs.pop()
+            self.__writeoutput__(output, (bits >> output) & 1 == 1)
+        elif len(outputs) > 1:
+            self.__writeoutputregisters__(bits, registers=registers)
 
-        if self.__model__ in [2324, 2332, 2348]:
-            upper16bits = (bits >> 16) & 0x0000FFFF 
-            performupdate(0x0081, upper16bits)
+    def updateOutputs(self,value):
+        bits = alloutputs(self.__model__, value)
 
-        
-        if self.__model__ in [2348]:
-            highbits = 0
-            for count,item in enumerate(highlist):
-                if item is False:
-                    continue
-                highbits = highbits | (item << count)
-            
-            highbits = highbits & 0x0000FFFF
-            performupdate(0x0082, highbits)
+        self.__outputs__.update(bits)
+        self.__writeoutputregisters__(bits)
 
-    def updateOutputsByHexStr(self,hexStr, outputValue=True, keepCurrent=False, ):
+    def updateOutputsByList(self,outputlist):
         '''
-        Update all outputs using a list of Bytes
+        Update all outputs using a list of Bools
         '''
-        bitwiseORMask = 0x0000000
-        outputMask = 0x0000000
 
-        if outputValue == True:
-            outputMask = 0xFFFFFFFF
+        bits = outputsfromlist(outputlist, self.__numberinputoutputs__)
 
-        def performupdate(addr, value):
-            data = self.__generatemodbusmessage__( 'WRITE_SPECIAL_FUNCTION', addr, value, )
-            self.__serial__.write(data)
-            x = self.__serial__.read(8)
-            self.__validateModbusChecksum__(x)
-            self.__serial__.reset_input_buffer()
+        self.__outputs__.update(bits)
+        self.__writeoutputregisters__(bits)
 
-        try:
-            value = int(hexStr, 16)
-            if value > 4294967295:
-                return None
-        except ValueError:
+    def updateOutputsByHexStr(self,hexStr, outputValue=True, keepCurrent=False, ):
+        '''
+        Update all outputs using a list of Bytes
+        '''
+        value = outputsfromhexstr(hexStr, self.__outputs__.values, self.__numberinputoutputs__, outputValue=outputValue, keepCurrent=keepCurrent)
+        if value is None:
             return None
 
-        if keepCurrent == True:
-            for i,output in enumerate(self.__outputs__):
-                currBit = pow(2,i)
-                if output['value'] == True:
-                    bitwiseORMask = bitwiseORMask | currBit
-            bitwiseORMask = ((value & bitwiseORMask) ^ ((1 << 32) -1)) & bitwiseORMask
-      
-        value = (value & outputMask)| bitwiseORMask
-
-        for i,output in enumerate(self.__outputs__):
-            newValue = False
-            if value & pow(2,i) > 0:
-                newValue = True
-
-            if newValue != output['value']:
-                fieldName = 'lastOff'
-                oppFieldName = 'lastOn'
-                if newValue == True:
-                    fieldName = 'lastOn'
-                    oppFieldName = 'lastOff'
-
-                self.__outputs__[i] = { 
-                                            'number': i, 
-                                            'lastchange': datetime.datetime.now(datetime.UTC), 
-                                            'lastchangestr': datetime.datetime.now(datetime.UTC).strftime(DATETIME_STRING_FORMAT), 
-                                            'value': newValue,
-                                            fieldName : datetime.datetime.now(datetime.UTC),
-                                            oppFieldName : self.__outputs__[i][oppFieldName],
-                                            }
-
-        lower16bits = (value & 0x0000FFFF) | (bitwiseORMask & 0x0000FFFF)
-        performupdate(0x0080, lower16bits)
-
-        if self.__model__ in [2324, 2332, 2348]:
-            upper16bits = ((value >> 16) & 0x0000FFFF) | (bitwiseORMask >> 16 & 0x0000FFFF)
-            performupdate(0x0081, upper16bits)
-
-        if self.__model__ in [2348]:
-            upper16bits = ((value >> 32) & 0x0000FFFF) | (bitwiseORMask >> 32 & 0x0000FFFF)
-            performupdate(0x0081, upper16bits)
+        self.__outputs__.update(value)
+        self.__writeoutputregisters__(value)
 
     def getInput(self, inputnumber):
-        if inputnumber <= self.__numberinputoutputs__ and inputnumber >= 0:
-            return self.__inputs__[inputnumber]
+        if inputnumber < self.__numberinputoutputs__ and inputnumber >= 0:
+            return self.__inputs__.get(inputnumber)
 
     def getInputs(self, inputnumbers=None):
         if inputnumbers is None:
-            return self.__inputs__
+            return self.__inputs__.getall()
         if isinstance(inputnumbers,list):
             ret = []
             for inputnumber in inputnumbers:
@@ -437,78 +735,87 @@ class ModbusDIO():
 
     def getOutputs(self, outputnumbers=None):
         if outputnumbers is None:
-            return self.__outputs__
+            return self.__outputs__.getall()
         if isinstance(outputnumbers,list):
             ret = []
             for outputnumber in outputnumbers:
-                ret.append(self.__outputs__[outputnumber])
+                ret.append(self.__outputs__.get(outputnumber))
             return ret
         if isinstance(outputnumbers, int):
-            return self.__outputs__[outputnumbers]
+            return self.__outputs__.get(outputnumbers)
 
     def pollreadoutputs(self):
-        pass
-
-    def pollreadinputs(self):
-        def getInput(address, value):
-            data = self.__generatemodbusmessage__( 'READ_SPECIAL_FUNCTION', address, value )
-            self.__serial__.write(data)
-            x = self.__serial__.read(7)
-            self.__validateModbusChecksum__(x)
-            self.__serial__.reset_input_buffer()
-            return x[3:5]
-
-
-        def updatechangedbits(bits,state):
-            '''
-            We pass in which bits have changed (bits) computed using bitwise manipulation and the changed state (True/False). This allows the function to bail out early if we have updated all changed inputs.
-
-            This means that if the last input has changed we have gone through this loop the maximum number of times and saved nothing.
-            '''
-            subtotal = 0
-            for i in range(0,self.__numberinputoutputs__):
-                powerof2val = pow(2,i)
-                if bits & powerof2val == powerof2val:
-                    subtotal += powerof2val
-                    self.__updateinput__(i,state)
-                    if self.__inputchangecallback__ is not None:
-                        self.__inputchangecallback__( self.__modbusaddress__, i, state )
-                    if bits == subtotal:
-                        '''
-                        All changes have been found.
-                        '''
-                        break
+        '''
+        Read the outputs back and reconcile the output state and the shadow image with them, returns False when the module did not give a valid response
+        '''
         try:
-            inputs1 = getInput(0x0090, 0x0001)
-        except SerialException:
-            return None
-
-        inputs = inputs1
+            responses = [ self.__transaction__( functioncode, address, value ) for functioncode, address, value in outputpollrequests(self.__model__, self.__outputpollmode__) ]
+        except TRANSACTION_EXCEPTIONS:
+            return False
+        outputs = decodeoutputvalues(self.__codec__, self.__outputpollmode__, responses) & ((1 << self.__numberinputoutputs__) - 1)
+        self.outputpolls += 1
 
-        if self.__model__ in [2324, 2332, 2348]:
-            try:
-                inputs2 = getInput(0x0091, 0x0001)
-            except SerialException:
-                return None
-            inputs = inputs2 + inputs1
+        '''
+        Only outputs whose value had been acknowledged count as drift, the first readback of outputs never written just fills in the output state
+        '''
+        drifted = (self.__shadow__ ^ outputs) & self.__shadowknown__
+        now = time.monotonic()
+        self.__shadow__ = outputs
+        self.__shadowknown__ = (1 << (16 * len(self.__shadowat__))) - 1
+        self.__shadowat__ = [now] * len(self.__shadowat__)
+
+        previousoutputs = self.__outputs__.values
+        self.__outputs__.update(outputs)
+        changed = drifted & (previousoutputs ^ outputs)
+        if changed == 0:
+            return True
 
-        if self.__model__ in [2348]:
-            try:
-                inputs3 = getInput(0x0092, 0x0001)
-            except SerialException:
-                return None
-            inputs = inputs3 + inputs2 + inputs1
+        self.outputdrifts += 1
+        if self.__outputchangecallback__ is not None:
+            for i in setbitnumbers(changed & outputs):
+                self.__outputchangecallback__( self.__modbusaddress__, i, True )
+            for i in setbitnumbers(changed & previousoutputs):
+                self.__outputchangecallback__( self.__modbusaddress__, i, False )
+        return True
 
-        inputs = int.from_bytes(inputs,signed=False,byteorder='big')
+    def __transaction__(self, functioncode, address, value):
+        return transaction( self.__serial__, self.__codec__, self.__reader__, self.__bustiming__, functioncode, address, value )
 
-        if self.__inputvalues__ != inputs:
-            bitsgonehigh = ~self.__inputvalues__ & inputs
-            bitsgonelow = self.__inputvalues__ & ~inputs
+    def __readinputvalues__(self, registers=None):
+        '''
+        Read every input of the module and return them as a single int with input 0 in bit 0.
+        In SINGLE_REGISTER mode registers limits the read to those input registers and the others keep their stored values.
+        '''
+        if registers is not None and self.__inputpollmode__ == 'SINGLE_REGISTER':
+            inputs = self.__inputs__.values
+            for register in registers:
+                mask = 0xFFFF << (16 * register)
+                value = self.__codec__.decoderegister( self.__transaction__( 'READ_SPECIAL_FUNCTION', 0x0090 + register, 0x0001 ) )
+                inputs = (inputs & ~mask) | (value << (16 * register))
+            return inputs
+        responses = [ self.__transaction__( functioncode, address, value ) for functioncode, address, value in inputpollrequests(self.__model__, self.__inputpollmode__) ]
+        return decodeinputvalues(self.__codec__, self.__inputpollmode__, responses)
+
+    def pollreadinputs(self, registers=None):
+        '''
+        Read the inputs and report any changes, returns False when the module did not give a valid response
+        registers is an optional list of the input registers to read, only used in SINGLE_REGISTER mode where each register is its own request
+        '''
+        try:
+            inputs = self.__readinputvalues__(registers)
+        except TRANSACTION_EXCEPTIONS:
+            return False
 
-            if bitsgonehigh > 0:
-                updatechangedbits(bitsgonehigh, True)
-            if bitsgonelow > 0:
-                updatechangedbits(bitsgonelow, False)
+        bitsgonehigh, bitsgonelow = inputchanges(self.__inputs__, inputs)
+        if bitsgonehigh == 0 and bitsgonelow == 0:
+            return True
 
-            self.__inputvalues__ = inputs
+        if self.__inputschangecallback__ is not None:
+            self.__inputschangecallback__( self.__modbusaddress__, bitsgonehigh, bitsgonelow )
 
+        if self.__inputchangecallback__ is not None:
+            for i in setbitnumbers(bitsgonehigh):
+                self.__inputchangecallback__( self.__modbusaddress__, i, True )
+            for i in setbitnumbers(bitsgonelow):
+                self.__inputchangecallback__( self.__modbusaddress__, i, False )
+        return True
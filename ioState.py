@@ -0,0 +1,283 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Compact store of input or output state for one module
+
+Notes:
+    The values of every input or output are kept as one int bitmask with bit N being input or output N.
+    The last change, last on and last off times are kept in arrays as wall clock seconds (time.time()) and monotonic nanoseconds (time.monotonic_ns()).
+    The clocks are read once per update however many bits change, datetime objects and strings are only made when state is asked for.
+    IOStateSnapshot is a copy of the state that does not change, it can also be packed into and read back from a buffer such as shared memory.
+'''
+
+import time
+import datetime
+import struct
+from array import array
+
+
+DATETIME_STRING_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ%z'
+
+'''
+Packed layout, the values bitmask then the last change, last on and last off wall clock times each with room for the largest model
+'''
+PACKED_MAXIMUM_NUMBER = 48
+PACKED_VALUES = struct.Struct('<Q')
+PACKED_TIMESTAMPS_SIZE = 8 * PACKED_MAXIMUM_NUMBER
+PACKED_SIZE = PACKED_VALUES.size + 3 * PACKED_TIMESTAMPS_SIZE
+
+
+def setbitnumbers(bits):
+    '''
+    Numbers of the set bits in bits from lowest to highest, each step isolates the lowest set bit so the cost is one step per set bit and not per input
+    '''
+    while bits:
+        lowestbit = bits & -bits
+        bits ^= lowestbit
+        yield lowestbit.bit_length() - 1
+
+
+def todatetime(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.UTC)
+
+def statedict(number, value, lastchange, laston, lastoff, lastchangestr=None):
+    '''
+    State of one input or output in the dict shape ModbusDIO has always returned, lastchange, laston and lastoff are time.time() seconds
+    '''
+    lastchange = todatetime(lastchange)
+    if lastchangestr is None:
+        lastchangestr = lastchange.strftime(DATETIME_STRING_FORMAT)
+    return {
+            'number': number,
+            'lastchange': lastchange,
+            'lastchangestr': lastchangestr,
+            'value': value,
+            'lastOn': todatetime(laston),
+            'lastOff': todatetime(lastoff),
+            }
+
+
+class IOStateSnapshot():
+    __slots__ = (
+                '__number__',
+                '__values__',
+                '__lastchange__',
+                '__laston__',
+                '__lastoff__',
+                '__lastchangestr__',
+                )
+
+    def __init__(self, number, values, lastchange, laston, lastoff, ):
+        self.__number__ = number
+        self.__values__ = values
+        self.__lastchange__ = lastchange
+        self.__laston__ = laston
+        self.__lastoff__ = lastoff
+        self.__lastchangestr__ = {}
+
+    @classmethod
+    def unpackfrom(cls, buffer, offset, number):
+        '''
+        Read a snapshot written by IOStateStore.packinto
+        '''
+        values = PACKED_VALUES.unpack_from(buffer, offset)[0]
+        offset += PACKED_VALUES.size
+        timestamps = []
+        for i in range(0, 3):
+            times = array('d')
+            times.frombytes(buffer[offset:offset + 8 * number])
+            timestamps.append(times)
+            offset += PACKED_TIMESTAMPS_SIZE
+        return cls(number, values, *timestamps)
+
+    def __len__(self):
+        return self.__number__
+
+    @property
+    def values(self):
+        return self.__values__
+
+    def value(self, number):
+        return (self.__values__ >> number) & 1 == 1
+
+    def get(self, number):
+        state = statedict(number, self.value(number), self.__lastchange__[number], self.__laston__[number], self.__lastoff__[number], self.__lastchangestr__.get(number))
+        self.__lastchangestr__[number] = state['lastchangestr']
+        return state
+
+    def getall(self):
+        return [self.get(number) for number in range(0, self.__number__)]
+
+    def select(self, numbers=None):
+        '''
+        Every state for None, a list of states for a list of numbers and one state for a number, None for numbers out of range
+        '''
+        if numbers is None:
+            return self.getall()
+        if isinstance(numbers, list):
+            return [ self.select(number) for number in numbers ]
+        if isinstance(numbers, int) and 0 <= numbers < self.__number__:
+            return self.get(numbers)
+
+
+def modulesnapshot(model, baudrate, health, inputs, outputs):
+    '''
+    State of one module as returned by getSnapshot, inputs and outputs are IOStateSnapshot and the dict is not changed once published
+    '''
+    return {
+            'model':                model,
+            'numberinputoutputs':   len(inputs),
+            'baudrate':             baudrate,
+            'health':               health,
+            'inputs':               inputs,
+            'outputs':              outputs,
+            }
+
+
+class IOStateStore():
+    __slots__ = (
+                '__number__',
+                '__values__',
+                '__lastchange__',
+                '__laston__',
+                '__lastoff__',
+                '__lastchangens__',
+                '__lastonns__',
+                '__lastoffns__',
+                '__lastchangestr__',
+                '__version__',
+                )
+
+    def __init__(self, number):
+        now = time.time()
+        nowns = time.monotonic_ns()
+        self.__number__ = number
+        self.__values__ = 0
+        self.__lastchange__ = array('d', [now]) * number
+        self.__laston__ = array('d', [now]) * number
+        self.__lastoff__ = array('d', [now]) * number
+        self.__lastchangens__ = array('q', [nowns]) * number
+        self.__lastonns__ = array('q', [nowns]) * number
+        self.__lastoffns__ = array('q', [nowns]) * number
+        self.__lastchangestr__ = {}
+        self.__version__ = 0
+
+    def __len__(self):
+        return self.__number__
+
+    @property
+    def values(self):
+        return self.__values__
+
+    @property
+    def version(self):
+        '''
+        Count of the updates that changed a value, a snapshot taken at the same version is still current
+        '''
+        return self.__version__
+
+    def value(self, number):
+        return (self.__values__ >> number) & 1 == 1
+
+    def lastchangens(self, number):
+        return self.__lastchangens__[number]
+
+    def lastonns(self, number):
+        return self.__lastonns__[number]
+
+    def lastoffns(self, number):
+        return self.__lastoffns__[number]
+
+    def update(self, values, now=None, nowns=None):
+        '''
+        Set every value from a bitmask and return the mask of the bits that changed
+        '''
+        values = values & ((1 << self.__number__) - 1)
+        changed = self.__values__ ^ values
+        if changed == 0:
+            return 0
+
+        if now is None:
+            now = time.time()
+        if nowns is None:
+            nowns = time.monotonic_ns()
+
+        bits = changed
+        while bits:
+            lowestbit = bits & -bits
+            number = lowestbit.bit_length() - 1
+            bits ^= lowestbit
+
+            self.__lastchange__[number] = now
+            self.__lastchangens__[number] = nowns
+            if values & lowestbit:
+                self.__laston__[number] = now
+                self.__lastonns__[number] = nowns
+            else:
+                self.__lastoff__[number] = now
+                self.__lastoffns__[number] = nowns
+            self.__lastchangestr__.pop(number, None)
+
+        self.__values__ = values
+        self.__version__ += 1
+        return changed
+
+    def set(self, number, value):
+        '''
+        Set one value, returns True when it changed
+        '''
+        if value == True:
+            values = self.__values__ | (1 << number)
+        else:
+            values = self.__values__ & ~(1 << number)
+        return self.update(values) != 0
+
+    def get(self, number):
+        '''
+        State of one input or output in the dict shape ModbusDIO has always returned
+        '''
+        state = statedict(number, self.value(number), self.__lastchange__[number], self.__laston__[number], self.__lastoff__[number], self.__lastchangestr__.get(number))
+        self.__lastchangestr__[number] = state['lastchangestr']
+        return state
+
+    def getall(self):
+        return [self.get(number) for number in range(0, self.__number__)]
+
+    def snapshot(self):
+        return IOStateSnapshot(self.__number__, self.__values__, array('d', self.__lastchange__), array('d', self.__laston__), array('d', self.__lastoff__))
+
+    def packinto(self, buffer, offset):
+        '''
+        Write the values and wall clock times into buffer at offset in PACKED_SIZE bytes
+        '''
+        PACKED_VALUES.pack_into(buffer, offset, self.__values__)
+        offset += PACKED_VALUES.size
+        size = 8 * self.__number__
+        for timestamps in (self.__lastchange__, self.__laston__, self.__lastoff__):
+            buffer[offset:offset + size] = memoryview(timestamps).cast('B')
+            offset += PACKED_TIMESTAMPS_SIZE
@@ -0,0 +1,114 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+MQTT message templates compiled once
+
+Notes:
+    The MQTT_MESSAGE and MQTT_HOLD_MESSAGE of a section are templates with the slots {MODBUSADDRESS}, {INPUT}, {STATE}, {UTCTIMESTAMP}, {UPDATEDAT} and {HOLDTIME}.
+    MessageTemplate splits the template into its literal text and slots once, when the configuration is read. A message is then one join of the literal text and the values of the slots the template uses, in place of a chain of str.replace over the whole template for every slot.
+    The slots are typed, MODBUSADDRESS and INPUT are written as integers and UTCTIMESTAMP and HOLDTIME as floats, so a wrong value raises rather than ending up in the message. STATE is escaped as JSON string content, so a template quoting it is valid JSON whatever the value, UPDATEDAT only holds digits and separators.
+    Any other text in braces, such as the braces of the JSON itself, is left as it is.
+    UPDATEDAT is formatted as %Y-%m-%d-%H:%M:%S.%f. The date and time up to the second are formatted once per second and shared by all the messages of that second, only the microseconds are added per message.
+'''
+
+import re
+from json.encoder import encode_basestring
+
+SLOTS = ('MODBUSADDRESS', 'INPUT', 'STATE', 'UTCTIMESTAMP', 'UPDATEDAT', 'HOLDTIME', )
+SLOT_PATTERN = re.compile(r'\{(' + '|'.join(SLOTS) + r')\}')
+UPDATEDAT_FORMAT = '%Y-%m-%d-%H:%M:%S'
+
+
+class TimestampCache():
+    def __init__(self, ):
+        self.__cached__ = (None, None)
+
+    def updatedat(self, now):
+        '''
+        now.strftime('%Y-%m-%d-%H:%M:%S.%f') with the part up to the second formatted once per second
+        The second and its text are replaced together so threads rendering at the same time never mix them
+        '''
+        second = (now.year, now.month, now.day, now.hour, now.minute, now.second)
+        cachedsecond, prefix = self.__cached__
+        if second != cachedsecond:
+            prefix = now.strftime(UPDATEDAT_FORMAT)
+            self.__cached__ = (second, prefix)
+        return f'''{prefix}.{now.microsecond:06d}'''
+
+
+timestamps = TimestampCache()
+
+
+class MessageTemplate():
+    def __init__(self, template, ):
+        self.__template__ = template
+        self.__parts__ = []
+        self.__positions__ = []
+        position = 0
+        for match in SLOT_PATTERN.finditer(template):
+            self.__parts__.append(template[position:match.start()])
+            self.__positions__.append((len(self.__parts__), match.group(1)))
+            self.__parts__.append(None)
+            position = match.end()
+        self.__parts__.append(template[position:])
+        self.__slotnames__ = frozenset(slot for index, slot in self.__positions__)
+
+    @property
+    def template(self):
+        return self.__template__
+
+    @property
+    def slots(self):
+        return self.__slotnames__
+
+    def render(self, modbusaddress=None, input=None, state=None, now=None, holdtime=None):
+        '''
+        now is a datetime for UTCTIMESTAMP and UPDATEDAT, holdtime is in seconds
+        '''
+        slots = self.__slotnames__
+        values = {}
+        if 'MODBUSADDRESS' in slots:
+            values['MODBUSADDRESS'] = str(int(modbusaddress))
+        if 'INPUT' in slots:
+            values['INPUT'] = str(int(input))
+        if 'STATE' in slots:
+            values['STATE'] = encode_basestring(state)[1:-1]
+        if 'UTCTIMESTAMP' in slots:
+            values['UTCTIMESTAMP'] = repr(float(now.timestamp()))
+        if 'UPDATEDAT' in slots:
+            values['UPDATEDAT'] = timestamps.updatedat(now)
+        if 'HOLDTIME' in slots:
+            values['HOLDTIME'] = repr(float(holdtime))
+
+        parts = self.__parts__.copy()
+        for index, slot in self.__positions__:
+            parts[index] = values[slot]
+        return ''.join(parts)
+
+    def __repr__(self):
+        return f'''MessageTemplate({self.__template__!r})'''
@@ -0,0 +1,281 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Modbus RTU frame encoding and decoding
+
+Notes:
+    Read requests and single coil writes never change for a given slave address so they are built once and served from a cache.
+    Every other request is packed in one call of a precompiled struct, a write multiple request with a struct for its quantity of registers, and the checksum is taken over those bytes.
+    Responses are checked and decoded through a memoryview so no slices of the response are copied.
+    ModbusFrameReader pulls a response out of the bytes received so far as soon as the whole frame is there, the length is worked out from the function code and byte count so nothing waits on the serial timeout.
+'''
+
+import struct
+import time
+from fastcrc import crc16
+
+
+FUNCTIONCODES = {
+    'READ_DO': 0x01,
+    'READ_DI': 0x02,
+    'READ_SPECIAL_FUNCTION': 0x03,
+    'WRITE_DO': 0x05,
+    'WRITE_SPECIAL_FUNCTION': 0x06,
+    'WRITE_MULTIPLE_DO': 0x0F,
+    'WRITE_MULTIPLE_SPECIAL_FUNCTION': 0x10,
+}
+
+'''
+Length of the response to the write function codes, the read function codes carry a byte count in the third byte
+'''
+WRITE_RESPONSE_LENGTH = 8
+EXCEPTION_RESPONSE_LENGTH = 5
+READFUNCTIONCODES = [
+    FUNCTIONCODES['READ_DO'],
+    FUNCTIONCODES['READ_DI'],
+    FUNCTIONCODES['READ_SPECIAL_FUNCTION'],
+]
+
+'''
+Requests using these function codes only have a small fixed set of values so the frames are cached
+'''
+CACHEDFUNCTIONCODES = [
+    FUNCTIONCODES['READ_DO'],
+    FUNCTIONCODES['READ_DI'],
+    FUNCTIONCODES['READ_SPECIAL_FUNCTION'],
+    FUNCTIONCODES['WRITE_DO'],
+]
+
+ADDRESS_HEADER = struct.Struct('>BBH')
+REQUEST_HEADER = struct.Struct('>BBHH')
+'''
+Header and register values of a write multiple request for each quantity of registers, packed in one call
+'''
+WRITE_MULTIPLE_REQUESTS = [struct.Struct(f'>BBHHB{count}H') for count in range(0, 124)]
+REGISTER = struct.Struct('>H')
+REGISTERS = [struct.Struct(f'>{count}H') for count in range(0, 128)]
+CHECKSUM = struct.Struct('<H')
+
+
+class ChecksumMismatchException(Exception):
+    """Computed checksum does not match the checksum provided"""
+
+class ModbusExceptionResponseException(Exception):
+    """Module replied with a Modbus exception response"""
+
+class ModbusTimeoutException(Exception):
+    """No complete response arrived before the timeout"""
+
+
+class ModbusFrameCodec():
+    def __init__(self, modbusaddress):
+        self.__modbusaddress__ = modbusaddress
+        self.__cache__ = {}
+
+    @property
+    def modbusaddress(self):
+        return self.__modbusaddress__
+
+    def __packrequest__(self, functioncode, address, value):
+        if isinstance(value, list):
+            '''
+            A list of register values is sent as the quantity, byte count and values of a write multiple request
+            '''
+            frame = WRITE_MULTIPLE_REQUESTS[len(value)].pack(self.__modbusaddress__, functioncode, address, len(value), len(value) * 2, *value)
+        elif value is None:
+            frame = ADDRESS_HEADER.pack(self.__modbusaddress__, functioncode, address)
+        else:
+            frame = REQUEST_HEADER.pack(self.__modbusaddress__, functioncode, address, value)
+        return frame + CHECKSUM.pack(crc16.modbus(frame))
+
+    def encode(self, functioncode, address, value=None):
+        '''
+        Build a request frame including the checksum.
+
+        functioncode is a key of FUNCTIONCODES and value is either an int, None or a list of register values for WRITE_MULTIPLE_SPECIAL_FUNCTION.
+        '''
+        if functioncode not in FUNCTIONCODES:
+            return b''
+        functioncode = FUNCTIONCODES[functioncode]
+
+        if functioncode in CACHEDFUNCTIONCODES and not isinstance(value, list):
+            key = (functioncode, address, value)
+            frame = self.__cache__.get(key)
+            if frame is None:
+                frame = self.__packrequest__(functioncode, address, value)
+                self.__cache__[key] = frame
+            return frame
+
+        return self.__packrequest__(functioncode, address, value)
+
+    def responselength(self, functioncode, value=None):
+        '''
+        Length of a normal response to a request, used to size the response timeout
+        '''
+        functioncode = FUNCTIONCODES[functioncode]
+        if functioncode in [FUNCTIONCODES['READ_DO'], FUNCTIONCODES['READ_DI']]:
+            return 5 + ((value + 7) // 8)
+        if functioncode == FUNCTIONCODES['READ_SPECIAL_FUNCTION']:
+            return 5 + (value * 2)
+        return WRITE_RESPONSE_LENGTH
+
+    def validate(self, frame):
+        '''
+        Check the checksum at the end of a response, raises ChecksumMismatchException when it does not match
+        '''
+        if frame is None:
+            return False
+        if len(frame) < 4:
+            raise(ChecksumMismatchException(f'''CHECKSUM DOES NOT MATCH frame too short got: {bytes(frame)}'''))
+
+        '''
+        The Modbus CRC of a frame including its own checksum is 0 so the checksum does not have to be sliced off
+        '''
+        if crc16.modbus(frame) == 0:
+            return True
+
+        view = memoryview(frame)
+        checksum = CHECKSUM.unpack_from(view, len(frame) - 2)[0]
+        calculatedchecksum = crc16.modbus(view[:-2])
+        raise(ChecksumMismatchException(f'''CHECKSUM DOES NOT MATCH got: {checksum.to_bytes(2,'little')} expected {calculatedchecksum.to_bytes(2,'little')}'''))
+
+    def isexception(self, frame):
+        return frame[1] & 0x80 == 0x80
+
+    def decoderegister(self, frame, index=0):
+        '''
+        Value of one register in a READ_SPECIAL_FUNCTION response
+        '''
+        return REGISTER.unpack_from(frame, 3 + (index * 2))[0]
+
+    def decoderegisters(self, frame):
+        '''
+        All registers of a READ_SPECIAL_FUNCTION response as one int with the first register in the lowest 16 bits
+        '''
+        value = 0
+        shift = 0
+        for registervalue in REGISTERS[frame[2] // 2].unpack_from(frame, 3):
+            value = value | (registervalue << shift)
+            shift += 16
+        return value
+
+    def decodebits(self, frame):
+        '''
+        Coil or input states of a READ_DO or READ_DI response as one int with the first coil or input in bit 0
+        '''
+        bytecount = frame[2]
+        return int.from_bytes(memoryview(frame)[3:3 + bytecount], signed=False, byteorder='little')
+
+
+class ModbusFrameReader():
+    '''
+    Collects received bytes and hands back complete responses with a valid checksum.
+
+    Bytes that cannot be the start of the expected response (wrong slave address or function code, or a frame with a bad checksum) are dropped one at a time until a valid frame lines up, so noise on the line does not throw away a good response behind it.
+    '''
+    def __init__(self, modbusaddress):
+        self.__modbusaddress__ = modbusaddress
+        self.__buffer__ = bytearray()
+        self.discardedbytes = 0
+
+    def clear(self):
+        self.discardedbytes += len(self.__buffer__)
+        self.__buffer__.clear()
+
+    def feed(self, data):
+        self.__buffer__ += data
+
+    def __framelength__(self, functioncode):
+        '''
+        Length of the response at the start of the buffer, None when not enough bytes have arrived to tell
+        '''
+        buffer = self.__buffer__
+        if len(buffer) < 2:
+            return None
+        if buffer[1] & 0x80:
+            return EXCEPTION_RESPONSE_LENGTH
+        if functioncode in READFUNCTIONCODES:
+            if len(buffer) < 3:
+                return None
+            return 5 + buffer[2]
+        return WRITE_RESPONSE_LENGTH
+
+    def needed(self, functioncode):
+        '''
+        Smallest number of bytes still to arrive before a response to functioncode could be complete
+        '''
+        length = self.__framelength__(functioncode)
+        if length is None:
+            return max(1, EXCEPTION_RESPONSE_LENGTH - len(self.__buffer__))
+        return max(1, length - len(self.__buffer__))
+
+    def frame(self, functioncode):
+        '''
+        Remove and return the first complete response to functioncode from this slave, None when it has not all arrived yet
+        '''
+        buffer = self.__buffer__
+        while len(buffer) > 0:
+            if buffer[0] != self.__modbusaddress__ or (len(buffer) > 1 and buffer[1] & 0x7F != functioncode):
+                del buffer[0]
+                self.discardedbytes += 1
+                continue
+
+            length = self.__framelength__(functioncode)
+            if length is None or len(buffer) < length:
+                return None
+
+            if crc16.modbus(memoryview(buffer)[:length]) == 0:
+                frame = bytes(buffer[:length])
+                del buffer[:length]
+                return frame
+
+            del buffer[0]
+            self.discardedbytes += 1
+        return None
+
+    def read(self, serialport, functioncode, timeout):
+        '''
+        Read from a pyserial port until a complete response to functioncode arrives, raises ModbusTimeoutException when the line goes quiet or the timeout passes first.
+
+        Each read asks for exactly the bytes still needed so it returns the moment the frame is complete, the serial timeout only bounds how long the line can stay silent.
+        '''
+        if isinstance(functioncode, str):
+            functioncode = FUNCTIONCODES[functioncode]
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.frame(functioncode)
+            if frame is not None:
+                return frame
+            data = serialport.read(self.needed(functioncode))
+            if len(data) == 0 or time.monotonic() > deadline:
+                self.feed(data)
+                frame = self.frame(functioncode)
+                if frame is not None:
+                    return frame
+                raise(ModbusTimeoutException(f'''No complete response to function code {functioncode} from Modbus address {self.__modbusaddress__} got: {bytes(self.__buffer__)}'''))
+            self.feed(data)
@@ -0,0 +1,122 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Health tracking of a module on the bus
+
+Notes:
+    A module that fails failurethreshold polls in a row is quarantined and is then only probed on an exponential backoff schedule, so a dead module costs one timeout every so often instead of one every poll cycle.
+    The first successful probe puts the module back into normal polling.
+    Writes are not queued up for a quarantined module, they fail with ModuleQuarantinedException so the caller knows the output was not set.
+'''
+
+import time
+
+
+HEALTHY = 'HEALTHY'
+QUARANTINED = 'QUARANTINED'
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_INITIAL_BACKOFF = 0.5
+DEFAULT_MAXIMUM_BACKOFF = 30.0
+
+
+class ModuleQuarantinedException(Exception):
+    """Write refused because the module is quarantined after failing to answer"""
+
+
+class ModuleHealth():
+    def __init__(self, failurethreshold=DEFAULT_FAILURE_THRESHOLD, initialbackoff=DEFAULT_INITIAL_BACKOFF, maximumbackoff=DEFAULT_MAXIMUM_BACKOFF, ):
+        self.__failurethreshold__ = failurethreshold
+        self.__initialbackoff__ = initialbackoff
+        self.__maximumbackoff__ = maximumbackoff
+        self.__state__ = HEALTHY
+        self.__consecutivefailures__ = 0
+        self.__backoff__ = initialbackoff
+        self.__nextprobeat__ = 0.0
+
+        self.failures = 0
+        self.successes = 0
+        self.skipped = 0
+
+    @property
+    def state(self):
+        return self.__state__
+
+    @property
+    def consecutivefailures(self):
+        return self.__consecutivefailures__
+
+    @property
+    def nextprobeat(self):
+        '''
+        time.monotonic() of the next probe of a quarantined module
+        '''
+        return self.__nextprobeat__
+
+    def shouldpoll(self, now=None):
+        if self.__state__ == HEALTHY:
+            return True
+        if now is None:
+            now = time.monotonic()
+        if now >= self.__nextprobeat__:
+            return True
+        self.skipped += 1
+        return False
+
+    def recordsuccess(self):
+        '''
+        Returns True when this moves the module out of quarantine
+        '''
+        self.successes += 1
+        self.__consecutivefailures__ = 0
+        self.__backoff__ = self.__initialbackoff__
+        if self.__state__ == QUARANTINED:
+            self.__state__ = HEALTHY
+            return True
+        return False
+
+    def recordfailure(self, now=None):
+        '''
+        Returns True when this moves the module into quarantine
+        '''
+        if now is None:
+            now = time.monotonic()
+        self.failures += 1
+        self.__consecutivefailures__ += 1
+
+        if self.__state__ == QUARANTINED:
+            self.__backoff__ = min(self.__backoff__ * 2, self.__maximumbackoff__)
+            self.__nextprobeat__ = now + self.__backoff__
+            return False
+
+        if self.__consecutivefailures__ >= self.__failurethreshold__:
+            self.__state__ = QUARANTINED
+            self.__backoff__ = self.__initialbackoff__
+            self.__nextprobeat__ = now + self.__backoff__
+            return True
+        return False
@@ -38,193 +38,248 @@ import configparser
 import argparse
 from paho.mqtt import client as mqtt_client
 from multipleModuleManager import MultipleModuleManager
+from multiBusManager import MultiBusManager
+from processBusManager import ProcessBusManager
+from busScheduler import PRIORITY_SCHEDULED
+from discoveryCache import DiscoveryCache
 import re
 import logging
 import subprocess
 import sqlite3
 import sys
 import math
+import threading
+import functools
+from topicRouter import TopicRouter
+from messageTemplate import MessageTemplate
+from deviceStatus import DeviceStatusCache
+from timerEngine import TimerEngine
 
 from parsers import *
 
 def on_mqtt_message(client, userdata, msg):
-    logger.debug(f'''Incoming MQTT topic {msg.topic} and message: {msg.payload.decode('utf-8')}''')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f'''Incoming MQTT topic {msg.topic} and message: {msg.payload.decode('utf-8', errors='replace')}''')
 
+    '''
+    A handler returns True when no later handler of the topic should run
+    '''
+    for handler in topicRouter.match(msg.topic):
+        if handler(client, msg):
+            return
 
-    if msg.topic == mqtt_device_status_request_topic:
-        logger.debug(f'''Got MQTT message on topic {msg.topic}''')
-        msgPayload = msg.payload.decode("utf-8")
-        
-        inputAddresses = None
-        outputAddresses = None
-        modulesModbusAddressList = modules.getModbusAddresses()
-        try:
-            jsonMessage = json.loads( msg.payload.decode("utf-8") )
-        except JSONDecodeError:
-            jsonMessage = {}
-
-        if 'modulesModbusAddress' in jsonMessage:
-            modulesModbusAddressList = [jsonMessage['modulesModbusAddress']]
-        if 'inputAddresses' in jsonMessage:
-            inputAddresses = jsonMessage['inputAddresses']
-        if 'outputAddresses' in jsonMessage:
-            outputAddresses = jsonMessage['outputAddresses']
-
-        modulesList = []
-        for modbusAddress in modulesModbusAddressList:
-            if inputAddresses is None:
-                inputs = modules.getInputs( modbusAddress )
-            else:
-                inputs = modules.getInputs( modbusAddress,inputAddresses)
-
-            if outputAddresses is None:
-                outputs = modules.getOutputs( modbusAddress )
-            else:
-                outputs = modules.getOutputs( modbusAddress, outputAddresses)
-
-            inputList = []
-
-            if inputs is not None and len(inputs) > 0:
-                for input in inputs:
-                    inputList.append( f'''{{"number": "{input['number']}", "value": "{input['value']}", "lastChanged": "{input['lastchangestr']}"}}''')
-            outputList = []
-
-            if outputs is not None and len(outputs) > 0:
-                for output in outputs:
-                    outputList.append( f'''{{"number": "{output['number']}", "value": "{output['value']}", "lastChanged": "{output['lastchangestr']}"}}''')
-
-            inputStr = ",".join(inputList)
-            outputStr = ",".join(outputList)
-            modulesList.append( f'''"modbusAddress":{modbusAddress},"inputs":[{inputStr}],"outputs":[{outputStr}]''')
-        modulesStr = ",".join(modulesList)
+def on_device_status_request(client, msg):
+    logger.debug(f'''Got MQTT message on topic {msg.topic}''')
 
-        message = f'''{{"Modules": [{{{modulesStr}}}] }}'''
+    inputAddresses = None
+    outputAddresses = None
+    modulesModbusAddressList = modules.getModbusAddresses()
+    try:
+        jsonMessage = json.loads( msg.payload.decode("utf-8") )
+    except (JSONDecodeError, UnicodeDecodeError):
+        jsonMessage = {}
+    if not isinstance(jsonMessage, dict):
+        jsonMessage = {}
+
+    if 'modulesModbusAddress' in jsonMessage:
+        modulesModbusAddressList = jsonMessage['modulesModbusAddress']
+        if not isinstance(modulesModbusAddressList, list):
+            modulesModbusAddressList = [modulesModbusAddressList]
+    if 'inputAddresses' in jsonMessage:
+        inputAddresses = jsonMessage['inputAddresses']
+    if 'outputAddresses' in jsonMessage:
+        outputAddresses = jsonMessage['outputAddresses']
 
-        scheduledOutputs = []
-        query = f'''SELECT
-                                    *
-                            FROM
-                                    scheduledEvents;
-                            '''
-        cur.execute( query )
-        rows = cur.fetchall()
+    '''
+    The state comes from the published snapshots so a status request never waits for the bus, only the modules changed since the last request are encoded again
+    '''
+    modulesStr = deviceStatus.modules( modules.getSnapshots(), modulesModbusAddressList, inputAddresses, outputAddresses )
 
-        if len( rows ) > 0:
-            for scheduledEvent in rows:
-                logger.info(f'''timestamp: {scheduledEvent['timestamp']} createdAt: {scheduledEvent['createdAt']} MODBUS_ADDR: {scheduledEvent['MODBUS_ADDR']} MODBUS_IO: {scheduledEvent['MODBUS_IO']} with Value: {scheduledEvent['outputState']}''')
-                scheduledOutputs.append( f'''{{"timestamp": {scheduledEvent['timestamp']}, "timestampStr": "{datetime.datetime.fromtimestamp(scheduledEvent['timestamp'],datetime.UTC).strftime("%Y-%m-%d-%H:%M:%S.%f")}", "createdAt": {scheduledEvent['createdAt']}, "MODBUS_ADDR": {scheduledEvent['MODBUS_ADDR']}, "MODBUS_IO": {scheduledEvent['MODBUS_IO']}, "value": {scheduledEvent['outputState']} }}''' )
+    message = f'''{{"Modules": {modulesStr}}}'''
 
-            scheduledOutputs = ",".join( scheduledOutputs )
-            message = f'''{{"Modules": [{{{modulesStr}}}], "ScheduledOutputs": [{scheduledOutputs}]}}'''
+    scheduledOutputs = scheduledOutputsJSON()
+    if scheduledOutputs is not None:
+        message = f'''{{"Modules": {modulesStr}, "ScheduledOutputs": {scheduledOutputs}}}'''
 
-        client.publish(mqtt_device_status_response_topic, message, qos=mqtt_qos )
-        return
+    client.publish(mqtt_device_status_response_topic, message, qos=mqtt_qos )
+    return True
 
-    if msg.topic == mqtt_hexiaecimal_control_topic:
+def scheduledOutputsJSON(modbusAddress=None, limit=None):
+    '''
+    JSON list of the scheduled output changes in the order they are due, None when there are none
+    modbusAddress only lists the changes of one module and limit the first limit of them
+    '''
+    keys = None
+    if modbusAddress is not None:
+        keys = lambda key: key[0] == modbusAddress
+    pending = scheduledOutputs.pending( limit=limit, keys=keys )
+
+    if len( pending ) == 0:
+        return None
+
+    scheduledOutputsList = []
+    for (modbusAddress, output), timestamp, createdAt, outputState in pending:
+        scheduledOutputsList.append( json.dumps( {
+                                                "timestamp":    timestamp,
+                                                "timestampStr": datetime.datetime.fromtimestamp(timestamp,datetime.UTC).strftime("%Y-%m-%d-%H:%M:%S.%f"),
+                                                "createdAt":    createdAt,
+                                                "MODBUS_ADDR":  modbusAddress,
+                                                "MODBUS_IO":    output,
+                                                "value":        outputState,
+                                            } ) )
+    return f'''[{", ".join( scheduledOutputsList )}]'''
+
+def on_scheduled_request(client, msg):
+    '''
+    Lists the pending scheduled output changes, the request may hold {"modbusAddress": 1, "limit": 100}
+    '''
+    try:
         jsonMessage = json.loads( msg.payload.decode("utf-8") )
-        keepCurrent = False
-        if 'keepCurrent' in jsonMessage:
-            keepCurrent = jsonMessage['keepCurrent']
-        if 'Output' in jsonMessage and 'modbusaddress' in jsonMessage and 'value' in jsonMessage:
+    except (JSONDecodeError, UnicodeDecodeError):
+        jsonMessage = {}
+    if not isinstance(jsonMessage, dict):
+        jsonMessage = {}
+
+    modbusAddress = jsonMessage.get('modbusAddress')
+    limit = jsonMessage.get('limit')
+    if modbusAddress is not None and ( not isinstance(modbusAddress, int) or isinstance(modbusAddress, bool) ):
+        logger.warning(f'''Ignored scheduled outputs request on {msg.topic}, modbusAddress must be an integer got: {modbusAddress!r}''')
+        return True
+    if limit is not None and ( not isinstance(limit, int) or isinstance(limit, bool) or limit < 0 ):
+        logger.warning(f'''Ignored scheduled outputs request on {msg.topic}, limit must be an integer of 0 or more got: {limit!r}''')
+        return True
+
+    scheduledOutputsStr = scheduledOutputsJSON( modbusAddress=modbusAddress, limit=limit )
+    if scheduledOutputsStr is None:
+        scheduledOutputsStr = '[]'
+    message = f'''{{"Pending": {len(scheduledOutputs)}, "ScheduledOutputs": {scheduledOutputsStr}}}'''
+    client.publish(mqtt_scheduled_response_topic, message, qos=mqtt_qos )
+    return True
+
+def scheduled_output_due(key, outputState, timestamp):
+    modbusAddress, output = key
+    logger.info(f'''Ran scheduled event for MODBUS_ADDR: {modbusAddress} MODBUS_IO: {output} with Value: {outputState}''')
+    try:
+        modules.updateOutput(modbusAddress,output,outputState,priority=PRIORITY_SCHEDULED)
+    except Exception as exception:
+        logger.warning(f'''Scheduled event for MODBUS_ADDR: {modbusAddress} MODBUS_IO: {output} failed: {exception}''')
+
+def on_hexadecimal_control(client, msg):
+    try:
+        jsonMessage = json.loads( msg.payload.decode("utf-8") )
+    except (JSONDecodeError, UnicodeDecodeError):
+        jsonMessage = None
+    if not isinstance(jsonMessage, dict):
+        logger.warning(f'''Ignored hexadecimal control on {msg.topic}, the message is not a JSON object''')
+        return False
+    keepCurrent = False
+    if 'keepCurrent' in jsonMessage:
+        keepCurrent = jsonMessage['keepCurrent']
+    if 'Output' in jsonMessage and 'modbusaddress' in jsonMessage and 'value' in jsonMessage:
+        try:
             modules.updateOutputsByHexStr( jsonMessage['modbusaddress'], jsonMessage['Output'],outputValue=jsonMessage['value'],keepCurrent=keepCurrent)
+        except Exception as exception:
+            logger.warning(f'''Output write failed: {exception}''')
+    return False
+
+def on_command(commandConfig, client, msg):
+    commandList = commandConfig['COMMAND'].split(" ")
+    execute = subprocess.run( commandList )
+    returnCode = execute.returncode
+    logger.info(commandConfig['LOG_MESSAGE'] % {
+                                                    'command': commandConfig['COMMAND'],
+                                                    'message': msg.payload.decode("utf-8", errors='replace'),
+                                                    'topic': msg.topic, 'returncode': returnCode
+                                                })
+    return True
+
+def on_gpio_output(gpioConfig, client, msg):
+    logger.debug( f'''Found GPIO Config {gpioConfig}''')
+    functionName = "PARSER_" + gpioConfig['MQTT_PARSER']
+    try:
+        jsonMessage = json.loads( msg.payload.decode("utf-8") )
+    except (JSONDecodeError, UnicodeDecodeError):
+        jsonMessage = None
+    if not isinstance(jsonMessage, dict):
+        logger.warning(f'''Ignored output command on {msg.topic}, the message is not a JSON object''')
+        return True
+    try:
+        value = globals()[ functionName ]( msg, gpioConfig )
+    except (KeyError, ValueError, TypeError, AttributeError) as exception:
+        logger.warning(f'''Ignored output command on {msg.topic}, {gpioConfig['MQTT_PARSER']} could not parse it: {exception!r}''')
+        return True
+
+    if rs485_coalesce_window:
+        '''
+        Not waiting for the write lets the next command of a scene join it in the coalescing window
+        '''
+        modules.updateOutputFuture(gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO'],value).add_done_callback(output_write_done)
+    else:
+        try:
+            modules.updateOutput(gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO'],value)
+        except Exception as exception:
+            logger.warning(f'''Output write failed: {exception}''')
+
+    logger.info(gpioConfig['LOG_MESSAGE'] % { 
+                                                'address': gpioConfig['MODBUS_ADDR'],
+                                                'output': gpioConfig['MODBUS_IO'], 
+                                                'value': value, 
+                                                'message': msg.payload.decode("utf-8"), 
+                                                'topic': msg.topic 
+                                                })
+    if 'DelayActionTime' in jsonMessage and 'DelayAction' in jsonMessage:
+        actionTime = convertValueToTimestamp( jsonMessage['DelayActionTime'] )
+        logger.debug(f'''Got MQTT message DelayActionTime: {jsonMessage['DelayActionTime']} and DelayAction: {jsonMessage['DelayAction']} scheduled for: {actionTime}''')
+
+        '''
+        A new DelayAction replaces the one the output had, a negative DelayActionTime such as {"seconds": -1} only cancels it
+        '''
+        delayActionTime = jsonMessage['DelayActionTime']
+        if isinstance(delayActionTime, str):
+            try:
+                delayActionTime = json.loads( delayActionTime )
+            except JSONDecodeError:
+                pass
+
+        if isinstance(delayActionTime, dict) and any( isinstance(interval, (int, float)) and interval < 0 for interval in delayActionTime.values() ):
+            if scheduledOutputs.cancel( (gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO']) ):
+                logger.info(f'''Cancelled the scheduled event for MODBUS_ADDR: {gpioConfig['MODBUS_ADDR']} MODBUS_IO: {gpioConfig['MODBUS_IO']}''')
+        elif actionTime > 0:
+            logger.debug(f'''MODBUS_ADDR: {gpioConfig['MODBUS_ADDR']} MODBUS_IO: {gpioConfig['MODBUS_IO']} timestamp: {actionTime} outputState: {jsonMessage['DelayAction']} ''')
+            scheduledOutputs.schedule( (gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO']), actionTime, jsonMessage['DelayAction'] )
+    return True
 
-    for commandConfig in commandConfigs:
-        if msg.topic == commandConfig['MQTT_TOPICS']:
-            commandList = commandConfig['COMMAND'].split(" ")
-            execute = subprocess.run( commandList )
-            returnCode = execute.returncode
-            logger.info(commandConfig['LOG_MESSAGE'] % {
-                                                            'command': commandConfig['COMMAND'],
-                                                            'message': msg.payload.decode("utf-8"),
-                                                            'topic': msg.topic, 'returncode': returnCode
-                                                        })
-            return
+def gpio_input_callback(modbusAddress, input, state):
+    route = inputRoutes.get( (modbusAddress, input) )
+    if route is None:
+        return None
 
-    logger.debug( f'''gpioConfigs: {gpioConfigs}''')
-    for gpioConfig in gpioConfigs:
-        if msg.topic in gpioConfig['MQTT_TOPICS'] and gpioConfig['GPIO_TYPE'] == 'OUTPUT':
-            logger.debug( f'''Found GPIO Config {gpioConfig}''')
-            functionName = "PARSER_" + gpioConfig['MQTT_PARSER']
-            value = globals()[ functionName ]( msg, gpioConfig )
+    nowObj = datetime.datetime.now(datetime.UTC)
+    value = BOOL_ONOFFSTRING(state).lower()
 
-            modules.updateOutput(gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO'],value)
+    for gpioConfig in route['INPUTS']:
+        message = gpioConfig['MQTT_TEMPLATE'].render(modbusAddress, input, value, nowObj)
+        client.publish(gpioConfig['MQTT_TOPICS'][0], message, qos=gpioConfig['MQTT_QOS'] )
+        logger.info(gpioConfig['LOG_MESSAGE'] % {
+                                                 'message': message,
+                                                 'topic': gpioConfig['MQTT_TOPICS']
+                                                 })
 
-            logger.info(gpioConfig['LOG_MESSAGE'] % { 
-                                                        'address': gpioConfig['MODBUS_ADDR'],
-                                                        'output': gpioConfig['MODBUS_IO'], 
-                                                        'value': value, 
-                                                        'message': msg.payload.decode("utf-8"), 
-                                                        'topic': msg.topic 
-                                                        })
-            jsonMessage = json.loads( msg.payload.decode("utf-8") )
-            if 'DelayActionTime' in jsonMessage and 'DelayAction' in jsonMessage:
-                actionTime = convertValueToTimestamp( jsonMessage['DelayActionTime'] )
-                logger.debug(f'''Got MQTT message DelayActionTime: {jsonMessage['DelayActionTime']} and DelayAction: {jsonMessage['DelayAction']} scheduled for: {actionTime}''')
-
-                deleteQuery = f'''DELETE FROM scheduledEvents WHERE MODBUS_ADDR=? AND MODBUS_IO=?;'''
-
-                if 'DelayActionTime' in jsonMessage and isinstance(jsonMessage['DelayActionTime'],list) and next(iter(jsonMessage['DelayActionTime'].values())) < 0:
-                    cur.execute(deleteQuery,(gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO']))
-                    db.commit()
-
-                if actionTime > 0:
-                    nowObj = datetime.datetime.now(datetime.UTC)
+    if len(route['VIRTUALINPUTS']) == 0:
+        return None
 
-                    #Remove any existing scheduled events
-                    cur.execute(deleteQuery,(gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO']))
-
-                    query = f'''INSERT INTO scheduledEvents (MODBUS_ADDR,
-                                                                MODBUS_IO,
-                                                                createdAt,
-                                                                timestamp,
-                                                                outputState)
-                                                        VALUES (
-                                                                ?,
-                                                                ?,
-                                                                ?,
-                                                                ?,
-                                                                ?);'''
-
-                    logger.debug(f'''MODBUS_ADDR: {gpioConfig['MODBUS_ADDR']} MODBUS_IO: {gpioConfig['MODBUS_IO']} createdAt: {nowObj.timestamp()}, timestamp: {actionTime} outputState: {jsonMessage['DelayAction']} ''')
-                    cur.execute(query, (gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO'],nowObj.timestamp(),actionTime,jsonMessage['DelayAction'],))
-
-                    db.commit()
-            return
+    holdDurationTimeDelta = None
+    if value == 'off':
+        inputData = modules.getInput(modbusAddress,input)
+        holdDurationTimeDelta = inputData['lastOff'] - inputData['lastOn']
 
-def gpio_input_callback(modbusAddress, input, state):
-    nowObj = datetime.datetime.now(datetime.UTC)
-    for gpioConfig in gpioConfigs:
-        if gpioConfig['MODBUS_ADDR'] == modbusAddress and gpioConfig['MODBUS_IO'] == input and gpioConfig['GPIO_TYPE'] == 'INPUT':
-            value = BOOL_ONOFFSTRING(state).lower()
-            message = gpioConfig['MQTT_MESSAGE']. \
-                    replace('{MODBUSADDRESS}', str(modbusAddress)). \
-                    replace('{INPUT}', str(input)). \
-                    replace('{STATE}', value). \
-                    replace('{UTCTIMESTAMP}', str(nowObj.timestamp())).\
-                    replace('{UPDATEDAT}', nowObj.strftime("%Y-%m-%d-%H:%M:%S.%f")
-                    )
-            client.publish(gpioConfig['MQTT_TOPICS'][0], message, qos=gpioConfig['MQTT_QOS'] )
-            
-            for arrayIndex,vi in enumerate(virtualInputs):
-                if vi['MODBUS_ADDR'] == modbusAddress and vi['MODBUS_IO'] == input:
-
-                    if value == 'off':
-                        inputData = modules.getInput(gpioConfig['MODBUS_ADDR'],gpioConfig['MODBUS_IO'])
-                        holdDurationTimeDelta = inputData['lastOff'] - inputData['lastOn']
-                        if holdDurationTimeDelta > datetime.timedelta(seconds=0.5):
-                            #here we go
-                            message = vi['MQTT_HOLD_MESSAGE']. \
-                                        replace('{MODBUSADDRESS}', str(modbusAddress)). \
-                                        replace('{INPUT}', str(input)). \
-                                        replace('{STATE}', value). \
-                                        replace('{UTCTIMESTAMP}', str(nowObj.timestamp())). \
-                                        replace('{UPDATEDAT}', nowObj.strftime("%Y-%m-%d-%H:%M:%S.%f")). \
-                                        replace('{HOLDTIME}',str(holdDurationTimeDelta.total_seconds()))
-                                        
-                            client.publish(vi['MQTT_HOLD_TOPICS'][0],message, qos=gpioConfig['MQTT_QOS'] )
-                            
-
-                    query = f'''INSERT INTO virtualInputEvents (MODBUS_ADDR,
+    for arrayIndex,vi in route['VIRTUALINPUTS']:
+        if holdDurationTimeDelta is not None and holdDurationTimeDelta > datetime.timedelta(seconds=0.5) and vi['MQTT_HOLD_TEMPLATE'] is not None and len(vi['MQTT_HOLD_TOPICS']) > 0:
+            message = vi['MQTT_HOLD_TEMPLATE'].render(modbusAddress, input, value, nowObj, holdDurationTimeDelta.total_seconds())
+
+            client.publish(vi['MQTT_HOLD_TOPICS'][0],message, qos=vi['MQTT_QOS'] )
+
+        query = f'''INSERT INTO virtualInputEvents (MODBUS_ADDR,
 				                                MODBUS_IO,
                                 				MQTT_TOPICS,
                       			                MQTT_MESSAGE,
@@ -242,13 +297,64 @@ def gpio_input_callback(modbusAddress, input, state):
 								?,
 								?
 								);'''
-                    cur.execute(query, (vi['MODBUS_ADDR'],vi['MODBUS_IO'],json.dumps({"MQTT_TOPICS": vi['MQTT_TOPICS']}),vi['MQTT_MESSAGE'],nowObj.timestamp(),vi['GPIO_PIN_STATE'],vi['GPIO_TYPE'],arrayIndex))
-                    db.commit()
-                    break
-            logger.info(gpioConfig['LOG_MESSAGE'] % {
-                                                     'message': message,
-                                                     'topic': gpioConfig['MQTT_TOPICS']
-                                                     })
+        with dblock:
+            cur.execute(query, (vi['MODBUS_ADDR'],vi['MODBUS_IO'],json.dumps({"MQTT_TOPICS": vi['MQTT_TOPICS']}),vi['MQTT_MESSAGE'],nowObj.timestamp(),vi['GPIO_PIN_STATE'],vi['GPIO_TYPE'],arrayIndex))
+            db.commit()
+
+def buildInputRoutes():
+    '''
+    {(modbusaddress, input): {'INPUTS': [gpioConfig], 'VIRTUALINPUTS': [(arrayIndex, virtualInput)]}} so an input edge only visits the sections configured on that input
+    Every INPUT section on an input publishes its message and every VIRTUALINPUT section on it records the edge once
+    '''
+    routes = {}
+    for gpioConfig in gpioConfigs:
+        if gpioConfig['GPIO_TYPE'] == 'INPUT':
+            route = routes.setdefault( (gpioConfig['MODBUS_ADDR'], gpioConfig['MODBUS_IO']), {'INPUTS': [], 'VIRTUALINPUTS': []} )
+            route['INPUTS'].append( gpioConfig )
+    for arrayIndex,vi in enumerate(virtualInputs):
+        route = routes.setdefault( (vi['MODBUS_ADDR'], vi['MODBUS_IO']), {'INPUTS': [], 'VIRTUALINPUTS': []} )
+        route['VIRTUALINPUTS'].append( (arrayIndex, vi) )
+    return routes
+
+def output_change_callback(modbusAddress, output, state):
+    logger.warning(f'''Output {output} at Modbus address {modbusAddress} was read back as {state} which is not what was last written''')
+
+def poll_plan_callback(port, feasible, utilisation):
+    if feasible:
+        logger.info(f'''Poll targets on {port} fit on the bus again, the polls need {utilisation:.0%} of it''')
+    else:
+        logger.warning(f'''Poll targets on {port} cannot be met at the current baud rate, the polls would need {utilisation:.0%} of the bus''')
+
+def output_write_done(future):
+    if future.exception() is not None:
+        logger.warning(f'''Output write failed: {future.exception()}''')
+
+def module_health_callback(modbusAddress, state):
+    logger.warning(f'''Module at Modbus address {modbusAddress} is now {state}''')
+    if mqtt_module_health_topic:
+        nowObj = datetime.datetime.now(datetime.UTC)
+        message = json.dumps({"ModbusAddress": modbusAddress, "State": state, "UTCtimestamp": nowObj.timestamp()})
+        client.publish(mqtt_module_health_topic, message, qos=mqtt_qos )
+
+def buildTopicRouter():
+    '''
+    The handlers are added in the order on_mqtt_message used to try them, the status request, the hexadecimal control, the commands and then the outputs in the order of the configuration file
+    '''
+    router = TopicRouter()
+    if mqtt_device_status_request_topic is not None and mqtt_device_status_request_topic != '':
+        router.add( mqtt_device_status_request_topic, on_device_status_request )
+    if mqtt_hexiaecimal_control_topic is not None and mqtt_hexiaecimal_control_topic != '':
+        router.add( mqtt_hexiaecimal_control_topic, on_hexadecimal_control )
+    if mqtt_scheduled_request_topic is not None and mqtt_scheduled_request_topic != '':
+        router.add( mqtt_scheduled_request_topic, on_scheduled_request )
+    for commandConfig in commandConfigs:
+        router.add( commandConfig['MQTT_TOPICS'], functools.partial( on_command, commandConfig ) )
+    for gpioConfig in gpioConfigs:
+        if gpioConfig['GPIO_TYPE'] == 'OUTPUT':
+            handler = functools.partial( on_gpio_output, gpioConfig )
+            for mqtt_topic in gpioConfig['MQTT_TOPICS']:
+                router.add( mqtt_topic, handler )
+    return router
 
 def on_mqtt_connect(client, userdata, flags, rc, properties):
     global mqtt_connected
@@ -269,6 +375,9 @@ def on_mqtt_connect(client, userdata, flags, rc, properties):
         if mqtt_hexiaecimal_control_topic is not None and mqtt_hexiaecimal_control_topic != '':
             client.subscribe( mqtt_hexiaecimal_control_topic )
 
+        if mqtt_scheduled_request_topic is not None and mqtt_scheduled_request_topic != '':
+            client.subscribe( mqtt_scheduled_request_topic )
+
         for cmnd in commandConfigs:
             client.subscribe( cmnd['MQTT_TOPICS'] )
         for gpio in gpioConfigs:
@@ -277,7 +386,7 @@ def on_mqtt_connect(client, userdata, flags, rc, properties):
     else:
         mqtt_connected = False
 
-def on_mqtt_disconnect(client, userdata, rc):
+def on_mqtt_disconnect(client, userdata, flags, rc, properties):
     global mqtt_connected
     mqtt_connected = False
 
@@ -288,10 +397,14 @@ def mqtt_connect(mqtt_host,mqtt_port,mqtt_connected,client):
                         port=mqtt_port,
                         keepalive=60,
                     )
-        client.loop(5)
+
+'''
+The MQTT callbacks run on the paho network thread and the input callbacks on the bus worker thread, dblock is held around every use of the shared cursor
+'''
+dblock = threading.RLock()
 
 def sqliteSetup():
-    db = sqlite3.connect("file::memory:?cache=shared")
+    db = sqlite3.connect("file::memory:?cache=shared", check_same_thread=False)
     db.row_factory =  dict_factory
     cur = db.cursor()
 
@@ -306,19 +419,22 @@ def sqliteSetup():
 				arrayIndex INTEGER NOT NULL
 				);''')
     db.commit()
-    cur.execute('''CREATE TABLE scheduledEvents (
-                                MODBUS_ADDR INTEGER NOT NULL,
-                                MODBUS_IO INTEGER NOT NULL,
-                                createdAt FLOAT NOT NULL,
-                                timestamp FLOAT NOT NULL,
-                                outputState TEXT NOT NULL
-                                );''')
-
-    db.commit()
     return cur,db
 
-def initialise(modbusaddresses,DELAY):
-    global mqtt_connected, mqtt_startup_message, mqtt_startup_topic, mqtt_qos, mqtt_retain, mqtt_device_status_request_topic, mqtt_device_status_response_topic, mqtt_hexiaecimal_control_topic, commandConfigs, gpioConfigs, virtualInputs
+def initialise(modbusaddresses=None,DELAY=0.01):
+    global mqtt_connected, mqtt_startup_message, mqtt_startup_topic, mqtt_qos, mqtt_retain, mqtt_device_status_request_topic, mqtt_device_status_response_topic, mqtt_hexiaecimal_control_topic, mqtt_module_health_topic, rs485_coalesce_window, commandConfigs, gpioConfigs, virtualInputs, topicRouter, inputRoutes, deviceStatus, mqtt_scheduled_request_topic, mqtt_scheduled_response_topic, scheduledOutputs
+    '''
+    Incoming topics and input edges are routed once the configuration is read, until then nothing matches
+    '''
+    topicRouter = TopicRouter()
+    inputRoutes = {}
+    deviceStatus = DeviceStatusCache()
+
+    '''
+    Scheduled output changes from DelayAction, keyed by (modbus address, output)
+    '''
+    scheduledOutputs = TimerEngine(fire=scheduled_output_due)
+
     '''
     Configs for running shell commands
     '''
@@ -372,8 +488,38 @@ def initialise(modbusaddresses,DELAY):
     mqtt_device_status_request_topic	= config['DEFAULT']['MQTT_DEVICE_STATUS_REQUEST_TOPIC']
     mqtt_device_status_response_topic	= config['DEFAULT']['MQTT_DEVICE_STATUS_RESPONSE_TOPIC']
     mqtt_hexiaecimal_control_topic	    = config['DEFAULT']['MQTT_HEXADECIMAL_CONTROL_TOPIC']
+    mqtt_module_health_topic            = config['DEFAULT'].get('MQTT_MODULE_HEALTH_TOPIC', fallback='')
+    mqtt_scheduled_request_topic        = config['DEFAULT'].get('MQTT_SCHEDULED_REQUEST_TOPIC', fallback='')
+    mqtt_scheduled_response_topic       = config['DEFAULT'].get('MQTT_SCHEDULED_RESPONSE_TOPIC', fallback='')
     device_name                         = config['DEFAULT']['RS485_DEVICE']
-    baud_rate                           = config['DEFAULT']['RS485_BAUD_RATE']
+    baud_rate                           = int(config['DEFAULT']['RS485_BAUD_RATE'])
+    rs485_scan                          = config['DEFAULT'].getboolean('RS485_SCAN', fallback=False)
+    rs485_discovery_cache               = config['DEFAULT'].get('RS485_DISCOVERY_CACHE', fallback='')
+    rs485_buses                         = config['DEFAULT'].get('RS485_BUSES', fallback='')
+    rs485_process_per_bus               = config['DEFAULT'].getboolean('RS485_PROCESS_PER_BUS', fallback=False)
+    rs485_coalesce_window               = config['DEFAULT'].getfloat('RS485_COALESCE_WINDOW', fallback=0.0)
+    rs485_reassert_interval             = config['DEFAULT'].getfloat('RS485_OUTPUT_REASSERT_INTERVAL', fallback=0.0) or None
+    rs485_output_poll_interval          = config['DEFAULT'].getfloat('RS485_OUTPUT_POLL_INTERVAL', fallback=0.0) or None
+    rs485_poll_targets                  = config['DEFAULT'].get('RS485_POLL_TARGETS', fallback='')
+
+    '''
+    Modules to connect are the ones listed in RS485_MODBUS_ADDRESSES, any passed in and any used by a GPIO or VIRTUALINPUT section
+    '''
+    if modbusaddresses is None:
+        modbusaddresses = []
+    modbusaddresses = set(modbusaddresses)
+    if 'RS485_MODBUS_ADDRESSES' in config['DEFAULT']:
+        modbusaddresses.update( json.loads( config['DEFAULT']['RS485_MODBUS_ADDRESSES'] ) )
+    for section in config.sections():
+        if config[section]['TYPE'] in ['GPIO','VIRTUALINPUT']:
+            modbusaddresses.add( int(config[section]['MODBUS_ADDR']) )
+    modbusaddresses = sorted(modbusaddresses)
+    if len(modbusaddresses) == 0:
+        rs485_scan = True
+
+    discoverycache = None
+    if rs485_discovery_cache != '':
+        discoverycache = DiscoveryCache(rs485_discovery_cache)
 
 
     client = mqtt_client.Client(   client_id='',
@@ -453,6 +599,8 @@ def initialise(modbusaddresses,DELAY):
                             'MQTT_PARSER_ARG1':     mqtt_parser_arg1,
                             'MQTT_MESSAGE':         mqtt_message,
                             'MQTT_HOLD_MESSAGE':    mqtt_hold_message,
+                            'MQTT_TEMPLATE':        MessageTemplate(mqtt_message) if mqtt_message is not None else None,
+                            'MQTT_HOLD_TEMPLATE':   MessageTemplate(mqtt_hold_message) if mqtt_hold_message is not None else None,
                             'GPIO_PIN_STATE':       gpio_pin_state,
                             'LOG_MESSAGE':          log_message,
                             'MQTT_QOS':             mqtt_qos,
@@ -466,39 +614,43 @@ def initialise(modbusaddresses,DELAY):
                 gpioConfigs.append( gpioData )
             logger.debug( 'Added configuration for %s' % ( gpioData ) )
 
-    modules = MultipleModuleManager(port=device_name, desiredbaudrate=baud_rate, modbusaddresses=modbusaddresses, inputchangecallback=gpio_input_callback)
-    return logger, virtualInputs, gpioConfigs, commandConfigs, client, modules
+    topicRouter = buildTopicRouter()
+    inputRoutes = buildInputRoutes()
+    logger.debug( f'''Routing {len(topicRouter)} MQTT subscriptions''' )
 
-def loopScheduledEvents(cur,db,logger):
-    query = f'''SELECT COUNT(*) AS numberShortPressEvents FROM scheduledEvents WHERE timestamp < {datetime.datetime.now(datetime.UTC).timestamp()};'''
-    cur.execute( query )
-    rows = cur.fetchall()
-    if rows[0]['numberShortPressEvents'] > 0:
-        logger.debug(f'''There are {rows[0]['numberShortPressEvents']} scheduled events to process''')
-        query = f'''SELECT
-                            *
-                    FROM
-                            scheduledEvents
-                    WHERE 
-                            timestamp < {datetime.datetime.now(datetime.UTC).timestamp()};
-
-                    '''
-        cur.execute( query )
-        rows = cur.fetchall()
-        logger.debug(f'''now: {datetime.datetime.now(datetime.UTC).timestamp()} rows: {rows}''')
-        for scheduledEvent in rows:
-            logger.info(f'''Ran scheduled event for MODBUS_ADDR: {scheduledEvent['MODBUS_ADDR']} MODBUS_IO: {scheduledEvent['MODBUS_IO']} with Value: {scheduledEvent['outputState']}''')
-            modules.updateOutput(scheduledEvent['MODBUS_ADDR'],scheduledEvent['MODBUS_IO'],scheduledEvent['outputState'])
-            query = f'''DELETE FROM
-                                scheduledEvents
-                            WHERE
-                                MODBUS_ADDR='{scheduledEvent['MODBUS_ADDR']}'
-                                AND MODBUS_IO='{scheduledEvent['MODBUS_IO']}'
-                                AND createdAt='{scheduledEvent['createdAt']}'
-                                AND timestamp='{scheduledEvent['timestamp']}'
-                            '''
-            cur.execute( query )
-            db.commit()
+    '''
+    RS485_POLL_TARGETS is {modbusaddress: seconds} or {modbusaddress: {register: seconds}} with the keys as JSON strings
+    '''
+    polltargets = None
+    if rs485_poll_targets != '':
+        polltargets = {}
+        for modbusaddress, target in json.loads( rs485_poll_targets ).items():
+            if isinstance(target, dict):
+                target = {int(register): latency for register, latency in target.items()}
+            polltargets[int(modbusaddress)] = target
+
+    if rs485_process_per_bus:
+        '''
+        Each bus is polled by its own worker process, the IO state is read from shared memory
+        '''
+        if rs485_buses != '':
+            buses = json.loads( rs485_buses )
+        else:
+            buses = {device_name: modbusaddresses}
+        modules = ProcessBusManager(buses=buses, desiredbaudrate=baud_rate, inputchangecallback=gpio_input_callback, discoverycache=discoverycache, scan=rs485_scan, healthcallback=module_health_callback, reassertinterval=rs485_reassert_interval, outputpollinterval=rs485_output_poll_interval, outputchangecallback=output_change_callback, polltargets=polltargets, pollplancallback=poll_plan_callback)
+        device_name = ', '.join( buses )
+    elif rs485_buses != '':
+        '''
+        Modules spread over several buses, RS485_BUSES is {port: [modbusaddress, ...]} and the Modbus addresses must be unique over all the buses
+        '''
+        buses = json.loads( rs485_buses )
+        modules = MultiBusManager(buses=buses, desiredbaudrate=baud_rate, inputchangecallback=gpio_input_callback, discoverycache=discoverycache, scan=rs485_scan, healthcallback=module_health_callback, coalescewindow=rs485_coalesce_window, reassertinterval=rs485_reassert_interval, outputpollinterval=rs485_output_poll_interval, outputchangecallback=output_change_callback, polltargets=polltargets, pollplancallback=poll_plan_callback)
+        device_name = ', '.join( buses )
+    else:
+        modules = MultipleModuleManager(port=device_name, desiredbaudrate=baud_rate, modbusaddresses=modbusaddresses, inputchangecallback=gpio_input_callback, discoverycache=discoverycache, scan=rs485_scan, healthcallback=module_health_callback, threaded=True, coalescewindow=rs485_coalesce_window, reassertinterval=rs485_reassert_interval, outputpollinterval=rs485_output_poll_interval, outputchangecallback=output_change_callback, polltargets=polltargets, pollplancallback=poll_plan_callback)
+    logger.info(f'''Connected to modules at Modbus addresses {modules.getModbusAddresses()} on {device_name}''')
+    scheduledOutputs.start()
+    return logger, virtualInputs, gpioConfigs, commandConfigs, client, modules
 
 def loopVirtualEvents(cur,db,logger):
     query = f'''SELECT COUNT(*) AS numberShortPressEvents FROM virtualInputEvents;'''
@@ -560,12 +712,7 @@ def loopVirtualEvents(cur,db,logger):
                     virtualInputs[ inputDevice['arrayIndex'] ]['GPIO_PIN_STATE'] = not(virtualInputs[ inputDevice['arrayIndex'] ]['GPIO_PIN_STATE'] )
                     client.publish( 
                                 topicsList[numberShortPresses - 1],
-                                inputDevice['MQTT_MESSAGE']. \
-                                        replace('{MODBUSADDRESS}', str(inputDevice['MODBUS_ADDR'])). \
-                                        replace('{INPUT}', str(inputDevice['MODBUS_IO'])). \
-                                        replace('{STATE}', BOOL_ONOFFSTRING(virtualInputs[ inputDevice['arrayIndex'] ]['GPIO_PIN_STATE'])).lower(). \
-                                        replace('{utctimestamp}', str(nowObj.timestamp())). \
-                                        replace('{updatedat}', nowObj.strftime("%Y-%m-%d-%H:%M:%S.%f")),
+                                virtualInputs[ inputDevice['arrayIndex'] ]['MQTT_TEMPLATE'].render(inputDevice['MODBUS_ADDR'], inputDevice['MODBUS_IO'], BOOL_ONOFFSTRING(virtualInputs[ inputDevice['arrayIndex'] ]['GPIO_PIN_STATE']).lower(), nowObj),
                                 qos=1,
                                     )
                     logger.info(f'''Published a virtual input event to MQTT topic: {topicsList[numberShortPresses - 1]} for MODBUS_ADDR: {inputDevice['MODBUS_ADDR']} and MODBUS_IO: {inputDevice['MODBUS_IO']}''') 
@@ -585,26 +732,30 @@ if __name__ == '__main__':
     DELAY = 0.01
 
     cur,db = sqliteSetup()
-    logger, virtualInputs, gpioConfigs, commandConfigs, client, modules = initialise(modbusaddresses=[1,], DELAY=DELAY)
+    logger, virtualInputs, gpioConfigs, commandConfigs, client, modules = initialise(DELAY=DELAY)
+    client.loop_start()
 
     virtualEventsLastRun = time.time()
-    scheduledEventsLastRun = time.time()
     eventsCleanupLastRun = time.time()
     while True:
         if time.time() >= eventsCleanupLastRun + 10:
-            cur.execute(f'''DELETE FROM virtualInputEvents WHERE timestamp < '{eventsCleanupLastRun}';''')
-            db.commit()
+            with dblock:
+                cur.execute(f'''DELETE FROM virtualInputEvents WHERE timestamp < '{eventsCleanupLastRun}';''')
+                db.commit()
             eventsCleanupLastRun = time.time()
 
-        if time.time() >= scheduledEventsLastRun + 0.05:
-            loopScheduledEvents(cur=cur,db=db,logger=logger)
-            scheduledEventsLastRun = time.time()
-
         if time.time() > virtualEventsLastRun + 0.05:
-            loopVirtualEvents(cur=cur,db=db,logger=logger)
+            with dblock:
+                loopVirtualEvents(cur=cur,db=db,logger=logger)
             virtualEventsLastRun = time.time()
 
-        if mqtt_connected == False:
-            mqtt_connect()
-        modules.pollReadInputs()
-        client.loop(DELAY)
+        '''
+        The loop sweeps every DELAY but never sleeps past the next module with a poll target, modules without one are polled on every sweep
+        '''
+        wait = DELAY
+        if not isinstance(modules, ProcessBusManager):
+            modules.pollReadInputs()
+            due = modules.timeUntilNextTarget()
+            if due is not None and due < wait:
+                wait = due
+        time.sleep(wait)
@@ -0,0 +1,330 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Manager for modules spread over several RS485 buses
+
+Notes:
+    Each bus is run by its own threaded MultipleModuleManager so the buses are polled in parallel and the total poll rate grows with the number of buses.
+    Modules are addressed either by (port, modbusaddress) or by a global address from addressmap. Without an addressmap the Modbus address is the global address, which needs the addresses to be unique over all the buses.
+    Callbacks are given the global address of the module.
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from multipleModuleManager import MultipleModuleManager
+from busScheduler import gatherfutures, PRIORITY_OUTPUT
+from eletech23iod import SCAN_ADDRESSES
+from moduleHealth import DEFAULT_FAILURE_THRESHOLD, DEFAULT_INITIAL_BACKOFF, DEFAULT_MAXIMUM_BACKOFF
+
+
+class BusAddressMap():
+    def __init__(self, addressmap=None, ):
+        '''
+        Global addresses of the modules on several buses, addressmap is an optional {globaladdress: (port, modbusaddress)}
+        '''
+        self.__addressmap__ = {}
+        self.__globaladdresses__ = {}
+        if addressmap is not None:
+            for globaladdress, (port, modbusaddress) in addressmap.items():
+                self.map(globaladdress, port, modbusaddress)
+
+    def map(self, globaladdress, port, modbusaddress):
+        self.__addressmap__[globaladdress] = (port, modbusaddress)
+        self.__globaladdresses__[(port, modbusaddress)] = globaladdress
+
+    def add(self, port, modbusaddress):
+        '''
+        Give a module not in the addressmap its Modbus address as its global address, raises ValueError when another bus already has it
+        '''
+        if (port, modbusaddress) in self.__globaladdresses__:
+            return None
+        if modbusaddress in self.__addressmap__:
+            raise ValueError(f'''Modbus address {modbusaddress} is on {self.__addressmap__[modbusaddress][0]} and {port}, pass an addressmap''')
+        self.map(modbusaddress, port, modbusaddress)
+
+    def globaladdress(self, port, modbusaddress):
+        return self.__globaladdresses__.get((port, modbusaddress), (port, modbusaddress))
+
+    def route(self, modbusaddress):
+        '''
+        (port, modbusaddress) of a module given as (port, modbusaddress) or a global address, (None, None) when it is not known
+        '''
+        if isinstance(modbusaddress, tuple):
+            return modbusaddress
+        return self.__addressmap__.get(modbusaddress, (None, None))
+
+
+class MultiBusManager():
+    def __init__(self, buses, desiredbaudrate=115200, addressmap=None, inputchangecallback=None, intermoduledelay=None, inputpollmode=None, inputschangecallback=None, discoverycache=None, scan=False, scanaddresses=SCAN_ADDRESSES, scanbaudrates=None, healthcallback=None, failurethreshold=DEFAULT_FAILURE_THRESHOLD, initialbackoff=DEFAULT_INITIAL_BACKOFF, maximumbackoff=DEFAULT_MAXIMUM_BACKOFF, coalescewindow=None, reassertinterval=None, outputpollinterval=None, outputpollmode=None, outputchangecallback=None, polltargets=None, pollplancallback=None, ):
+        '''
+        buses is {port: [modbusaddress, ...]}, the buses are connected in parallel.
+        addressmap is an optional {globaladdress: (port, modbusaddress)} for buses whose modules share Modbus addresses.
+        The other arguments are passed to the MultipleModuleManager of each bus.
+        '''
+        self.__addresses__ = BusAddressMap(addressmap)
+
+        def callback(port, function):
+            if function is None:
+                return None
+            return lambda modbusaddress, *args: function(self.__addresses__.globaladdress(port, modbusaddress), *args)
+
+        def connect(port):
+            return MultipleModuleManager(
+                                        port=port,
+                                        desiredbaudrate=desiredbaudrate,
+                                        modbusaddresses=buses[port],
+                                        inputchangecallback=callback(port, inputchangecallback),
+                                        intermoduledelay=intermoduledelay,
+                                        inputpollmode=inputpollmode,
+                                        inputschangecallback=callback(port, inputschangecallback),
+                                        discoverycache=discoverycache,
+                                        scan=scan,
+                                        scanaddresses=scanaddresses,
+                                        scanbaudrates=scanbaudrates,
+                                        healthcallback=callback(port, healthcallback),
+                                        failurethreshold=failurethreshold,
+                                        initialbackoff=initialbackoff,
+                                        maximumbackoff=maximumbackoff,
+                                        threaded=True,
+                                        coalescewindow=coalescewindow,
+                                        reassertinterval=reassertinterval,
+                                        outputpollinterval=outputpollinterval,
+                                        outputpollmode=outputpollmode,
+                                        outputchangecallback=callback(port, outputchangecallback),
+                                        pollplancallback=pollplancallback,
+                                        )
+
+        '''
+        Every bus is waited for, when one fails the managers of the buses that connected are closed so no port or worker thread is left open
+        '''
+        ports = list(buses)
+        with ThreadPoolExecutor(max_workers=max(1, len(ports))) as executor:
+            futures = [ executor.submit(connect, port) for port in ports ]
+        self.__buses__ = { port: future.result() for port, future in zip(ports, futures) if future.exception() is None }
+        failures = [ future.exception() for future in futures if future.exception() is not None ]
+        if failures:
+            self.close()
+            raise failures[0]
+
+        try:
+            for port, manager in self.__buses__.items():
+                for modbusaddress in manager.getModbusAddresses():
+                    self.__addresses__.add(port, modbusaddress)
+        except ValueError:
+            self.close()
+            raise
+
+        if polltargets is not None:
+            for modbusaddress, target in polltargets.items():
+                if isinstance(target, dict):
+                    for register, latency in target.items():
+                        self.setPollTarget(modbusaddress, latency, register=register)
+                else:
+                    self.setPollTarget(modbusaddress, target)
+
+    def __route__(self, modbusaddress):
+        '''
+        The manager and Modbus address of a module given as (port, modbusaddress) or a global address, (None, None) when there is no such module
+        '''
+        port, address = self.__addresses__.route(modbusaddress)
+        if port not in self.__buses__:
+            return None, None
+        return self.__buses__[port], address
+
+    def close(self):
+        for manager in self.__buses__.values():
+            manager.close()
+
+    def getPorts(self):
+        return list(self.__buses__)
+
+    def getBus(self, port):
+        return self.__buses__.get(port)
+
+    def getModbusAddresses( self, ):
+        '''
+        Global addresses of every connected module
+        '''
+        addresses = []
+        for port, manager in self.__buses__.items():
+            for modbusaddress in manager.getModbusAddresses():
+                addresses.append( self.__addresses__.globaladdress(port, modbusaddress) )
+        return addresses
+
+    def getBaudRate(self,modbusaddress):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        return manager.getBaudRate(address)
+
+    def getNumberInputOutputs(self,modbusaddress):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        return manager.getNumberInputOutputs(address)
+
+    def getModuleHealths(self):
+        healths = {}
+        for port, manager in self.__buses__.items():
+            for modbusaddress, state in manager.getModuleHealths().items():
+                healths[ self.__addresses__.globaladdress(port, modbusaddress) ] = state
+        return healths
+
+    def getSchedulerStats(self):
+        return {port: manager.getSchedulerStats() for port, manager in self.__buses__.items()}
+
+    def getCoalescerStats(self):
+        return {port: manager.getCoalescerStats() for port, manager in self.__buses__.items()}
+
+    def setPollTarget(self, modbusaddress, latency, register=None):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        manager.setPollTarget(address, latency, register=register)
+
+    def getPollPlan(self):
+        '''
+        {port: plan} as each bus has a timetable of its own
+        '''
+        return {port: manager.getPollPlan() for port, manager in self.__buses__.items()}
+
+    def timeUntilNextPoll(self):
+        waits = [ manager.timeUntilNextPoll() for manager in self.__buses__.values() ]
+        if None in waits:
+            return None
+        return min(waits, default=None)
+
+    def timeUntilNextTarget(self):
+        return min( (wait for wait in [ manager.timeUntilNextTarget() for manager in self.__buses__.values() ] if wait is not None), default=None )
+
+    def getWriteStats(self):
+        stats = {}
+        for port, manager in self.__buses__.items():
+            for modbusaddress, modulestats in manager.getWriteStats().items():
+                stats[ self.__addresses__.globaladdress(port, modbusaddress) ] = modulestats
+        return stats
+
+    def __futures__(self, modbusaddress, method, *args, **kwargs):
+        '''
+        [(manager, future)] of calling method on the bus of modbusaddress, None calls it on every bus at once
+        '''
+        if modbusaddress is None:
+            return [ (manager, getattr(manager, method)(None, *args, **kwargs)) for manager in self.__buses__.values() ]
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return []
+        return [ (manager, getattr(manager, method)(address, *args, **kwargs)) ]
+
+    def __gather__(self, futures):
+        return gatherfutures([ future for manager, future in futures ])
+
+    def __wait__(self, futures):
+        '''
+        Each future is waited for through its own manager so a callback on one worker thread can wait on its own bus
+        '''
+        for manager, future in futures:
+            manager.wait(future)
+
+    def pollReadInputsFuture(self,modbusaddress=None):
+        '''
+        With no modbusaddress every bus is polled at once
+        '''
+        return self.__gather__( self.__futures__(modbusaddress, 'pollReadInputsFuture') )
+
+    def pollReadInputs(self,modbusaddress=None):
+        self.__wait__( self.__futures__(modbusaddress, 'pollReadInputsFuture') )
+
+    def updateOutputFuture(self,modbusaddress,output,value,priority=PRIORITY_OUTPUT,deadline=None):
+        if modbusaddress is None:
+            return gatherfutures([])
+        return self.__gather__( self.__futures__(modbusaddress, 'updateOutputFuture', output, value, priority=priority, deadline=deadline) )
+
+    def updateOutputsFuture(self, modbusaddress, value, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__gather__( self.__futures__(modbusaddress, 'updateOutputsFuture', value, priority=priority, deadline=deadline) )
+
+    def updateOutputsByListFuture(self, modbusaddress, valueList, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__gather__( self.__futures__(modbusaddress, 'updateOutputsByListFuture', valueList, priority=priority, deadline=deadline) )
+
+    def updateOutputsByHexStrFuture(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__gather__( self.__futures__(modbusaddress, 'updateOutputsByHexStrFuture', hexStr, outputValue=outputValue, keepCurrent=keepCurrent, priority=priority, deadline=deadline) )
+
+    def updateOutput(self,modbusaddress,output,value,priority=PRIORITY_OUTPUT,deadline=None):
+        if modbusaddress is None:
+            return None
+        self.__wait__( self.__futures__(modbusaddress, 'updateOutputFuture', output, value, priority=priority, deadline=deadline) )
+
+    def updateOutputs(self, modbusaddress, value, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__wait__( self.__futures__(modbusaddress, 'updateOutputsFuture', value, priority=priority, deadline=deadline) )
+
+    def updateOutputsByList(self, modbusaddress, valueList, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__wait__( self.__futures__(modbusaddress, 'updateOutputsByListFuture', valueList, priority=priority, deadline=deadline) )
+
+    def updateOutputsByHexStr(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__wait__( self.__futures__(modbusaddress, 'updateOutputsByHexStrFuture', hexStr, outputValue=outputValue, keepCurrent=keepCurrent, priority=priority, deadline=deadline) )
+
+    def pollReadOutputsFuture(self, modbusaddress=None):
+        return self.__gather__( self.__futures__(modbusaddress, 'pollReadOutputsFuture') )
+
+    def pollReadOutputs(self, modbusaddress=None):
+        self.__wait__( self.__futures__(modbusaddress, 'pollReadOutputsFuture') )
+
+    def reassertOutputsFuture(self, modbusaddress=None, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__gather__( self.__futures__(modbusaddress, 'reassertOutputsFuture', priority=priority, deadline=deadline) )
+
+    def reassertOutputs(self, modbusaddress=None, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__wait__( self.__futures__(modbusaddress, 'reassertOutputsFuture', priority=priority, deadline=deadline) )
+
+    def getSnapshot(self, modbusaddress):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        return manager.getSnapshot(address)
+
+    def getSnapshots(self):
+        snapshots = {}
+        for port, manager in self.__buses__.items():
+            for modbusaddress, snapshot in manager.getSnapshots().items():
+                snapshots[ self.__addresses__.globaladdress(port, modbusaddress) ] = snapshot
+        return snapshots
+
+    def getInput(self, modbusaddress, inputnumber):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        return manager.getInput(address, inputnumber)
+
+    def getInputs(self, modbusaddress, inputnumbers=None):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        return manager.getInputs(address, inputnumbers)
+
+    def getOutputs(self, modbusaddress, outputnumbers=None):
+        manager, address = self.__route__(modbusaddress)
+        if manager is None:
+            return None
+        return manager.getOutputs(address, outputnumbers)
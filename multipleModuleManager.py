@@ -30,34 +30,282 @@ Multiple Device NManager
 '''
 
 
-from eletech23iod import ModbusDIO
-from serial import SerialException
-import datetime
+from eletech23iod import ModbusDIO, ModbusModuleNotFoundException, scanBus, SCAN_ADDRESSES, TRANSACTION_EXCEPTIONS
+from moduleHealth import ModuleHealth, ModuleQuarantinedException, QUARANTINED, DEFAULT_FAILURE_THRESHOLD, DEFAULT_INITIAL_BACKOFF, DEFAULT_MAXIMUM_BACKOFF
 import time
+from busTiming import BusTiming
+from ioState import modulesnapshot
+from outputCoalescer import OutputCoalescer
+from pollPlanner import PollPlanner
+from busScheduler import BusScheduler, gatherfutures, PRIORITY_OUTPUT, PRIORITY_POLL, PRIORITY_DIAGNOSTIC
+from concurrent.futures import Future
 
 class MultipleModuleManager():
-    def __init__(self, port, desiredbaudrate=115200, modbusaddresses=[], inputchangecallback=None, intermoduledelay=20000, ):
-        self.__intermoduledelay__ = intermoduledelay
-        self.__modules__ = {}
-        self.__lastmoduleused__ = None
-        self.__lastmoduleusedat__ = None
+    def __init__(self, port, desiredbaudrate=115200, modbusaddresses=[], inputchangecallback=None, intermoduledelay=None, inputpollmode=None, inputschangecallback=None, discoverycache=None, scan=False, scanaddresses=SCAN_ADDRESSES, scanbaudrates=None, healthcallback=None, failurethreshold=DEFAULT_FAILURE_THRESHOLD, initialbackoff=DEFAULT_INITIAL_BACKOFF, maximumbackoff=DEFAULT_MAXIMUM_BACKOFF, betweencallback=None, threaded=False, coalescewindow=None, reassertinterval=None, outputpollinterval=None, outputpollmode=None, outputchangecallback=None, polltargets=None, pollplancallback=None, ):
+        '''
+        intermoduledelay in microseconds is an optional minimum gap between frames, by default the gap is 3.5 character times at the baud rate in use
+
+        discoverycache is an optional DiscoveryCache, the baud rate each module answered at last time is tried first and the cache is updated once all modules are connected.
+        When scan is True the modules found by a previous scan in the cache are connected as well as modbusaddresses, and scanaddresses are only scanned when the cache has nothing for this port or one of its modules no longer answers.
+
+        A module that fails failurethreshold polls in a row is quarantined, it is then only polled on a backoff doubling from initialbackoff up to maximumbackoff seconds and writes to it fail with ModuleQuarantinedException until it answers again.
+        healthcallback(modbusaddress, state) is called whenever a module moves into or out of quarantine.
+
+        Every poll and write is run through a BusScheduler, output writes are run before queued polls and probes of quarantined modules are run last.
+        betweencallback() is called between transactions when the poll sweep is run on the calling thread, it lets a single threaded caller handle incoming commands part way through a sweep.
+
+        With threaded True a worker thread owns the port and runs the queue, the methods ending in Future can then be called from any thread and return a concurrent.futures.Future.
+        The other update and poll methods wait for their Future so they behave as before. Without a worker thread the Future methods run the queue before they return.
+        Callbacks are called on the worker thread.
 
+        With threaded True and coalescewindow in seconds updateOutput holds each single output change for that long, the changes to a module in the window are merged into one write and every caller's Future completes with it.
 
+        Output writes that would not change what the module was last acknowledged to hold are skipped, see ModbusDIO.
+        With reassertinterval in seconds the output registers written before are written again that often, queued as diagnostics alongside the polls, to put right any drift.
+
+        With outputpollinterval in seconds the outputs of each module are read back that often, at most one module per poll sweep queued behind its input polls so the readback takes a bounded share of the bus.
+        outputchangecallback(modbusaddress, output, state) is called for an output found to differ from what was last written, after a power cycle or another master writing to the module.
+
+        polltargets is an optional {modbusaddress: latency} or {modbusaddress: {register: latency}} of the longest time in seconds an input change may go unseen, see setPollTarget.
+        A module with a target is only polled by pollReadInputs() when its target needs it and more often for a while after its inputs change, the others are polled every time.
+        pollplancallback(port, feasible, utilisation) is called when the targets stop or start fitting on the bus at the measured poll times.
+
+        getInput, getInputs, getOutputs and getSnapshot read a snapshot of each module that is replaced after any poll or write that changed it, they never wait for the bus.
+        '''
+        self.__port__ = port
+        self.__modules__ = {}
+        self.__snapshots__ = {}
+        self.__snapshotversions__ = {}
+        self.__outputpollinterval__ = outputpollinterval
+        self.__outputpolledat__ = {}
+        self.__nextoutputpoll__ = 0
+        if intermoduledelay is None:
+            intermoduledelay = 0
+        self.__bustiming__ = BusTiming(minimuminterframedelay=intermoduledelay)
+        self.__health__ = {}
+        self.__healthcallback__ = healthcallback
+        self.__scheduler__ = BusScheduler(betweencallback=betweencallback)
+        self.__planner__ = PollPlanner(plancallback=None if pollplancallback is None else lambda feasible, utilisation: pollplancallback(port, feasible, utilisation))
+
+        '''
+        The snapshot is published before the change callbacks run so a callback reading getInput or getOutputs sees the change it is called for
+        '''
+        def inputschanged(modbusaddress, risingbits, fallingbits):
+            self.__publish__(modbusaddress)
+            if inputschangecallback is not None:
+                inputschangecallback(modbusaddress, risingbits, fallingbits)
+
+        def outputchanged(modbusaddress, output, state):
+            self.__publish__(modbusaddress)
+            if outputchangecallback is not None:
+                outputchangecallback(modbusaddress, output, state)
+
+        def connect(modbusaddress, baudratehint=None):
+            self.__modules__[modbusaddress] = ModbusDIO(port=port, desiredbaudrate=desiredbaudrate, modbusaddress=modbusaddress, inputchangecallback=inputchangecallback, inputpollmode=inputpollmode, bustiming=self.__bustiming__, inputschangecallback=inputschanged, baudratehint=baudratehint, reassertinterval=reassertinterval, outputpollmode=outputpollmode, outputchangecallback=outputchanged)
+            self.__health__[modbusaddress] = ModuleHealth(failurethreshold=failurethreshold, initialbackoff=initialbackoff, maximumbackoff=maximumbackoff)
+            self.__planner__.addmodule(modbusaddress, self.__modules__[modbusaddress].estimatepolltime())
+            self.__publish__(modbusaddress)
+            if discoverycache is not None:
+                discoverycache.set(port, modbusaddress, self.__modules__[modbusaddress].model, self.__modules__[modbusaddress].baudrate)
+
+        def cachedbaudrate(modbusaddress):
+            if discoverycache is None:
+                return None
+            entry = discoverycache.get(port, modbusaddress)
+            if entry is None:
+                return None
+            return entry['baudrate']
+
+        needscan = scan
+        cachedaddresses = []
+        if scan and discoverycache is not None:
+            cachedaddresses = discoverycache.getModbusAddresses(port)
+            needscan = len(cachedaddresses) == 0
+
+        for modbusaddress in cachedaddresses:
+            try:
+                connect(modbusaddress, cachedbaudrate(modbusaddress))
+            except ModbusModuleNotFoundException:
+                discoverycache.remove(port, modbusaddress)
+                needscan = True
 
         for modbusaddress in modbusaddresses:
-            self.__modules__[modbusaddress] = ModbusDIO(port=port, desiredbaudrate=desiredbaudrate, modbusaddress=modbusaddress, inputchangecallback=inputchangecallback)
-            self.__lastmoduleused__ = modbusaddress
-            self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-            time.sleep(self.__intermoduledelay__ / 1000000 )
+            if modbusaddress not in self.__modules__:
+                connect(modbusaddress, cachedbaudrate(modbusaddress))
+
+        if needscan:
+            found = scanBus(port, modbusaddresses=[modbusaddress for modbusaddress in scanaddresses if modbusaddress not in self.__modules__], baudrates=scanbaudrates)
+            for modbusaddress in sorted(found):
+                connect(modbusaddress, found[modbusaddress]['baudrate'])
+
+        if discoverycache is not None:
+            discoverycache.save()
+
+        if polltargets is not None:
+            for modbusaddress, target in polltargets.items():
+                if isinstance(target, dict):
+                    for register, latency in target.items():
+                        self.setPollTarget(modbusaddress, latency, register=register)
+                else:
+                    self.setPollTarget(modbusaddress, target)
+
+        self.__coalescer__ = None
+        if threaded:
+            self.__scheduler__.start(name=f'''MultipleModuleManager {port}''')
+            if coalescewindow:
+                self.__coalescer__ = OutputCoalescer(coalescewindow, self.__flushoutputs__)
+                self.__coalescer__.start(name=f'''OutputCoalescer {port}''')
+
+    def close(self):
+        '''
+        Stop the worker thread once the queued transactions and any held output changes have been run, then close the serial port of every module
+        '''
+        if self.__coalescer__ is not None:
+            self.__coalescer__.stop()
+        self.__scheduler__.stop()
+        for module in self.__modules__.values():
+            module.close()
 
     def __delay__(self, currentmodule):
-        if currentmodule == self.__lastmoduleused__:
+        '''
+        Every transaction waits out the inter frame gap itself, this only waits for whatever is left of it
+        '''
+        self.__bustiming__.waitforsilence()
+
+    def __publish__(self, modbusaddress):
+        '''
+        Replace the snapshot of a module when its state has changed, only called on the thread running the bus.
+        Readers take the dict of the snapshot without a lock and keep a consistent copy as it is never changed, only replaced.
+        '''
+        if modbusaddress not in self.__health__:
+            return None
+        module = self.__modules__[modbusaddress]
+        health = self.__health__[modbusaddress].state
+        version = (module.inputstate.version, module.outputstate.version, module.baudrate, health)
+        if self.__snapshotversions__.get(modbusaddress) == version:
             return None
+        self.__snapshots__[modbusaddress] = modulesnapshot(module.model, module.baudrate, health, module.inputstate.snapshot(), module.outputstate.snapshot())
+        self.__snapshotversions__[modbusaddress] = version
+
+    def __recordhealth__(self, modbusaddress, success, now=None):
+        health = self.__health__[modbusaddress]
+        if success:
+            changed = health.recordsuccess()
         else:
-            timediff = datetime.datetime.now(datetime.UTC) - self.__lastmoduleusedat__
-            if timediff.days == 0 and timediff.seconds == 0 and timediff.microseconds <= self.__intermoduledelay__:
-                time.sleep(self.__intermoduledelay__ / 1000000)
-        
+            changed = health.recordfailure(now)
+        if changed and self.__healthcallback__ is not None:
+            self.__healthcallback__( modbusaddress, health.state )
+
+    def __pollmodule__(self, modbusaddress, now=None, registers=None):
+        self.__delay__(modbusaddress)
+        module = self.__modules__[modbusaddress]
+        version = module.inputstate.version
+        started = time.monotonic()
+        success = module.pollreadinputs(registers)
+        if success:
+            self.__planner__.recordpoll(modbusaddress, registers, started, time.monotonic() - started, module.inputstate.version != version)
+        self.__recordhealth__(modbusaddress, success, now)
+        self.__publish__(modbusaddress)
+
+    def __pollmoduleoutputs__(self, modbusaddress, now=None):
+        self.__delay__(modbusaddress)
+        success = self.__modules__[modbusaddress].pollreadoutputs()
+        self.__recordhealth__(modbusaddress, success, now)
+        self.__publish__(modbusaddress)
+
+    def __submitoutputpoll__(self, now):
+        '''
+        Queue a readback of the next healthy module in turn whose outputs were last read outputpollinterval ago or more, one module per sweep
+        '''
+        if self.__outputpollinterval__ is None or not self.__modules__:
+            return None
+        modbusaddresses = list(self.__modules__)
+        for i in range(0, len(modbusaddresses)):
+            modbusaddress = modbusaddresses[(self.__nextoutputpoll__ + i) % len(modbusaddresses)]
+            if self.__health__[modbusaddress].state == QUARANTINED:
+                continue
+            if now - self.__outputpolledat__.get(modbusaddress, now - self.__outputpollinterval__) < self.__outputpollinterval__:
+                continue
+            self.__nextoutputpoll__ = (self.__nextoutputpoll__ + i + 1) % len(modbusaddresses)
+            self.__outputpolledat__[modbusaddress] = now
+            return self.__scheduler__.submit(self.__pollmoduleoutputs__, modbusaddress, now, priority=PRIORITY_POLL)
+
+    def __submitpoll__(self, modbusaddress, now=None, registers=None):
+        '''
+        Queue a poll of one module, a quarantined module is only queued when its probe is due and then as a diagnostic
+        '''
+        health = self.__health__[modbusaddress]
+        if not health.shouldpoll(now):
+            return None
+        priority = PRIORITY_POLL
+        if health.state == QUARANTINED:
+            priority = PRIORITY_DIAGNOSTIC
+        return self.__scheduler__.submit(self.__pollmodule__, modbusaddress, now, registers, priority=priority)
+
+    def __submitwrites__(self, modbusaddresses, priority, deadline, function, *args, **kwargs):
+        '''
+        Queue function(module, *args, **kwargs) for each module, returns a Future of the list of results
+        '''
+        self.__flushpending__(modbusaddresses, priority)
+        futures = [ self.__scheduler__.submit(self.__writemodule__, modbusaddress, function, args, kwargs, priority=priority, deadline=deadline) for modbusaddress in modbusaddresses ]
+        return self.__queued__( gatherfutures(futures) )
+
+    def __queued__(self, future):
+        '''
+        Without a worker thread the queue is run here so the Future is done when it is returned
+        '''
+        if not self.__scheduler__.running:
+            self.__scheduler__.rununtil(future)
+        return future
+
+    def __writemodule__(self, modbusaddress, function, args, kwargs):
+        '''
+        Run a write on one module, it fails with ModuleQuarantinedException while the module is quarantined so the output is not silently left as it was
+        '''
+        if self.__health__[modbusaddress].state == QUARANTINED:
+            raise ModuleQuarantinedException(f'Module {modbusaddress} is quarantined, write not sent')
+        self.__delay__(modbusaddress)
+        try:
+            result = function(self.__modules__[modbusaddress], *args, **kwargs)
+        except TRANSACTION_EXCEPTIONS:
+            self.__recordhealth__(modbusaddress, False)
+            raise
+        else:
+            self.__recordhealth__(modbusaddress, True)
+        finally:
+            self.__publish__(modbusaddress)
+        return result
+
+    def __writeaddresses__(self, modbusaddress):
+        '''
+        None means every module
+        '''
+        if modbusaddress is None:
+            return list(self.__modules__)
+        if modbusaddress not in self.__modules__:
+            return []
+        return [ modbusaddress ]
+
+    def getModuleHealth(self, modbusaddress):
+        if modbusaddress not in self.__health__:
+            return None
+        return self.__health__[modbusaddress].state
+
+    def getModuleHealths(self):
+        return {modbusaddress: health.state for modbusaddress, health in self.__health__.items()}
+
+
+    def wait(self, future):
+        '''
+        Return the result of a Future from this manager, safe to call from a callback on the worker thread
+        '''
+        return self.__scheduler__.wait(future)
+
+    def getSchedulerStats(self):
+        return self.__scheduler__.stats()
+
+    def getModule(self, modbusaddress):
+        return self.__modules__.get(modbusaddress)
 
     def getModbusAddresses( self, ):
         return list(self.__modules__.keys())
@@ -73,125 +321,215 @@ class MultipleModuleManager():
             return None
         return self.__modules__[modbusaddress].numberinputoutputs
 
-    def pollReadInputs(self,modbusaddress=None):
+    def __submitpolls__(self, modbusaddress):
         if modbusaddress is None:
-            for module in self.__modules__:
-                self.__delay__(module)
-                self.__modules__[module].pollreadinputs()
-                self.__lastmoduleused__ = module
-                self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-                
-            return None
-        
-        if modbusaddress not in self.__modules__:
-            return None
-        
-        self.__delay__(modbusaddress)
-        self.__modules__[modbusaddress].pollreadinputs()
-        self.__lastmoduleused__ = modbusaddress
-        self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-
-    def updateOutput(self,modbusaddress,output,value):
+            modbusaddresses = list(self.__modules__)
+        elif modbusaddress in self.__modules__:
+            modbusaddresses = [ modbusaddress ]
+        else:
+            modbusaddresses = []
+
+        now = time.monotonic()
+        futures = []
+        for address in modbusaddresses:
+            registers = None
+            if modbusaddress is None and self.__planner__.targets(address):
+                due = self.__planner__.due(address, now)
+                if not due:
+                    continue
+                if None not in due:
+                    registers = due
+            future = self.__submitpoll__(address, now, registers)
+            if future is not None:
+                futures.append(future)
+            self.__submitreassert__(address, now)
         if modbusaddress is None:
+            self.__submitoutputpoll__(now)
+        return gatherfutures(futures)
+
+    def __submitreassert__(self, modbusaddress, now):
+        '''
+        Queue a write of the output registers of a healthy module that are due under reassertinterval, nothing waits for it
+        '''
+        if self.__health__[modbusaddress].state == QUARANTINED:
             return None
-        if modbusaddress not in self.__modules__:
-            return None
+        registers = self.__modules__[modbusaddress].duereasserts(now)
+        if registers:
+            self.__scheduler__.submit(self.__writemodule__, modbusaddress, ModbusDIO.reassertoutputs, (registers, ), {}, priority=PRIORITY_DIAGNOSTIC)
 
-        self.__delay__(modbusaddress)
+    def pollReadInputsFuture(self,modbusaddress=None):
+        return self.__queued__( self.__submitpolls__(modbusaddress) )
 
-        def retrySerialCall( modbusaddress, output, value, retry=0 ):
-            try:
-                self.__modules__[modbusaddress].updateOutput(output,value)
-            except SerialException:
-                self.__delay__(modbusaddress)
-                if retry > 0:
-                    retrySerialCall( modbusaddress, output, value, retry=retry-1 )
+    def pollReadInputs(self,modbusaddress=None):
+        future = self.__submitpolls__(modbusaddress)
+        if not self.__scheduler__.running:
+            self.__scheduler__.runpending()
+        self.__scheduler__.wait(future)
+
+    def __flushpending__(self, modbusaddresses, priority):
+        '''
+        Queue the changes the coalescer still holds for these modules ahead of a write that did not go through it, at its priority when that is higher, so an older change can not land after it
+        '''
+        if self.__coalescer__ is None:
+            return None
+        for modbusaddress in modbusaddresses:
+            changes = self.__coalescer__.take(modbusaddress)
+            if changes:
+                self.__flushoutputs__(modbusaddress, changes, priority)
+
+    def __flushoutputs__(self, modbusaddress, changes, priority=None):
+        '''
+        Queue the changes the coalescer held for one module as one write, the write is dropped at the latest deadline of its callers.
+        priority raises the priority of the write above the best priority of the changes.
+        '''
+        deadlines = [ deadline for output, value, future, priority, deadline in changes ]
+        deadline = None
+        if None not in deadlines:
+            deadline = max(deadlines)
+        priorities = [ change[3] for change in changes ]
+        if priority is not None:
+            priorities.append(priority)
+        priority = min(priorities)
+        written = self.__scheduler__.submit(self.__writemodule__, modbusaddress, ModbusDIO.updateOutputsByChanges, ([ (output, value) for output, value, future, priority, deadline in changes ], ), {}, priority=priority, deadline=deadline)
+
+        def done(written):
+            for output, value, future, priority, deadline in changes:
+                if written.exception() is None:
+                    future.set_result([ written.result() ])
                 else:
-                    raise 
-
-        retrySerialCall( modbusaddress, output, value, )
-
-        self.__lastmoduleused__ = modbusaddress
-        self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-
-
-    def updateOutputs(self, modbusaddress, value):
+                    future.set_exception(written.exception())
+        written.add_done_callback(done)
+
+    def setPollTarget(self, modbusaddress, latency, register=None):
+        '''
+        Set the longest time in seconds an input change of a module may go unseen, None removes the target.
+        A target for one input register is only kept apart in SINGLE_REGISTER poll mode where each register is read on its own, otherwise the module takes the shortest target of its registers.
+        '''
         if modbusaddress not in self.__modules__:
             return None
+        module = self.__modules__[modbusaddress]
+        if module.inputpollmode != 'SINGLE_REGISTER' and register is not None:
+            current = self.__planner__.targets(modbusaddress).get(None)
+            if latency is None or (current is not None and current < latency):
+                return None
+            register = None
+        self.__planner__.settarget(modbusaddress, latency, register=register, polltime=module.estimatepolltime(None if register is None else [register]))
+
+    def getPollPlan(self):
+        '''
+        {'feasible', 'utilisation', 'targets': {modbusaddress: {register: {'latency', 'polltime', 'period', 'polls'}}}}, see PollPlanner.plan
+        '''
+        return self.__planner__.plan(time.monotonic())
+
+    def timeUntilNextPoll(self):
+        '''
+        Seconds until pollReadInputs() has a module with a target to poll, None when a module without a target is polled every time
+        '''
+        if any( not self.__planner__.targets(modbusaddress) for modbusaddress in self.__modules__ ):
+            return None
+        return self.__planner__.nextdue(time.monotonic())
+
+    def timeUntilNextTarget(self):
+        '''
+        Seconds until the next module with a target is due whether or not other modules are polled every time, None without targets.
+        A caller sweeping at its own pace should not wait longer than this.
+        '''
+        return self.__planner__.nextdue(time.monotonic())
+
+    def getWriteStats(self):
+        '''
+        {modbusaddress: {'sent', 'skipped', 'narrowed', 'savedlinetime', 'outputpolls', 'outputdrifts'}} of the output writes and readbacks, savedlinetime in seconds
+        '''
+        return {modbusaddress: module.writestats() for modbusaddress, module in self.__modules__.items()}
+
+    def pollReadOutputsFuture(self, modbusaddress=None):
+        '''
+        Read back the outputs now, None for every module
+        '''
+        now = time.monotonic()
+        futures = []
+        for address in self.__writeaddresses__(modbusaddress):
+            self.__outputpolledat__[address] = now
+            futures.append( self.__scheduler__.submit(self.__pollmoduleoutputs__, address, now, priority=PRIORITY_POLL) )
+        return self.__queued__( gatherfutures(futures) )
+
+    def pollReadOutputs(self, modbusaddress=None):
+        self.__scheduler__.wait( self.pollReadOutputsFuture(modbusaddress) )
+
+    def reassertOutputsFuture(self, modbusaddress=None, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__submitwrites__( self.__writeaddresses__(modbusaddress), priority, deadline, ModbusDIO.reassertoutputs )
+
+    def reassertOutputs(self, modbusaddress=None, priority=PRIORITY_OUTPUT, deadline=None):
+        '''
+        Write every output register again from the output state, None for every module
+        '''
+        self.__scheduler__.wait( self.reassertOutputsFuture(modbusaddress, priority=priority, deadline=deadline) )
+
+    def getCoalescerStats(self):
+        if self.__coalescer__ is None:
+            return None
+        return self.__coalescer__.stats()
 
-        if modbusaddress is None:
-            modbusaddress = self.__modules__
-        else:
-            modbusaddress = [ modbusaddress ]
+    def updateOutputFuture(self,modbusaddress,output,value,priority=PRIORITY_OUTPUT,deadline=None):
+        '''
+        A callback on the worker thread is written at once, waiting there for the window would hold up the queue the merged write goes into
+        '''
+        if self.__coalescer__ is not None and not self.__scheduler__.isworkerthread() and modbusaddress in self.__modules__ and isinstance(output, int) and 0 <= output < self.__modules__[modbusaddress].numberinputoutputs:
+            return self.__coalescer__.add(modbusaddress, output, value, priority=priority, deadline=deadline)
 
-        for modbusaddress in self.__modules__:
-            self.__delay__(modbusaddress)
-            self.__modules__[modbusaddress].updateOutputs(value)
-            self.__lastmoduleused__ = modbusaddress
-            self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
+        modbusaddresses = []
+        if modbusaddress is not None:
+            modbusaddresses = self.__writeaddresses__(modbusaddress)
+        return self.__submitwrites__( modbusaddresses, priority, deadline, ModbusDIO.updateOutput, output, value, )
 
+    def updateOutputsFuture(self, modbusaddress, value, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__submitwrites__( self.__writeaddresses__(modbusaddress), priority, deadline, ModbusDIO.updateOutputs, value )
 
+    def updateOutputsByListFuture(self, modbusaddress, valueList, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__submitwrites__( self.__writeaddresses__(modbusaddress), priority, deadline, ModbusDIO.updateOutputsByList, valueList )
 
-    def updateOutputsByList(self, modbusaddress, valueList):
-        if modbusaddress not in self.__modules__:
-            return None
+    def updateOutputsByHexStrFuture(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False, priority=PRIORITY_OUTPUT, deadline=None):
+        return self.__submitwrites__( self.__writeaddresses__(modbusaddress), priority, deadline, ModbusDIO.updateOutputsByHexStr, hexStr, outputValue=outputValue, keepCurrent=keepCurrent )
 
-        if modbusaddress is None:
-            modbusaddress = self.__modules__
-        else:
-            modbusaddress = [ modbusaddress ]
+    def updateOutput(self,modbusaddress,output,value,priority=PRIORITY_OUTPUT,deadline=None):
+        self.__scheduler__.wait( self.updateOutputFuture(modbusaddress, output, value, priority=priority, deadline=deadline) )
+
+    def updateOutputs(self, modbusaddress, value, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__scheduler__.wait( self.updateOutputsFuture(modbusaddress, value, priority=priority, deadline=deadline) )
 
-        for address in modbusaddress:
-            self.__delay__(address)
-            self.__modules__[address].updateOutputsByList(valueList)
-            self.__lastmoduleused__ = address
-            self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
+    def updateOutputsByList(self, modbusaddress, valueList, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__scheduler__.wait( self.updateOutputsByListFuture(modbusaddress, valueList, priority=priority, deadline=deadline) )
         
-    def updateOutputsByHexStr(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False,):
-        if modbusaddress not in self.__modules__:
-            return None
+    def updateOutputsByHexStr(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False, priority=PRIORITY_OUTPUT, deadline=None):
+        self.__scheduler__.wait( self.updateOutputsByHexStrFuture(modbusaddress, hexStr, outputValue=outputValue, keepCurrent=keepCurrent, priority=priority, deadline=deadline) )
 
-        if modbusaddress is None:
-            modbusaddress = self.__modules__
-        else:
-            modbusaddress = [ modbusaddress ]
+    def getSnapshot(self, modbusaddress):
+        '''
+        {'model', 'numberinputoutputs', 'baudrate', 'health', 'inputs', 'outputs'} of one module as last published, inputs and outputs are IOStateSnapshot
+        '''
+        return self.__snapshots__.get(modbusaddress)
 
-        for address in self.__modules__:
-            self.__delay__(address)
-            self.__modules__[address].updateOutputsByHexStr(hexStr,outputValue=outputValue,keepCurrent=keepCurrent)
+    def getSnapshots(self):
+        '''
+        {modbusaddress: snapshot} of every module, each snapshot is consistent in itself
+        '''
+        return dict(self.__snapshots__)
 
     def getInput(self, modbusaddress, inputnumber):
-        if modbusaddress is None:
-            return None
-        if modbusaddress not in self.__modules__:
+        snapshot = self.getSnapshot(modbusaddress)
+        if snapshot is None:
             return None
-
-        self.__delay__(modbusaddress)
-        input = self.__modules__[modbusaddress].getInput(inputnumber)
-        self.__lastmoduleused__ = modbusaddress
-        self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-        return input
+        if isinstance(inputnumber, int):
+            return snapshot['inputs'].select(inputnumber)
 
     def getInputs(self, modbusaddress, inputnumbers=None):
-        if modbusaddress is None:
-            return None
-        if modbusaddress not in self.__modules__:
+        snapshot = self.getSnapshot(modbusaddress)
+        if snapshot is None:
             return None
-
-        self.__delay__(modbusaddress)
-        inputs = self.__modules__[modbusaddress].getInputs(inputnumbers)
-        self.__lastmoduleused__ = modbusaddress
-        self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-        return inputs
+        return snapshot['inputs'].select(inputnumbers)
 
     def getOutputs(self, modbusaddress, outputnumbers=None):
-        if modbusaddress is None:
+        snapshot = self.getSnapshot(modbusaddress)
+        if snapshot is None:
             return None
-        if modbusaddress not in self.__modules__:
-            return None
-
-        self.__delay__(modbusaddress)
-        outputs = self.__modules__[modbusaddress].getOutputs(outputnumbers)
-        self.__lastmoduleused__ = modbusaddress
-        self.__lastmoduleusedat__ = datetime.datetime.now(datetime.UTC)
-        return outputs
+        return snapshot['outputs'].select(outputnumbers)
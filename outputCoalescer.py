@@ -0,0 +1,155 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Coalescing of single output writes
+
+Notes:
+    A scene that switches twenty relays usually arrives as twenty single output commands, each one a WRITE_DO round trip on the bus.
+    OutputCoalescer holds the single output changes for a module for a short window and then hands them over together, the manager writes them as one merged write of the output registers.
+    The changes are kept in the order they arrived so a later change to an output wins and TOGGLE toggles the value left by the changes before it.
+    A write that does not go through the coalescer takes the pending changes of its module first with take(), otherwise it could land before an older change still waiting in the window and then be overwritten by it.
+'''
+
+import threading
+import time
+from concurrent.futures import Future
+
+
+class OutputCoalescer():
+    def __init__(self, window, flush, ):
+        '''
+        window is the seconds a change waits for others to the same module.
+        flush(modbusaddress, changes) is called on the coalescer thread with [(output, value, future, priority, deadline)] in the order the changes were added, it must complete each future.
+        '''
+        self.__window__ = window
+        self.__flush__ = flush
+        self.__pending__ = {}
+        self.__flushat__ = {}
+        self.__condition__ = threading.Condition()
+        self.__handover__ = threading.Lock()
+        self.__thread__ = None
+        self.__running__ = False
+
+        self.changes = 0
+        self.flushes = 0
+
+    @property
+    def window(self):
+        return self.__window__
+
+    def start(self, name='OutputCoalescer'):
+        with self.__condition__:
+            if self.__thread__ is not None:
+                return None
+            self.__running__ = True
+            self.__thread__ = threading.Thread(target=self.__run__, name=name, daemon=True)
+        self.__thread__.start()
+
+    def stop(self, timeout=None):
+        '''
+        Hand over every pending change then stop the thread
+        '''
+        with self.__condition__:
+            if self.__thread__ is None:
+                return None
+            self.__running__ = False
+            self.__condition__.notify()
+        self.__thread__.join(timeout)
+        self.__thread__ = None
+
+    def add(self, modbusaddress, output, value, priority=None, deadline=None):
+        '''
+        Queue one output change, returns a Future that is done when the merged write holding it is
+        '''
+        future = Future()
+        with self.__condition__:
+            pending = self.__pending__.setdefault(modbusaddress, [])
+            pending.append( (output, value, future, priority, deadline) )
+            self.changes += 1
+            if len(pending) == 1:
+                self.__flushat__[modbusaddress] = time.monotonic() + self.__window__
+                self.__condition__.notify()
+        return future
+
+    def take(self, modbusaddress):
+        '''
+        Remove and return the pending changes of one module without waiting for the window, the caller must complete each future.
+        A window ending at the same time is handed over either before take returns or not at all.
+        '''
+        with self.__handover__:
+            with self.__condition__:
+                self.__flushat__.pop(modbusaddress, None)
+                return self.__pending__.pop(modbusaddress, [])
+
+    def __due__(self, now, flushall):
+        '''
+        Remove and return the modules whose window has ended, called holding the condition
+        '''
+        due = [ modbusaddress for modbusaddress, flushat in self.__flushat__.items() if flushall or flushat <= now ]
+        for modbusaddress in due:
+            del self.__flushat__[modbusaddress]
+        return [ (modbusaddress, self.__pending__.pop(modbusaddress)) for modbusaddress in due ]
+
+    def __run__(self):
+        while True:
+            with self.__condition__:
+                while self.__running__:
+                    now = time.monotonic()
+                    if any( flushat <= now for flushat in self.__flushat__.values() ):
+                        break
+                    timeout = None
+                    if self.__flushat__:
+                        timeout = min(self.__flushat__.values()) - now
+                    self.__condition__.wait(timeout)
+
+            '''
+            The changes are handed over holding __handover__ so take() never returns while a window of the same module is between being removed and being queued
+            '''
+            with self.__handover__:
+                with self.__condition__:
+                    running = self.__running__
+                    due = self.__due__(time.monotonic(), not running)
+
+                for modbusaddress, changes in due:
+                    self.flushes += 1
+                    try:
+                        self.__flush__(modbusaddress, changes)
+                    except Exception as exception:
+                        for output, value, future, priority, deadline in changes:
+                            if not future.done():
+                                future.set_exception(exception)
+
+            if not running:
+                break
+
+    def stats(self):
+        return {
+                'window':       self.__window__,
+                'changes':      self.changes,
+                'flushes':      self.flushes,
+                }
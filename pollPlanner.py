@@ -0,0 +1,196 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Timetable of input polls from per module latency targets
+
+Notes:
+    Each module, or each input register of a module polled one register at a time, can be given a target latency, the longest a change of its inputs may go unseen.
+    A change just after a poll is seen at the end of the next one so a target L with a measured poll time c needs a poll started every L - c seconds, the poll time is a moving average of the measured transactions so it follows the baud rate and the modules actually on the bus.
+    After a change the period is shortened for a while since a button that was pressed is likely to be released or pressed again soon.
+    The targets can be met when the share of the bus the polls need, the sum of c / (L - c), is at most 1, the planner reports when it is not so the targets or the baud rate can be changed.
+    A module without a target is still polled every sweep and a sweep is started at least every shortest period P, so the modules without a target take the sum of their poll times over P on top.
+'''
+
+
+'''
+Seconds after an input change that a module is polled more often and the factor its period is multiplied by meanwhile
+'''
+DEFAULT_ACTIVITY_HOLD = 2.0
+DEFAULT_ACTIVITY_FACTOR = 0.5
+
+'''
+Weight of the newest measurement in the moving average of the poll time
+'''
+DEFAULT_SMOOTHING = 0.2
+
+
+class PollTarget():
+    __slots__ = (
+                'latency',
+                'polltime',
+                'lastpoll',
+                'lastactivity',
+                'polls',
+                )
+
+    def __init__(self, latency, polltime, ):
+        self.latency = latency
+        self.polltime = polltime
+        self.lastpoll = None
+        self.lastactivity = None
+        self.polls = 0
+
+
+class PollPlanner():
+    def __init__(self, activityhold=DEFAULT_ACTIVITY_HOLD, activityfactor=DEFAULT_ACTIVITY_FACTOR, smoothing=DEFAULT_SMOOTHING, plancallback=None, ):
+        '''
+        Targets are kept as {modbusaddress: {register: PollTarget}}, register None standing for every input of the module.
+        plancallback(feasible, utilisation) is called whenever the targets go from being feasible to not or back.
+        '''
+        self.__activityhold__ = activityhold
+        self.__activityfactor__ = activityfactor
+        self.__smoothing__ = smoothing
+        self.__plancallback__ = plancallback
+        self.__targets__ = {}
+        self.__polltimes__ = {}
+        self.__feasible__ = True
+
+    def addmodule(self, modbusaddress, polltime):
+        '''
+        Add a module that is polled every sweep while it has no target, polltime is the estimate of a poll of every input used until one has been timed
+        '''
+        self.__polltimes__.setdefault(modbusaddress, polltime)
+        self.__checkfeasible__()
+
+    def settarget(self, modbusaddress, latency, register=None, polltime=0.0):
+        '''
+        Set the target latency in seconds, polltime is the estimate used until a poll has been timed and None removes the target
+        '''
+        targets = self.__targets__.setdefault(modbusaddress, {})
+        if latency is None:
+            targets.pop(register, None)
+        elif register in targets:
+            targets[register].latency = latency
+        else:
+            targets[register] = PollTarget(latency, polltime)
+        if not targets:
+            del self.__targets__[modbusaddress]
+        self.__checkfeasible__()
+
+    def targets(self, modbusaddress):
+        '''
+        {register: latency} of a module, empty when it has no target and is polled every sweep
+        '''
+        return {register: target.latency for register, target in self.__targets__.get(modbusaddress, {}).items()}
+
+    def period(self, target, now):
+        period = max(0.0, target.latency - target.polltime)
+        if target.lastactivity is not None and now - target.lastactivity < self.__activityhold__:
+            period *= self.__activityfactor__
+        return period
+
+    def untildue(self, target, now):
+        if target.lastpoll is None:
+            return 0.0
+        return target.lastpoll + self.period(target, now) - now
+
+    def due(self, modbusaddress, now):
+        '''
+        The registers of a module due a poll, [None] for the whole module and an empty list when nothing is due
+        '''
+        return [ register for register, target in self.__targets__.get(modbusaddress, {}).items() if self.untildue(target, now) <= 0 ]
+
+    def nextdue(self, now):
+        '''
+        Seconds until the next target is due, None without targets
+        '''
+        if not self.__targets__:
+            return None
+        return max(0.0, min( self.untildue(target, now) for targets in self.__targets__.values() for target in targets.values() ))
+
+    def recordpoll(self, modbusaddress, registers, started, duration, changed):
+        '''
+        Record a poll of registers of a module that started at started and took duration seconds, changed is True when any input changed
+        '''
+        targets = self.__targets__.get(modbusaddress, {})
+        if registers is None:
+            registers = list(targets)
+            if modbusaddress in self.__polltimes__:
+                self.__polltimes__[modbusaddress] += self.__smoothing__ * (duration - self.__polltimes__[modbusaddress])
+        for register in registers:
+            target = targets.get(register)
+            if target is None:
+                continue
+            if target.polls == 0:
+                target.polltime = duration
+            else:
+                target.polltime += self.__smoothing__ * (duration - target.polltime)
+            target.polls += 1
+            target.lastpoll = started
+            if changed:
+                target.lastactivity = started
+        self.__checkfeasible__()
+
+    def utilisation(self):
+        '''
+        Share of the bus the polls need to meet every target, infinite when a target is shorter than its poll time.
+        The modules without a target are counted once per shortest period since every sweep polls them.
+        '''
+        utilisation = 0.0
+        periods = []
+        for target in [ target for targets in self.__targets__.values() for target in targets.values() ]:
+            if target.latency <= target.polltime:
+                return float('inf')
+            utilisation += target.polltime / (target.latency - target.polltime)
+            periods.append(target.latency - target.polltime)
+        untargeted = sum( polltime for modbusaddress, polltime in self.__polltimes__.items() if modbusaddress not in self.__targets__ )
+        if periods and untargeted:
+            utilisation += untargeted / min(periods)
+        return utilisation
+
+    def __checkfeasible__(self):
+        utilisation = self.utilisation()
+        feasible = utilisation <= 1.0
+        if feasible != self.__feasible__:
+            self.__feasible__ = feasible
+            if self.__plancallback__ is not None:
+                self.__plancallback__( feasible, utilisation )
+
+    @property
+    def feasible(self):
+        return self.__feasible__
+
+    def plan(self, now):
+        '''
+        {'feasible', 'utilisation', 'targets': {modbusaddress: {register: {'latency', 'polltime', 'period', 'polls'}}}} with times in seconds
+        '''
+        return {
+                'feasible':         self.__feasible__,
+                'utilisation':      self.utilisation(),
+                'targets':          { modbusaddress: { register: {'latency': target.latency, 'polltime': target.polltime, 'period': self.period(target, now), 'polls': target.polls} for register, target in targets.items() } for modbusaddress, targets in self.__targets__.items() },
+                }
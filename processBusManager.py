@@ -0,0 +1,519 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Manager running each RS485 bus in its own worker process
+
+Notes:
+    With many buses one process shares one GIL between the frame handling of every bus, the JSON and the MQTT I/O. Here each bus is polled by a MultipleModuleManager in its own process.
+    The worker publishes the input and output state of each module to a SharedIOState in shared memory, so getInput, getInputs and getOutputs read it straight from shared memory and never wait for the bus or the worker.
+    Writes and other commands go to the worker over a multiprocessing queue and are run between its polls, results and input changes come back over a second queue.
+    The workers poll continuously on their own, pollReadInputs only asks for an extra poll.
+    Callbacks are called on a thread of this process with the global address of the module, see BusAddressMap.
+'''
+
+import itertools
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future
+from multipleModuleManager import MultipleModuleManager
+from multiBusManager import BusAddressMap
+from sharedIOState import SharedIOState
+from busScheduler import gatherfutures, PRIORITY_OUTPUT
+from eletech23iod import SCAN_ADDRESSES
+from moduleHealth import QUARANTINED, DEFAULT_FAILURE_THRESHOLD, DEFAULT_INITIAL_BACKOFF, DEFAULT_MAXIMUM_BACKOFF
+
+
+'''
+Worker processes are started fresh rather than forked so they do not inherit the threads and locks of the MQTT bridge
+'''
+START_METHOD = 'spawn'
+
+'''
+One shared memory slot per Modbus address, the slot number is the Modbus address
+'''
+SHARED_SLOTS = 0x40
+
+'''
+Seconds a worker whose modules are all quarantined waits for a command before its next sweep, and between checks that a starting worker is still alive
+'''
+WORKER_IDLE_WAIT = 0.01
+WORKER_START_POLL = 0.5
+
+
+def busworker(port, sharedname, commands, replies, options, forwardinput, forwardinputs, forwardoutput, forwardplan, ):
+    '''
+    Body of a worker process, connects the modules of one bus then polls them until it is sent None
+    '''
+    shared = SharedIOState(SHARED_SLOTS, name=sharedname)
+    running = [True]
+    manager = None
+
+    def publish(modbusaddress):
+        module = manager.getModule(modbusaddress)
+        if module is not None:
+            shared.publish(modbusaddress, module.model, module.baudrate, manager.getModuleHealth(modbusaddress), module.inputstate, module.outputstate)
+
+    def inputchanged(modbusaddress, input, state):
+        replies.put( ('input', modbusaddress, input, state) )
+
+    def inputschanged(modbusaddress, risingbits, fallingbits):
+        publish(modbusaddress)
+        if forwardinputs:
+            replies.put( ('inputs', modbusaddress, risingbits, fallingbits) )
+
+    def outputchanged(modbusaddress, output, state):
+        publish(modbusaddress)
+        if forwardoutput:
+            replies.put( ('output', modbusaddress, output, state) )
+
+    def planchanged(port, feasible, utilisation):
+        if forwardplan:
+            replies.put( ('plan', None, feasible, utilisation) )
+
+    def healthchanged(modbusaddress, state):
+        publish(modbusaddress)
+        replies.put( ('health', modbusaddress, state) )
+
+    def service(timeout=None):
+        '''
+        Run every command waiting, called between polls
+        '''
+        while running[0]:
+            try:
+                if timeout is None:
+                    command = commands.get_nowait()
+                else:
+                    command = commands.get(timeout=timeout)
+                    timeout = None
+            except queue.Empty:
+                return None
+            if command is None:
+                running[0] = False
+                return None
+
+            requestid, method, args, kwargs = command
+            try:
+                result = getattr(manager, method)(*args, **kwargs)
+            except Exception as exception:
+                replies.put( ('result', requestid, False, exception) )
+            else:
+                replies.put( ('result', requestid, True, result) )
+
+            if method.startswith('updateOutput') or method in ('reassertOutputs', 'pollReadOutputs'):
+                if args[0] is None:
+                    for modbusaddress in manager.getModbusAddresses():
+                        publish(modbusaddress)
+                else:
+                    publish(args[0])
+
+    try:
+        manager = MultipleModuleManager(
+                                        port=port,
+                                        inputchangecallback=inputchanged if forwardinput else None,
+                                        inputschangecallback=inputschanged,
+                                        healthcallback=healthchanged,
+                                        outputchangecallback=outputchanged,
+                                        pollplancallback=planchanged,
+                                        betweencallback=service,
+                                        **options
+                                        )
+    except Exception as exception:
+        replies.put( ('failed', exception) )
+        shared.close()
+        return None
+
+    modules = {}
+    for modbusaddress in manager.getModbusAddresses():
+        publish(modbusaddress)
+        modules[modbusaddress] = {'model': manager.getModule(modbusaddress).model, 'baudrate': manager.getBaudRate(modbusaddress), 'numberinputoutputs': manager.getNumberInputOutputs(modbusaddress)}
+    replies.put( ('ready', modules) )
+
+    try:
+        while running[0]:
+            manager.pollReadInputs()
+            '''
+            With poll targets the worker waits for commands until the next module is due instead of sweeping again at once
+            '''
+            wait = manager.timeUntilNextPoll()
+            if wait is None and all(state == QUARANTINED for state in manager.getModuleHealths().values()):
+                wait = WORKER_IDLE_WAIT
+            service(wait if wait else None)
+    finally:
+        shared.close()
+        replies.put( ('stopped', ) )
+
+
+class BusWorkerProcess():
+    def __init__(self, context, port, options, onevent, forwardinput, forwardinputs, forwardoutput, forwardplan, ):
+        '''
+        The bridge side of one worker process, onevent(port, event) is called on the reply thread for input and health changes and must not block
+        '''
+        self.__port__ = port
+        self.__onevent__ = onevent
+        self.__shared__ = SharedIOState(SHARED_SLOTS, create=True)
+        self.__commands__ = context.Queue()
+        self.__replies__ = context.Queue()
+        self.__pending__ = {}
+        self.__lock__ = threading.Lock()
+        self.__requestids__ = itertools.count()
+        self.__modules__ = {}
+        self.__snapshots__ = {}
+        self.__thread__ = None
+        self.__process__ = context.Process(target=busworker, args=(port, self.__shared__.name, self.__commands__, self.__replies__, options, forwardinput, forwardinputs, forwardoutput, forwardplan), name=f'''busworker {port}''', daemon=True)
+        self.__process__.start()
+
+    @property
+    def port(self):
+        return self.__port__
+
+    @property
+    def modules(self):
+        '''
+        {modbusaddress: {'model', 'baudrate', 'numberinputoutputs'}} of the connected modules
+        '''
+        return self.__modules__
+
+    def waitready(self):
+        '''
+        Wait until the worker has connected its modules, raises the exception the worker failed with
+        '''
+        while True:
+            try:
+                reply = self.__replies__.get(timeout=WORKER_START_POLL)
+                break
+            except queue.Empty:
+                if not self.__process__.is_alive():
+                    raise RuntimeError(f'''Bus worker for {self.__port__} exited while starting''')
+        if reply[0] == 'failed':
+            self.__process__.join()
+            raise reply[1]
+        self.__modules__ = reply[1]
+        self.__thread__ = threading.Thread(target=self.__readreplies__, name=f'''busworker replies {self.__port__}''', daemon=True)
+        self.__thread__.start()
+
+    def __readreplies__(self):
+        while True:
+            reply = self.__replies__.get()
+            if reply[0] == 'stopped':
+                break
+            if reply[0] == 'result':
+                requestid, success, result = reply[1:]
+                with self.__lock__:
+                    future = self.__pending__.pop(requestid, None)
+                if future is None:
+                    continue
+                if success:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+                continue
+            self.__onevent__(self.__port__, reply)
+
+        with self.__lock__:
+            pending = list(self.__pending__.values())
+            self.__pending__.clear()
+        for future in pending:
+            future.set_exception(RuntimeError(f'''Bus worker for {self.__port__} stopped'''))
+
+    def submit(self, method, *args, **kwargs):
+        '''
+        Run manager.method(*args, **kwargs) in the worker, returns a Future of the result
+        '''
+        future = Future()
+        with self.__lock__:
+            requestid = next(self.__requestids__)
+            self.__pending__[requestid] = future
+        self.__commands__.put( (requestid, method, args, kwargs) )
+        return future
+
+    def snapshot(self, modbusaddress):
+        '''
+        State of one module from shared memory, kept until the worker publishes the module again
+        '''
+        if modbusaddress not in self.__modules__:
+            return None
+        version = self.__shared__.version(modbusaddress)
+        cached = self.__snapshots__.get(modbusaddress)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        snapshot = self.__shared__.snapshot(modbusaddress)
+        self.__snapshots__[modbusaddress] = (version, snapshot)
+        return snapshot
+
+    def stop(self):
+        if self.__process__.is_alive():
+            self.__commands__.put(None)
+            self.__process__.join()
+        if self.__thread__ is not None:
+            self.__thread__.join()
+        self.__shared__.close()
+
+
+class ProcessBusManager():
+    def __init__(self, buses, desiredbaudrate=115200, addressmap=None, inputchangecallback=None, intermoduledelay=None, inputpollmode=None, inputschangecallback=None, discoverycache=None, scan=False, scanaddresses=SCAN_ADDRESSES, scanbaudrates=None, healthcallback=None, failurethreshold=DEFAULT_FAILURE_THRESHOLD, initialbackoff=DEFAULT_INITIAL_BACKOFF, maximumbackoff=DEFAULT_MAXIMUM_BACKOFF, reassertinterval=None, outputpollinterval=None, outputpollmode=None, outputchangecallback=None, polltargets=None, pollplancallback=None, ):
+        '''
+        The same arguments as MultiBusManager, buses is {port: [modbusaddress, ...]} and the workers are started and connected in parallel.
+        The discoverycache is saved here once every worker has connected.
+        '''
+        self.__addresses__ = BusAddressMap(addressmap)
+        self.__inputchangecallback__ = inputchangecallback
+        self.__inputschangecallback__ = inputschangecallback
+        self.__healthcallback__ = healthcallback
+        self.__outputchangecallback__ = outputchangecallback
+        self.__pollplancallback__ = pollplancallback
+        self.__buses__ = {}
+        self.__events__ = queue.Queue()
+        self.__eventthread__ = threading.Thread(target=self.__dispatchevents__, name='busworker events', daemon=True)
+        self.__eventthread__.start()
+
+        context = multiprocessing.get_context(START_METHOD)
+        for port, modbusaddresses in buses.items():
+            options = {
+                        'desiredbaudrate':      desiredbaudrate,
+                        'modbusaddresses':      modbusaddresses,
+                        'intermoduledelay':     intermoduledelay,
+                        'inputpollmode':        inputpollmode,
+                        'discoverycache':       discoverycache,
+                        'scan':                 scan,
+                        'scanaddresses':        scanaddresses,
+                        'scanbaudrates':        scanbaudrates,
+                        'failurethreshold':     failurethreshold,
+                        'initialbackoff':       initialbackoff,
+                        'maximumbackoff':       maximumbackoff,
+                        'reassertinterval':     reassertinterval,
+                        'outputpollinterval':   outputpollinterval,
+                        'outputpollmode':       outputpollmode,
+                    }
+            self.__buses__[port] = BusWorkerProcess(context, port, options, self.__onevent__, inputchangecallback is not None, inputschangecallback is not None, outputchangecallback is not None, pollplancallback is not None)
+
+        try:
+            for port, worker in self.__buses__.items():
+                worker.waitready()
+                for modbusaddress in worker.modules:
+                    self.__addresses__.add(port, modbusaddress)
+        except Exception:
+            self.close()
+            raise
+
+        if discoverycache is not None:
+            for port, worker in self.__buses__.items():
+                if scan:
+                    for modbusaddress in discoverycache.getModbusAddresses(port):
+                        if modbusaddress not in worker.modules:
+                            discoverycache.remove(port, modbusaddress)
+                for modbusaddress, module in worker.modules.items():
+                    discoverycache.set(port, modbusaddress, module['model'], module['baudrate'])
+            discoverycache.save()
+
+        if polltargets is not None:
+            for modbusaddress, target in polltargets.items():
+                if isinstance(target, dict):
+                    for register, latency in target.items():
+                        self.setPollTarget(modbusaddress, latency, register=register)
+                else:
+                    self.setPollTarget(modbusaddress, target)
+
+    def __onevent__(self, port, event):
+        self.__events__.put( (port, event) )
+
+    def __dispatchevents__(self):
+        '''
+        Callbacks run on their own thread so that they can wait for writes, whose results arrive on the reply threads
+        '''
+        while True:
+            item = self.__events__.get()
+            if item is None:
+                break
+            port, event = item
+            self.__callback__(port, event)
+
+    def __callback__(self, port, event):
+        if event[0] == 'plan':
+            self.__pollplancallback__(port, event[2], event[3])
+            return None
+        globaladdress = self.__addresses__.globaladdress(port, event[1])
+        if event[0] == 'input' and self.__inputchangecallback__ is not None:
+            self.__inputchangecallback__(globaladdress, event[2], event[3])
+        elif event[0] == 'inputs' and self.__inputschangecallback__ is not None:
+            self.__inputschangecallback__(globaladdress, event[2], event[3])
+        elif event[0] == 'output' and self.__outputchangecallback__ is not None:
+            self.__outputchangecallback__(globaladdress, event[2], event[3])
+        elif event[0] == 'health' and self.__healthcallback__ is not None:
+            self.__healthcallback__(globaladdress, event[2])
+
+    def __route__(self, modbusaddress):
+        port, address = self.__addresses__.route(modbusaddress)
+        if port not in self.__buses__:
+            return None, None
+        return self.__buses__[port], address
+
+    def __snapshot__(self, modbusaddress):
+        worker, address = self.__route__(modbusaddress)
+        if worker is None:
+            return None
+        return worker.snapshot(address)
+
+    def close(self):
+        for worker in self.__buses__.values():
+            worker.stop()
+        self.__events__.put(None)
+        if threading.current_thread() is not self.__eventthread__:
+            self.__eventthread__.join()
+
+    def getPorts(self):
+        return list(self.__buses__)
+
+    def getModbusAddresses( self, ):
+        addresses = []
+        for port, worker in self.__buses__.items():
+            for modbusaddress in worker.modules:
+                addresses.append( self.__addresses__.globaladdress(port, modbusaddress) )
+        return addresses
+
+    def getBaudRate(self,modbusaddress):
+        worker, address = self.__route__(modbusaddress)
+        if worker is None or address not in worker.modules:
+            return None
+        return worker.modules[address]['baudrate']
+
+    def getNumberInputOutputs(self,modbusaddress):
+        worker, address = self.__route__(modbusaddress)
+        if worker is None or address not in worker.modules:
+            return None
+        return worker.modules[address]['numberinputoutputs']
+
+    def getModuleHealths(self):
+        healths = {}
+        for port, worker in self.__buses__.items():
+            for modbusaddress in worker.modules:
+                healths[ self.__addresses__.globaladdress(port, modbusaddress) ] = worker.snapshot(modbusaddress)['health']
+        return healths
+
+    def getSchedulerStats(self):
+        return {port: worker.submit('getSchedulerStats').result() for port, worker in self.__buses__.items()}
+
+    def setPollTarget(self, modbusaddress, latency, register=None):
+        worker, address = self.__route__(modbusaddress)
+        if worker is None:
+            return None
+        worker.submit('setPollTarget', address, latency, register=register).result()
+
+    def getPollPlan(self):
+        return {port: worker.submit('getPollPlan').result() for port, worker in self.__buses__.items()}
+
+    def getWriteStats(self):
+        stats = {}
+        for port, worker in self.__buses__.items():
+            for modbusaddress, modulestats in worker.submit('getWriteStats').result().items():
+                stats[ self.__addresses__.globaladdress(port, modbusaddress) ] = modulestats
+        return stats
+
+    def __futures__(self, modbusaddress, method, *args, **kwargs):
+        '''
+        Futures of running method in the worker of modbusaddress, None runs it in every worker
+        '''
+        if modbusaddress is None:
+            return [ worker.submit(method, None, *args, **kwargs) for worker in self.__buses__.values() ]
+        worker, address = self.__route__(modbusaddress)
+        if worker is None:
+            return []
+        return [ worker.submit(method, address, *args, **kwargs) ]
+
+    def pollReadInputsFuture(self,modbusaddress=None):
+        return gatherfutures( self.__futures__(modbusaddress, 'pollReadInputs') )
+
+    def pollReadInputs(self,modbusaddress=None):
+        self.pollReadInputsFuture(modbusaddress).result()
+
+    def updateOutputFuture(self,modbusaddress,output,value,priority=PRIORITY_OUTPUT,deadline=None):
+        if modbusaddress is None:
+            return gatherfutures([])
+        return gatherfutures( self.__futures__(modbusaddress, 'updateOutput', output, value, priority=priority, deadline=deadline) )
+
+    def updateOutputsFuture(self, modbusaddress, value, priority=PRIORITY_OUTPUT, deadline=None):
+        return gatherfutures( self.__futures__(modbusaddress, 'updateOutputs', value, priority=priority, deadline=deadline) )
+
+    def updateOutputsByListFuture(self, modbusaddress, valueList, priority=PRIORITY_OUTPUT, deadline=None):
+        return gatherfutures( self.__futures__(modbusaddress, 'updateOutputsByList', valueList, priority=priority, deadline=deadline) )
+
+    def updateOutputsByHexStrFuture(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False, priority=PRIORITY_OUTPUT, deadline=None):
+        return gatherfutures( self.__futures__(modbusaddress, 'updateOutputsByHexStr', hexStr, outputValue=outputValue, keepCurrent=keepCurrent, priority=priority, deadline=deadline) )
+
+    def updateOutput(self,modbusaddress,output,value,priority=PRIORITY_OUTPUT,deadline=None):
+        self.updateOutputFuture(modbusaddress, output, value, priority=priority, deadline=deadline).result()
+
+    def updateOutputs(self, modbusaddress, value, priority=PRIORITY_OUTPUT, deadline=None):
+        self.updateOutputsFuture(modbusaddress, value, priority=priority, deadline=deadline).result()
+
+    def updateOutputsByList(self, modbusaddress, valueList, priority=PRIORITY_OUTPUT, deadline=None):
+        self.updateOutputsByListFuture(modbusaddress, valueList, priority=priority, deadline=deadline).result()
+
+    def updateOutputsByHexStr(self, modbusaddress, hexStr, outputValue=True, keepCurrent=False, priority=PRIORITY_OUTPUT, deadline=None):
+        self.updateOutputsByHexStrFuture(modbusaddress, hexStr, outputValue=outputValue, keepCurrent=keepCurrent, priority=priority, deadline=deadline).result()
+
+    def pollReadOutputsFuture(self, modbusaddress=None):
+        return gatherfutures( self.__futures__(modbusaddress, 'pollReadOutputs') )
+
+    def pollReadOutputs(self, modbusaddress=None):
+        self.pollReadOutputsFuture(modbusaddress).result()
+
+    def reassertOutputsFuture(self, modbusaddress=None, priority=PRIORITY_OUTPUT, deadline=None):
+        return gatherfutures( self.__futures__(modbusaddress, 'reassertOutputs', priority=priority, deadline=deadline) )
+
+    def reassertOutputs(self, modbusaddress=None, priority=PRIORITY_OUTPUT, deadline=None):
+        self.reassertOutputsFuture(modbusaddress, priority=priority, deadline=deadline).result()
+
+    def getSnapshot(self, modbusaddress):
+        return self.__snapshot__(modbusaddress)
+
+    def getSnapshots(self):
+        snapshots = {}
+        for port, worker in self.__buses__.items():
+            for modbusaddress in worker.modules:
+                snapshots[ self.__addresses__.globaladdress(port, modbusaddress) ] = worker.snapshot(modbusaddress)
+        return snapshots
+
+    def getInput(self, modbusaddress, inputnumber):
+        snapshot = self.__snapshot__(modbusaddress)
+        if snapshot is None:
+            return None
+        if isinstance(inputnumber, int):
+            return snapshot['inputs'].select(inputnumber)
+
+    def getInputs(self, modbusaddress, inputnumbers=None):
+        snapshot = self.__snapshot__(modbusaddress)
+        if snapshot is None:
+            return None
+        return snapshot['inputs'].select(inputnumbers)
+
+    def getOutputs(self, modbusaddress, outputnumbers=None):
+        snapshot = self.__snapshot__(modbusaddress)
+        if snapshot is None:
+            return None
+        return snapshot['outputs'].select(outputnumbers)
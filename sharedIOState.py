@@ -0,0 +1,131 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Input and output state of the modules on one bus in shared memory
+
+Notes:
+    The bus worker process writes and any number of other processes read, a read never waits for the bus or for a lock.
+    Each module has a slot that starts with a version number. The writer makes the version odd, writes the slot and makes the version even again (a seqlock).
+    A reader copies the slot between two reads of the version and copies it again when the version was odd or has changed, so it never sees a half written slot.
+    The slots are read and written with struct and memoryview straight from the shared buffer, nothing is pickled or sent between the processes.
+'''
+
+import struct
+import time
+from multiprocessing import shared_memory
+from ioState import IOStateSnapshot, PACKED_SIZE, modulesnapshot
+from moduleHealth import HEALTHY, QUARANTINED
+
+
+'''
+Slot header, version, model, number of inputs and outputs, baud rate and health
+'''
+SLOT_VERSION = struct.Struct('<Q')
+SLOT_HEADER = struct.Struct('<QHHIB7x')
+SLOT_SIZE = SLOT_HEADER.size + 2 * PACKED_SIZE
+
+HEALTH_STATES = [HEALTHY, QUARANTINED]
+
+'''
+A reader that keeps finding the slot being written gives up spinning and sleeps this long between tries
+'''
+READ_RETRY_SLEEP = 0.0001
+READ_SPIN_TRIES = 100
+
+
+class SharedIOState():
+    def __init__(self, numberslots, name=None, create=False, ):
+        '''
+        create a new region of numberslots slots, or attach to the region called name
+        '''
+        self.__numberslots__ = numberslots
+        self.__sharedmemory__ = shared_memory.SharedMemory(name=name, create=create, size=max(1, numberslots * SLOT_SIZE))
+        self.__buffer__ = self.__sharedmemory__.buf
+        self.__created__ = create
+        if create:
+            self.__buffer__[:numberslots * SLOT_SIZE] = bytes(numberslots * SLOT_SIZE)
+
+        self.retries = 0
+
+    @property
+    def name(self):
+        return self.__sharedmemory__.name
+
+    def __len__(self):
+        return self.__numberslots__
+
+    def close(self):
+        '''
+        Detach from the region, the process that created it also removes it
+        '''
+        if self.__sharedmemory__ is None:
+            return None
+        self.__buffer__ = None
+        self.__sharedmemory__.close()
+        if self.__created__:
+            self.__sharedmemory__.unlink()
+        self.__sharedmemory__ = None
+
+    def publish(self, slot, model, baudrate, health, inputs, outputs):
+        '''
+        Write the state of one module, only one process may publish to a slot. inputs and outputs are IOStateStore
+        '''
+        buffer = self.__buffer__
+        offset = slot * SLOT_SIZE
+        version = SLOT_VERSION.unpack_from(buffer, offset)[0]
+
+        SLOT_VERSION.pack_into(buffer, offset, version + 1)
+        SLOT_HEADER.pack_into(buffer, offset, version + 1, model, len(inputs), baudrate, HEALTH_STATES.index(health))
+        inputs.packinto(buffer, offset + SLOT_HEADER.size)
+        outputs.packinto(buffer, offset + SLOT_HEADER.size + PACKED_SIZE)
+        SLOT_VERSION.pack_into(buffer, offset, version + 2)
+
+    def version(self, slot):
+        return SLOT_VERSION.unpack_from(self.__buffer__, slot * SLOT_SIZE)[0]
+
+    def snapshot(self, slot):
+        '''
+        Consistent copy of one module, None when nothing has been published to the slot yet
+        Returns {'model', 'numberinputoutputs', 'baudrate', 'health', 'inputs', 'outputs'} with inputs and outputs as IOStateSnapshot
+        '''
+        buffer = self.__buffer__
+        offset = slot * SLOT_SIZE
+        tries = 0
+        while True:
+            version, model, number, baudrate, health = SLOT_HEADER.unpack_from(buffer, offset)
+            if version == 0:
+                return None
+            if version & 1 == 0:
+                inputs = IOStateSnapshot.unpackfrom(buffer, offset + SLOT_HEADER.size, number)
+                outputs = IOStateSnapshot.unpackfrom(buffer, offset + SLOT_HEADER.size + PACKED_SIZE, number)
+                if SLOT_VERSION.unpack_from(buffer, offset)[0] == version:
+                    return modulesnapshot(model, baudrate, HEALTH_STATES[health], inputs, outputs)
+            self.retries += 1
+            tries += 1
+            if tries > READ_SPIN_TRIES:
+                time.sleep(READ_RETRY_SLEEP)
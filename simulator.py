@@ -0,0 +1,415 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Hardware free simulator of 23IOXX modules (M0 shorted / command 2 mode)
+
+Notes:
+    The simulator opens a Linux pseudo-terminal and answers the frames that ModbusDIO sends on the slave end of it.
+    Pass SimulatedBus.port to ModbusDIO or MultipleModuleManager in place of /dev/ttyUSB0.
+    Several SimulatedModule objects with unique modbus addresses can share one SimulatedBus just like modules wired onto one RS485 pair.
+    A module only answers when the baud rate configured on the port matches its own baud rate, so the baud rate search in ModbusDIO can be exercised.
+    Writing the baud rate register 0x00FE only takes effect after powerCycle() is called, the same as the real hardware.
+'''
+
+import os
+import tty
+import termios
+import select
+import threading
+import random
+import time
+from fastcrc import crc16
+from eletech23iod import BAUDRATES, MODELS, FUNCTIONCODES
+
+
+EXCEPTION_ILLEGAL_FUNCTION = 0x01
+EXCEPTION_ILLEGAL_DATA_ADDRESS = 0x02
+EXCEPTION_ILLEGAL_DATA_VALUE = 0x03
+
+'''
+Silence on the line longer than this discards a partially received frame
+'''
+FRAME_SILENCE_TIMEOUT = 0.05
+
+
+class SimulatedModule():
+    def __init__(self, modbusaddress=1, model=2332, baudrate=115200, responsedelay=0.0, corruptchecksumrate=0.0, dropreplyrate=0.0, unsupportedfunctioncodes=[], ):
+        if model not in MODELS:
+            raise ValueError(f'''Unknown model {model} expected one of {MODELS}''')
+        if baudrate not in BAUDRATES:
+            raise ValueError(f'''Unsupported baud rate {baudrate} expected one of {BAUDRATES}''')
+
+        self.__modbusaddress__ = modbusaddress
+        self.__model__ = model
+        self.__baudrate__ = baudrate
+        self.__numberinputoutputs__ = int(str(model)[-2:])
+        self.__numberregisters__ = (self.__numberinputoutputs__ + 15) // 16
+        self.__inputvalues__ = 0
+        self.__outputvalues__ = 0
+        self.__lock__ = threading.Lock()
+
+        self.responsedelay = responsedelay
+        self.corruptchecksumrate = corruptchecksumrate
+        self.dropreplyrate = dropreplyrate
+        self.unsupportedfunctioncodes = list(unsupportedfunctioncodes)
+
+        self.__specialregisters__ = {
+            0x00F5: 0,
+            0x00F6: 0,
+            0x00F7: model,
+            0x00F8: 0,
+            0x00FA: 0,
+            0x00FC: 0,
+            0x00FD: modbusaddress,
+            0x00FE: BAUDRATES.index(baudrate),
+            0x00FF: 0,
+        }
+
+        self.requestcounts = {}
+        self.droppedreplies = 0
+        self.corruptedreplies = 0
+
+    @property
+    def modbusaddress(self):
+        return self.__modbusaddress__
+
+    @property
+    def model(self):
+        return self.__model__
+
+    @property
+    def baudrate(self):
+        return self.__baudrate__
+
+    @property
+    def numberinputoutputs(self):
+        return self.__numberinputoutputs__
+
+    @property
+    def outputs(self):
+        return self.__outputvalues__
+
+    @property
+    def inputs(self):
+        return self.__inputvalues__
+
+    def setInput(self, inputnumber, value):
+        with self.__lock__:
+            if value:
+                self.__inputvalues__ |= (1 << inputnumber)
+            else:
+                self.__inputvalues__ &= ~(1 << inputnumber)
+
+    def setInputs(self, bits):
+        with self.__lock__:
+            self.__inputvalues__ = bits & ((1 << self.__numberinputoutputs__) - 1)
+
+    def getOutput(self, outputnumber):
+        return (self.__outputvalues__ >> outputnumber) & 1 == 1
+
+    def setOutputs(self, bits):
+        '''
+        Change the outputs behind the back of the driver, useful to simulate a power cycle or another bus master
+        '''
+        with self.__lock__:
+            self.__outputvalues__ = bits & ((1 << self.__numberinputoutputs__) - 1)
+
+    def powerCycle(self):
+        '''
+        Apply a pending baud rate change and clear the outputs the same as a module being switched off and on again
+        '''
+        with self.__lock__:
+            value = self.__specialregisters__[0x00FE]
+            if value < len(BAUDRATES):
+                self.__baudrate__ = BAUDRATES[value]
+            else:
+                self.__baudrate__ = 9600
+                self.__specialregisters__[0x00FE] = BAUDRATES.index(9600)
+            self.__outputvalues__ = 0
+
+    def __readregister__(self, register):
+        if 0x0080 <= register < 0x0080 + self.__numberregisters__:
+            return (self.__outputvalues__ >> ((register - 0x0080) * 16)) & 0xFFFF
+        if 0x0090 <= register < 0x0090 + self.__numberregisters__:
+            return (self.__inputvalues__ >> ((register - 0x0090) * 16)) & 0xFFFF
+        if register in self.__specialregisters__:
+            return self.__specialregisters__[register]
+        return None
+
+    def __writeregister__(self, register, value):
+        if 0x0080 <= register < 0x0080 + self.__numberregisters__:
+            shift = (register - 0x0080) * 16
+            mask = ((1 << self.__numberinputoutputs__) - 1)
+            self.__outputvalues__ = ((self.__outputvalues__ & ~(0xFFFF << shift)) | (value << shift)) & mask
+            return True
+        if register in self.__specialregisters__ and register not in [0x00F7, 0x00FD]:
+            self.__specialregisters__[register] = value
+            return True
+        return False
+
+    def __readbits__(self, bits, start, quantity):
+        values = (bits >> start) & ((1 << quantity) - 1)
+        return values.to_bytes((quantity + 7) // 8, 'little')
+
+    def handlerequest(self, request):
+        '''
+        Take a complete request frame with a valid checksum addressed to this module and return the response frame without the checksum
+        '''
+        functioncode = request[1]
+        self.requestcounts[functioncode] = self.requestcounts.get(functioncode, 0) + 1
+
+        def exception(code):
+            return bytes([self.__modbusaddress__, functioncode | 0x80, code])
+
+        address = int.from_bytes(request[2:4], 'big')
+        value = int.from_bytes(request[4:6], 'big')
+
+        if functioncode in self.unsupportedfunctioncodes:
+            return exception(EXCEPTION_ILLEGAL_FUNCTION)
+
+        with self.__lock__:
+            if functioncode in [FUNCTIONCODES['READ_DO'], FUNCTIONCODES['READ_DI']]:
+                if value < 1 or address + value > self.__numberinputoutputs__:
+                    return exception(EXCEPTION_ILLEGAL_DATA_ADDRESS)
+                bits = self.__outputvalues__
+                if functioncode == FUNCTIONCODES['READ_DI']:
+                    bits = self.__inputvalues__
+                data = self.__readbits__(bits, address, value)
+                return bytes([self.__modbusaddress__, functioncode, len(data)]) + data
+
+            if functioncode == FUNCTIONCODES['READ_SPECIAL_FUNCTION']:
+                if value < 1:
+                    return exception(EXCEPTION_ILLEGAL_DATA_VALUE)
+                data = b''
+                for register in range(address, address + value):
+                    registervalue = self.__readregister__(register)
+                    if registervalue is None:
+                        return exception(EXCEPTION_ILLEGAL_DATA_ADDRESS)
+                    data += registervalue.to_bytes(2, 'big')
+                return bytes([self.__modbusaddress__, functioncode, len(data)]) + data
+
+            if functioncode == FUNCTIONCODES['WRITE_DO']:
+                if address >= self.__numberinputoutputs__:
+                    return exception(EXCEPTION_ILLEGAL_DATA_ADDRESS)
+                if value == 0xFF00:
+                    self.__outputvalues__ |= (1 << address)
+                elif value == 0x0000:
+                    self.__outputvalues__ &= ~(1 << address)
+                else:
+                    return exception(EXCEPTION_ILLEGAL_DATA_VALUE)
+                return bytes(request[:6])
+
+            if functioncode == FUNCTIONCODES['WRITE_SPECIAL_FUNCTION']:
+                if self.__writeregister__(address, value) is False:
+                    return exception(EXCEPTION_ILLEGAL_DATA_ADDRESS)
+                return bytes(request[:6])
+
+            if functioncode == FUNCTIONCODES['WRITE_MULTIPLE_DO']:
+                bytecount = request[6]
+                if value < 1 or address + value > self.__numberinputoutputs__ or bytecount != (value + 7) // 8:
+                    return exception(EXCEPTION_ILLEGAL_DATA_ADDRESS)
+                bits = int.from_bytes(request[7:7 + bytecount], 'little') & ((1 << value) - 1)
+                mask = ((1 << value) - 1) << address
+                self.__outputvalues__ = (self.__outputvalues__ & ~mask) | (bits << address)
+                return bytes(request[:6])
+
+            if functioncode == FUNCTIONCODES['WRITE_MULTIPLE_SPECIAL_FUNCTION']:
+                bytecount = request[6]
+                if value < 1 or bytecount != value * 2:
+                    return exception(EXCEPTION_ILLEGAL_DATA_VALUE)
+                for register in range(address, address + value):
+                    if self.__readregister__(register) is None:
+                        return exception(EXCEPTION_ILLEGAL_DATA_ADDRESS)
+                for count, register in enumerate(range(address, address + value)):
+                    self.__writeregister__(register, int.from_bytes(request[7 + (count * 2):9 + (count * 2)], 'big'))
+                return bytes(request[:6])
+
+        return exception(EXCEPTION_ILLEGAL_FUNCTION)
+
+
+class SimulatedBus():
+    def __init__(self, modules=[], linedelay=None, checkbaudrate=True, ):
+        '''
+        linedelay is the time in seconds taken to put one byte on the line, None uses the time for 10 bits at the module baud rate and 0 writes the reply in one go.
+        '''
+        self.__modules__ = {}
+        self.__linedelay__ = linedelay
+        self.__checkbaudrate__ = checkbaudrate
+        self.__masterfd__ = None
+        self.__slavefd__ = None
+        self.__port__ = None
+        self.__thread__ = None
+        self.__running__ = False
+        self.__baudconstants__ = {}
+        for baudrate in BAUDRATES:
+            self.__baudconstants__[getattr(termios, f'B{baudrate}')] = baudrate
+
+        self.requests = 0
+        self.responses = 0
+        self.noisebytes = 0
+
+        for module in modules:
+            self.addModule(module)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def port(self):
+        return self.__port__
+
+    def addModule(self, module):
+        if module.modbusaddress in self.__modules__:
+            raise ValueError(f'''Modbus address {module.modbusaddress} is already used on this bus''')
+        self.__modules__[module.modbusaddress] = module
+
+    def getModule(self, modbusaddress):
+        return self.__modules__.get(modbusaddress)
+
+    def getModules(self):
+        return list(self.__modules__.values())
+
+    def start(self):
+        self.__masterfd__, self.__slavefd__ = os.openpty()
+        tty.setraw(self.__masterfd__)
+        tty.setraw(self.__slavefd__)
+        self.__port__ = os.ttyname(self.__slavefd__)
+        self.__running__ = True
+        self.__thread__ = threading.Thread(target=self.__run__, name=f'SimulatedBus {self.__port__}', daemon=True)
+        self.__thread__.start()
+
+    def stop(self):
+        self.__running__ = False
+        if self.__thread__ is not None:
+            self.__thread__.join()
+            self.__thread__ = None
+        for fd in [self.__masterfd__, self.__slavefd__]:
+            if fd is not None:
+                os.close(fd)
+        self.__masterfd__ = None
+        self.__slavefd__ = None
+
+    def __portbaudrate__(self):
+        '''
+        Baud rate the driver configured on the slave end of the pty
+        '''
+        ospeed = termios.tcgetattr(self.__slavefd__)[5]
+        return self.__baudconstants__.get(ospeed)
+
+    def __framelength__(self, buffer):
+        '''
+        Request length worked out from the function code, None when more bytes are needed to tell
+        '''
+        if len(buffer) < 2:
+            return None
+        functioncode = buffer[1]
+        if functioncode in [FUNCTIONCODES['WRITE_MULTIPLE_DO'], FUNCTIONCODES['WRITE_MULTIPLE_SPECIAL_FUNCTION']]:
+            if len(buffer) < 7:
+                return None
+            return 9 + buffer[6]
+        return 8
+
+    def __reply__(self, module, response):
+        if module.responsedelay > 0:
+            time.sleep(module.responsedelay)
+
+        if module.dropreplyrate > 0 and random.random() < module.dropreplyrate:
+            module.droppedreplies += 1
+            return None
+
+        checksum = crc16.modbus(response).to_bytes(2, 'little')
+        if module.corruptchecksumrate > 0 and random.random() < module.corruptchecksumrate:
+            module.corruptedreplies += 1
+            checksum = bytes([checksum[0] ^ 0xFF, checksum[1]])
+        frame = response + checksum
+
+        linedelay = self.__linedelay__
+        if linedelay is None:
+            linedelay = 10 / module.baudrate
+
+        if linedelay <= 0:
+            os.write(self.__masterfd__, frame)
+        else:
+            started = time.monotonic()
+            for count in range(0, len(frame)):
+                os.write(self.__masterfd__, frame[count:count + 1])
+                remaining = started + (linedelay * (count + 1)) - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+        self.responses += 1
+
+    def __handleframe__(self, frame):
+        self.requests += 1
+        module = self.__modules__.get(frame[0])
+        if module is None:
+            return None
+
+        if self.__checkbaudrate__ and self.__portbaudrate__() != module.baudrate:
+            return None
+
+        response = module.handlerequest(frame)
+        if response is not None:
+            self.__reply__(module, response)
+
+    def __run__(self):
+        buffer = bytearray()
+        lastbyteat = time.monotonic()
+        while self.__running__:
+            readable, _, _ = select.select([self.__masterfd__], [], [], 0.01)
+            now = time.monotonic()
+            if not readable:
+                if len(buffer) > 0 and now - lastbyteat > FRAME_SILENCE_TIMEOUT:
+                    self.noisebytes += len(buffer)
+                    buffer.clear()
+                continue
+
+            try:
+                data = os.read(self.__masterfd__, 1024)
+            except OSError:
+                continue
+            buffer += data
+            lastbyteat = now
+
+            while True:
+                length = self.__framelength__(buffer)
+                if length is None or len(buffer) < length:
+                    break
+                frame = bytes(buffer[:length])
+                if crc16.modbus(frame[:-2]).to_bytes(2, 'little') == frame[-2:]:
+                    del buffer[:length]
+                    self.__handleframe__(frame)
+                else:
+                    '''
+                    Resync by dropping one byte at a time until a frame with a valid checksum lines up
+                    '''
+                    self.noisebytes += 1
+                    del buffer[0]
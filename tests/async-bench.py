@@ -0,0 +1,92 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of the asyncio driver against the blocking driver run in an executor, no hardware needed.
+Prints the poll cycle time of each and how late a timer on the event loop fires while the bus is being polled.
+'''
+import sys
+import os
+import time
+import asyncio
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from multipleModuleManager import MultipleModuleManager
+from asyncModbusDIO import AsyncMultipleModuleManager
+from simulator import SimulatedBus, SimulatedModule
+from eletech23iod import MODELS
+
+
+async def timerlateness(stop):
+    '''
+    Largest delay past a 1ms sleep seen until stop is set
+    '''
+    latest = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        latest = max(latest, time.perf_counter() - started - 0.001)
+    return latest
+
+async def benchmarkasync(port, modbusaddresses, iterations):
+    async with AsyncMultipleModuleManager(port=port, modbusaddresses=modbusaddresses) as manager:
+        stop = asyncio.Event()
+        timer = asyncio.create_task(timerlateness(stop))
+        started = time.perf_counter()
+        for i in range(0, iterations):
+            await manager.pollReadInputs()
+        polltime = (time.perf_counter() - started) / iterations
+        stop.set()
+        return polltime, await timer
+
+async def benchmarkexecutor(port, modbusaddresses, iterations):
+    loop = asyncio.get_running_loop()
+    manager = await loop.run_in_executor(None, lambda: MultipleModuleManager(port=port, modbusaddresses=modbusaddresses))
+    stop = asyncio.Event()
+    timer = asyncio.create_task(timerlateness(stop))
+    started = time.perf_counter()
+    for i in range(0, iterations):
+        await loop.run_in_executor(None, manager.pollReadInputs)
+    polltime = (time.perf_counter() - started) / iterations
+    stop.set()
+    return polltime, await timer
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200, help="Number of poll cycles to time")
+    args = parser.parse_args()
+
+    modules = [SimulatedModule(modbusaddress=count + 1, model=model) for count, model in enumerate(MODELS)]
+    modbusaddresses = [module.modbusaddress for module in modules]
+    for name, benchmark in [('asyncio', benchmarkasync), ('executor', benchmarkexecutor)]:
+        with SimulatedBus(modules=modules) as bus:
+            polltime, lateness = asyncio.run(benchmark(bus.port, modbusaddresses, args.iterations))
+        print(f'''{name} poll cycle: {polltime * 1000:.2f}ms poll cycles/s: {1 / polltime:.1f} worst timer lateness: {lateness * 1000:.2f}ms''')
@@ -0,0 +1,106 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of input change detection over synthetic bitmasks for every model, no hardware needed.
+Compares the original loop over every input with walking only the set bits of the changed mask.
+'''
+import sys
+import os
+import time
+import random
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from ioState import setbitnumbers
+from eletech23iod import MODELS
+
+
+def callback(modbusaddress, input, state):
+    pass
+
+'''
+Change detection as it was before, one pass per state over every input until all changed bits are found
+'''
+def legacydetect(previous, current, numberinputoutputs):
+    def updatechangedbits(bits,state):
+        subtotal = 0
+        for i in range(0,numberinputoutputs):
+            powerof2val = pow(2,i)
+            if bits & powerof2val == powerof2val:
+                subtotal += powerof2val
+                callback( 1, i, state )
+                if bits == subtotal:
+                    break
+
+    if previous != current:
+        bitsgonehigh = ~previous & current
+        bitsgonelow = previous & ~current
+        if bitsgonehigh > 0:
+            updatechangedbits(bitsgonehigh, True)
+        if bitsgonelow > 0:
+            updatechangedbits(bitsgonelow, False)
+
+def detect(previous, current, numberinputoutputs):
+    changed = previous ^ current
+    if changed == 0:
+        return None
+    for i in setbitnumbers(changed & current):
+        callback( 1, i, True )
+    for i in setbitnumbers(changed & previous):
+        callback( 1, i, False )
+
+
+def rate(function, pairs, numberinputoutputs):
+    started = time.perf_counter()
+    for previous, current in pairs:
+        function(previous, current, numberinputoutputs)
+    return len(pairs) / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100000, help="Number of polls per test")
+    args = parser.parse_args()
+
+    random.seed(0)
+    for model in MODELS:
+        numberinputoutputs = int(str(model)[-2:])
+        allbits = (1 << numberinputoutputs) - 1
+        lastinput = 1 << (numberinputoutputs - 1)
+
+        scenarios = [
+            ('edge on last input', [(0, lastinput), (lastinput, 0)] * (args.iterations // 2)),
+            ('random inputs', [(random.getrandbits(numberinputoutputs), random.getrandbits(numberinputoutputs)) for i in range(0, args.iterations)]),
+            ('every input flips', [(0, allbits), (allbits, 0)] * (args.iterations // 2)),
+        ]
+        for name, pairs in scenarios:
+            before = rate(legacydetect, pairs, numberinputoutputs)
+            after = rate(detect, pairs, numberinputoutputs)
+            print(f'''Model: {model} {name:20} before: {before:12,.0f} polls/s after: {after:12,.0f} polls/s speedup: {after / before:.2f}x''')
@@ -0,0 +1,123 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Microbenchmark of Modbus frame encoding and decoding, no hardware needed.
+Compares the original byte concatenation frame builder with ModbusFrameCodec.
+Each rate is the best of several alternating runs of the two, a single run is easily off by 30% on a busy machine.
+'''
+import sys
+import os
+import time
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from fastcrc import crc16
+from modbusFrameCodec import FUNCTIONCODES, ModbusFrameCodec
+
+
+'''
+The frame builder and checksum check as they were before ModbusFrameCodec
+'''
+def legacyencode(modbusaddress, functioncode, address, value=None):
+    message = modbusaddress.to_bytes(1,'little') 
+    message += FUNCTIONCODES[functioncode].to_bytes(1,'little')
+    message += address.to_bytes(2,'big')[0].to_bytes(1)
+    message += address.to_bytes(2,'big')[1].to_bytes(1)
+    if value is not None:
+        message += value.to_bytes(2,'big')[0].to_bytes(1)
+        message += value.to_bytes(2,'big')[1].to_bytes(1)
+    checksum = crc16.modbus(message).to_bytes(2,'little')
+    return message + checksum
+
+def legacyencodemultiple(modbusaddress, functioncode, address, values):
+    message = modbusaddress.to_bytes(1,'little') 
+    message += FUNCTIONCODES[functioncode].to_bytes(1,'little')
+    message += address.to_bytes(2,'big')
+    message += len(values).to_bytes(2,'big')
+    message += (len(values) * 2).to_bytes(1,'big')
+    for value in values:
+        message += value.to_bytes(2,'big')
+    checksum = crc16.modbus(message).to_bytes(2,'little')
+    return message + checksum
+
+def legacydecode(data):
+    message = data[:-2]
+    checksum = data[-2:]
+    calculatedchecksum = crc16.modbus(message).to_bytes(2,'little')
+    if calculatedchecksum != checksum:
+        raise ValueError('checksum')
+    inputs = b''
+    for i in range(0, data[2] // 2):
+        inputs = data[3 + (i * 2):5 + (i * 2)] + inputs
+    return int.from_bytes(inputs, signed=False, byteorder='big')
+
+
+def rate(function, iterations):
+    started = time.perf_counter()
+    for i in range(0, iterations):
+        function()
+    return iterations / (time.perf_counter() - started)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=200000, help="Number of frames encoded and decoded per test")
+    parser.add_argument("--repeat", type=int, default=7, help="Number of runs of each test, the best one is reported")
+    args = parser.parse_args()
+
+    codec = ModbusFrameCodec(1)
+    '''
+    A 2348 input register response carrying 0x0001 0x8000 0x0055
+    '''
+    response = bytes([1, 3, 6, 0x00, 0x01, 0x80, 0x00, 0x00, 0x55])
+    response = response + crc16.modbus(response).to_bytes(2, 'little')
+
+    tests = [
+        ('encode poll frame', 
+            lambda: legacyencode(1, 'READ_SPECIAL_FUNCTION', 0x0090, 0x0003),
+            lambda: codec.encode('READ_SPECIAL_FUNCTION', 0x0090, 0x0003)),
+        ('encode register write', 
+            lambda: legacyencode(1, 'WRITE_SPECIAL_FUNCTION', 0x0080, 0x1234),
+            lambda: codec.encode('WRITE_SPECIAL_FUNCTION', 0x0080, 0x1234)),
+        ('encode 3 register write', 
+            lambda: legacyencodemultiple(1, 'WRITE_MULTIPLE_SPECIAL_FUNCTION', 0x0080, [0x1234, 0x5678, 0x9ABC]),
+            lambda: codec.encode('WRITE_MULTIPLE_SPECIAL_FUNCTION', 0x0080, [0x1234, 0x5678, 0x9ABC])),
+        ('decode 3 register response', 
+            lambda: legacydecode(response),
+            lambda: codec.validate(response) and codec.decoderegisters(response)),
+    ]
+
+    for name, before, after in tests:
+        beforerate = 0
+        afterrate = 0
+        for i in range(0, args.repeat):
+            beforerate = max(beforerate, rate(before, args.iterations))
+            afterrate = max(afterrate, rate(after, args.iterations))
+        print(f'''{name:28} before: {beforerate:12,.0f} frames/s after: {afterrate:12,.0f} frames/s speedup: {afterrate / beforerate:.2f}x''')
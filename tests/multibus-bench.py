@@ -0,0 +1,76 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of the poll rate of the same modules split over one or more simulated buses, no hardware needed.
+Prints the poll cycles per second of every module for each number of buses, the rate should grow about linearly with the number of buses.
+'''
+import sys
+import os
+import time
+import argparse
+from contextlib import ExitStack
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from multiBusManager import MultiBusManager
+from simulator import SimulatedBus, SimulatedModule
+
+
+def benchmark(numbermodules, numberbuses, iterations, baudrate, responsedelay):
+    with ExitStack() as stack:
+        buses = {}
+        for bus in range(0, numberbuses):
+            modules = [SimulatedModule(modbusaddress=modbusaddress, model=2332, baudrate=baudrate, responsedelay=responsedelay) for modbusaddress in range(bus + 1, numbermodules + 1, numberbuses)]
+            simulatedbus = stack.enter_context(SimulatedBus(modules=modules))
+            buses[simulatedbus.port] = [module.modbusaddress for module in modules]
+
+        manager = MultiBusManager(buses, desiredbaudrate=baudrate)
+        started = time.perf_counter()
+        for i in range(0, iterations):
+            manager.pollReadInputs()
+        polltime = (time.perf_counter() - started) / iterations
+        manager.close()
+        return polltime
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=24, help="Number of modules to split over the buses")
+    parser.add_argument("--buses", type=int, default=4, help="Largest number of buses to try")
+    parser.add_argument("--iterations", type=int, default=20, help="Number of poll cycles to time")
+    parser.add_argument("--baudrate", type=int, default=9600, help="Baud rate of the simulated modules")
+    parser.add_argument("--responsedelay", type=float, default=0.001, help="Seconds a module waits before it replies")
+    args = parser.parse_args()
+
+    single = None
+    for numberbuses in range(1, args.buses + 1):
+        polltime = benchmark(args.modules, numberbuses, args.iterations, args.baudrate, args.responsedelay)
+        if single is None:
+            single = polltime
+        print(f'''buses: {numberbuses} modules: {args.modules} poll cycles/s: {1 / polltime:.1f} poll cycle: {polltime * 1000:.2f}ms speedup: {single / polltime:.2f}''')
@@ -0,0 +1,98 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Check of the output write paths against the simulator, no hardware needed.
+Prints each case and exits with status 1 when one of them leaves the module outputs other than expected.
+
+Notes:
+    A batch naming outputs in registers that are not adjacent must not rewrite the register between them, it may hold outputs switched on before startup that the module never acknowledged.
+    A bulk write must not be overwritten by an older change still waiting in the coalescing window.
+'''
+import sys
+import os
+import time
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from multipleModuleManager import MultipleModuleManager
+from simulator import SimulatedBus, SimulatedModule
+from busScheduler import PRIORITY_SCHEDULED
+
+
+def check(name, module, expected):
+    print(f'''{name}: outputs {module.outputs:#x} expected {expected:#x} {'ok' if module.outputs == expected else 'FAILED'}''')
+    return module.outputs == expected
+
+
+def nonadjacentregisters():
+    '''
+    Output 20 in register 1 of a 2348 is on before startup and the readback is not supported, registers 0 and 2 are known from earlier writes
+    '''
+    module = SimulatedModule(1, 2348, unsupportedfunctioncodes=[0x01])
+    module.setOutputs(1 << 20)
+    results = []
+    with SimulatedBus([module]) as bus:
+        manager = MultipleModuleManager(port=bus.port, modbusaddresses=[1], outputpollmode='READ_DO')
+        dio = manager.getModule(1)
+        dio.updateOutputsByChanges([ (output, False) for output in list(range(0, 16)) + list(range(32, 48)) ])
+
+        dio.updateOutputsByChanges([ (0, True), (40, True) ])
+        results.append( check('batch in registers 0 and 2', module, (1 << 40) | (1 << 20) | 1) )
+
+        dio.reassertoutputs(registers=[0, 2])
+        results.append( check('reassert of registers 0 and 2', module, (1 << 40) | (1 << 20) | 1) )
+        manager.close()
+    return all(results)
+
+
+def bulkaftercoalesced():
+    module = SimulatedModule(1, 2332)
+    results = []
+    with SimulatedBus([module]) as bus:
+        manager = MultipleModuleManager(port=bus.port, modbusaddresses=[1], threaded=True, coalescewindow=0.2)
+
+        future = manager.updateOutputFuture(1, 5, True)
+        manager.updateOutputsByList(1, [False] * module.numberinputoutputs)
+        future.result()
+        time.sleep(0.3)
+        results.append( check('list after a pending change', module, 0) )
+
+        future = manager.updateOutputFuture(1, 6, True, priority=PRIORITY_SCHEDULED)
+        manager.updateOutputsByHexStr(1, '1')
+        future.result()
+        time.sleep(0.3)
+        results.append( check('hex after a pending scheduled change', module, 1) )
+        manager.close()
+    return all(results)
+
+
+if __name__ == '__main__':
+    results = [ nonadjacentregisters(), bulkaftercoalesced() ]
+    if not all(results):
+        sys.exit(1)
@@ -0,0 +1,95 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Benchmark of reading the IO state while the buses are polled, MultiBusManager with a polling thread against ProcessBusManager with a worker process per bus, no hardware needed.
+Prints the rate of getInputs over every module in this process and the mean and worst time of one getInputs, the simulated buses run in this process as well.
+'''
+import sys
+import os
+import time
+import threading
+import argparse
+from contextlib import ExitStack
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from multiBusManager import MultiBusManager
+from processBusManager import ProcessBusManager
+from simulator import SimulatedBus, SimulatedModule
+
+
+def benchmark(managerclass, numbermodules, numberbuses, duration, baudrate):
+    with ExitStack() as stack:
+        buses = {}
+        for bus in range(0, numberbuses):
+            modules = [SimulatedModule(modbusaddress=modbusaddress, model=2348, baudrate=baudrate) for modbusaddress in range(bus + 1, numbermodules + 1, numberbuses)]
+            simulatedbus = stack.enter_context(SimulatedBus(modules=modules))
+            buses[simulatedbus.port] = [module.modbusaddress for module in modules]
+
+        manager = managerclass(buses, desiredbaudrate=baudrate)
+        running = True
+
+        def poll():
+            while running:
+                manager.pollReadInputs()
+
+        poller = None
+        if managerclass is MultiBusManager:
+            poller = threading.Thread(target=poll)
+            poller.start()
+
+        modbusaddresses = manager.getModbusAddresses()
+        reads = 0
+        worst = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            for modbusaddress in modbusaddresses:
+                readstarted = time.perf_counter()
+                manager.getInputs(modbusaddress)
+                worst = max(worst, time.perf_counter() - readstarted)
+                reads += 1
+        elapsed = time.perf_counter() - started
+
+        running = False
+        if poller is not None:
+            poller.join()
+        manager.close()
+        return reads / elapsed, elapsed / reads, worst
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=8, help="Number of modules to split over the buses")
+    parser.add_argument("--buses", type=int, default=2, help="Number of buses")
+    parser.add_argument("--duration", type=float, default=3, help="Seconds to read for")
+    parser.add_argument("--baudrate", type=int, default=115200, help="Baud rate of the simulated modules")
+    args = parser.parse_args()
+
+    for managerclass in (MultiBusManager, ProcessBusManager):
+        rate, mean, worst = benchmark(managerclass, args.modules, args.buses, args.duration, args.baudrate)
+        print(f'''{managerclass.__name__}: buses: {args.buses} modules: {args.modules} getInputs/s: {rate:.0f} mean: {mean * 1000000:.0f}us worst: {worst * 1000:.2f}ms''')
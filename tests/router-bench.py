@@ -0,0 +1,105 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of routing incoming MQTT topics, no broker needed.
+Prints messages dispatched per second by a linear scan over the output configurations, as on_mqtt_message used to do, and by TopicRouter for 1k and 10k configured topics.
+'''
+import sys
+import os
+import time
+import random
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from topicRouter import TopicRouter
+
+
+def configurations(count):
+    '''
+    Output configurations like the GPIO sections of config.ini, two topics each
+    '''
+    gpioConfigs = []
+    for i in range(0, count // 2):
+        gpioConfigs.append( {
+                                'MQTT_TOPICS':  [f'''home/room{i // 8}/relay{i % 8}/set''', f'''scene/{i}/set'''],
+                                'GPIO_TYPE':    'OUTPUT',
+                                'MODBUS_ADDR':  1 + i // 48,
+                                'MODBUS_IO':    i % 48,
+                            } )
+    return gpioConfigs
+
+
+def linear(gpioConfigs, topics):
+    started = time.perf_counter()
+    for topic in topics:
+        for gpioConfig in gpioConfigs:
+            if topic in gpioConfig['MQTT_TOPICS'] and gpioConfig['GPIO_TYPE'] == 'OUTPUT':
+                break
+    return len(topics) / (time.perf_counter() - started)
+
+
+def routed(router, topics):
+    started = time.perf_counter()
+    for topic in topics:
+        for handler in router.match(topic):
+            break
+    return len(topics) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MQTT topic routing benchmark')
+    parser.add_argument('--messages', type=int, default=20000, help='Messages dispatched per run')
+    parser.add_argument('--wildcards', type=int, default=16, help='Wildcard subscriptions added to the router')
+    args = parser.parse_args()
+
+    for count in [1000, 10000]:
+        gpioConfigs = configurations(count)
+        allTopics = [topic for gpioConfig in gpioConfigs for topic in gpioConfig['MQTT_TOPICS']]
+        topics = [random.choice(allTopics) for i in range(0, args.messages)]
+
+        router = TopicRouter()
+        for gpioConfig in gpioConfigs:
+            for topic in gpioConfig['MQTT_TOPICS']:
+                router.add(topic, gpioConfig)
+
+        wildcardRouter = TopicRouter()
+        for i in range(0, args.wildcards):
+            wildcardRouter.add(f'''home/room{i}/+/set''', i)
+        wildcardRouter.add('scene/#', None)
+        for gpioConfig in gpioConfigs:
+            for topic in gpioConfig['MQTT_TOPICS']:
+                wildcardRouter.add(topic, gpioConfig)
+
+        scanMessages = min(args.messages, 200000 // count)
+        print(f'''{count} topics: linear scan {linear(gpioConfigs, topics[:scanMessages]):.0f}/s, exact router {routed(router, topics):.0f}/s, with {args.wildcards + 1} wildcards {routed(wildcardRouter, topics):.0f}/s''')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of output command latency while the bus is busy polling, no hardware needed.
+Commands arrive at random times during a single threaded poll loop. Without a betweencallback a command waits for the rest of the poll sweep, with one it is sent between two polls.
+With threaded the commands are sent from their own thread like the paho network thread in mqtt.py and the worker thread sends them between two polls.
+'''
+import sys
+import os
+import time
+import random
+import argparse
+import threading
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from multipleModuleManager import MultipleModuleManager
+from simulator import SimulatedBus, SimulatedModule
+
+
+def benchmark(numbermodules, commands, responsedelay, mode):
+    modules = [SimulatedModule(modbusaddress=count + 1, model=2332, responsedelay=responsedelay) for count in range(0, numbermodules)]
+    with SimulatedBus(modules=modules) as bus:
+        arrivals = []
+        latencies = []
+
+        def service():
+            '''
+            Stands in for client.loop(), sends every command that has arrived
+            '''
+            now = time.perf_counter()
+            while arrivals and arrivals[0][0] <= now:
+                arrivedat, modbusaddress, output = arrivals.pop(0)
+                manager.updateOutput(modbusaddress, output, True)
+                latencies.append(time.perf_counter() - arrivedat)
+
+        def commander():
+            while arrivals:
+                time.sleep(max(0, arrivals[0][0] - time.perf_counter()))
+                service()
+
+        manager = MultipleModuleManager(port=bus.port, modbusaddresses=[module.modbusaddress for module in modules], betweencallback=service if mode == 'between' else None, threaded=mode == 'threaded')
+
+        random.seed(1)
+        started = time.perf_counter()
+        sweep = numbermodules * (responsedelay + 0.001)
+        arrivals = sorted((started + random.uniform(0, commands * sweep), random.randint(1, numbermodules), random.randint(0, 31)) for count in range(0, commands))
+        if mode == 'threaded':
+            thread = threading.Thread(target=commander)
+            thread.start()
+            while thread.is_alive():
+                manager.pollReadInputs()
+            manager.close()
+        else:
+            while arrivals:
+                manager.pollReadInputs()
+                service()
+
+        latencies.sort()
+        return latencies, manager.getSchedulerStats()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=8, help="Number of modules on the bus")
+    parser.add_argument("--commands", type=int, default=100, help="Number of output commands to send")
+    parser.add_argument("--responsedelay", type=float, default=0.005, help="Seconds a module waits before it replies")
+    args = parser.parse_args()
+
+    for mode in ['sweep', 'between', 'threaded']:
+        latencies, stats = benchmark(args.modules, args.commands, args.responsedelay, mode)
+        print(f'''{mode} command latency median: {latencies[len(latencies) // 2] * 1000:.2f}ms 95th percentile: {latencies[int(len(latencies) * 0.95)] * 1000:.2f}ms maximum: {latencies[-1] * 1000:.2f}ms''')
+        for name, priority in stats['priorities'].items():
+            if priority['submitted']:
+                print(f'''    {name} submitted: {priority['submitted']} expired: {priority['expired']} mean wait: {priority['meanwait']:.3f}ms maximum wait: {priority['maximumwait']:.3f}ms''')
+        print(f'''    maximum queue depth: {stats['maximumdepth']}''')
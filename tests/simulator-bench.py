@@ -0,0 +1,93 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of the driver against the simulator, no hardware needed.
+Prints poll cycles per second and poll cycle latency for each model and for all models sharing one bus.
+'''
+import sys
+import os
+import time
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from multipleModuleManager import MultipleModuleManager
+from simulator import SimulatedBus, SimulatedModule
+from eletech23iod import MODELS, INPUTPOLLMODES
+
+
+def benchmark(modules, iterations, baudrate, linedelay=None, inputpollmode=None):
+    with SimulatedBus(modules=modules, linedelay=linedelay) as bus:
+        modbusaddresses = [module.modbusaddress for module in modules]
+
+        started = time.perf_counter()
+        manager = MultipleModuleManager(port=bus.port, desiredbaudrate=baudrate, modbusaddresses=modbusaddresses, inputpollmode=inputpollmode)
+        startup = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(0, iterations):
+            manager.pollReadInputs()
+        polltime = (time.perf_counter() - started) / iterations
+
+        started = time.perf_counter()
+        for i in range(0, iterations):
+            manager.updateOutput(modbusaddresses[0], i % modules[0].numberinputoutputs, i % 2 == 0)
+        writetime = (time.perf_counter() - started) / iterations
+
+        return startup, polltime, writetime, bus.requests
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=100, help="Number of poll cycles and output writes to time")
+    parser.add_argument("--baudrate", type=int, default=115200, help="Baud rate of the simulated modules")
+    parser.add_argument("--linedelay", type=float, default=None, help="Seconds per byte on the line, default is derived from the baud rate")
+    parser.add_argument("--inputpollmode", default=None, choices=INPUTPOLLMODES, help="How the inputs are read, default is chosen per model")
+    parser.add_argument("--responsedelay", type=float, default=0.0, help="Seconds a module waits before it replies")
+    parser.add_argument("--corruptchecksumrate", type=float, default=0.0, help="Fraction of replies sent with a bad checksum")
+    parser.add_argument("--dropreplyrate", type=float, default=0.0, help="Fraction of replies that are never sent")
+    args = parser.parse_args()
+
+    def makemodule(modbusaddress, model):
+        return SimulatedModule(
+                                modbusaddress=modbusaddress,
+                                model=model,
+                                baudrate=args.baudrate,
+                                responsedelay=args.responsedelay,
+                                corruptchecksumrate=args.corruptchecksumrate,
+                                dropreplyrate=args.dropreplyrate,
+                                )
+
+    for model in MODELS:
+        startup, polltime, writetime, requests = benchmark([makemodule(1, model)], args.iterations, args.baudrate, args.linedelay, args.inputpollmode)
+        print(f'''Model: {model} startup: {startup * 1000:.1f}ms poll cycles/s: {1 / polltime:.1f} poll cycle: {polltime * 1000:.2f}ms single output writes/s: {1 / writetime:.1f} requests: {requests}''')
+
+    modules = [makemodule(count + 1, model) for count, model in enumerate(MODELS)]
+    startup, polltime, writetime, requests = benchmark(modules, args.iterations, args.baudrate, args.linedelay, args.inputpollmode)
+    print(f'''Models: {MODELS} on one bus startup: {startup * 1000:.1f}ms poll cycles/s: {1 / polltime:.1f} poll cycle: {polltime * 1000:.2f}ms single output writes/s: {1 / writetime:.1f} requests: {requests}''')
@@ -0,0 +1,78 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of rendering MQTT messages from the config.ini templates, no broker needed.
+Prints messages rendered per second by the chain of str.replace mqtt.py used to do and by MessageTemplate.
+'''
+import sys
+import os
+import time
+import datetime
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from messageTemplate import MessageTemplate
+
+MQTT_MESSAGE = '{"ModbusAddress": {MODBUSADDRESS}, "Input": {INPUT}, "State": "{STATE}", "UTCtimestamp": {UTCTIMESTAMP}, "updatedat":"{UPDATEDAT}"}'
+
+
+def replaced(messages):
+    started = time.perf_counter()
+    for i in range(0, messages):
+        nowObj = datetime.datetime.now(datetime.UTC)
+        MQTT_MESSAGE. \
+                replace('{MODBUSADDRESS}', str(1)). \
+                replace('{INPUT}', str(i % 48)). \
+                replace('{STATE}', 'on'). \
+                replace('{UTCTIMESTAMP}', str(nowObj.timestamp())). \
+                replace('{UPDATEDAT}', nowObj.strftime("%Y-%m-%d-%H:%M:%S.%f"))
+    return messages / (time.perf_counter() - started)
+
+
+def rendered(messages):
+    template = MessageTemplate(MQTT_MESSAGE)
+    started = time.perf_counter()
+    for i in range(0, messages):
+        nowObj = datetime.datetime.now(datetime.UTC)
+        template.render(1, i % 48, 'on', nowObj)
+    return messages / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MQTT message template benchmark')
+    parser.add_argument('--messages', type=int, default=200000, help='Messages rendered per run')
+    args = parser.parse_args()
+
+    print(f'''str.replace chain {replaced(args.messages):.0f} messages/s''')
+    print(f'''MessageTemplate {rendered(args.messages):.0f} messages/s''')
+
+
+if __name__ == '__main__':
+    main()
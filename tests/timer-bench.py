@@ -0,0 +1,92 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+
+Benchmark of the timers for scheduled output changes, no hardware needed.
+Prints the cost to schedule and cancel timers with many pending, the CPU used while they wait and how late timers fire.
+'''
+import sys
+import os
+import time
+import random
+import resource
+import argparse
+
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(parent_dir)
+from timerEngine import TimerEngine
+
+
+def cputime():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scheduled output timer benchmark')
+    parser.add_argument('--timers', type=int, default=100000, help='Pending timers')
+    parser.add_argument('--idle', type=float, default=2.0, help='Seconds to measure the CPU used while the timers wait')
+    parser.add_argument('--fire', type=int, default=100, help='Timers fired to measure how late they are')
+    args = parser.parse_args()
+
+    late = []
+    engine = TimerEngine(fire=lambda key, value, timestamp: late.append(time.time() - timestamp))
+    engine.start()
+
+    now = time.time()
+    started = time.perf_counter()
+    for i in range(0, args.timers):
+        engine.schedule((1 + i // 48, i % 48), now + 3600 + random.random() * 3600, 'off')
+    schedule = (time.perf_counter() - started) / args.timers
+
+    started = time.perf_counter()
+    for i in range(0, args.timers, 2):
+        engine.schedule((1 + i // 48, i % 48), now + 3600 + random.random() * 3600, 'on')
+    replace = (time.perf_counter() - started) / len(range(0, args.timers, 2))
+
+    started = time.perf_counter()
+    for i in range(1, args.timers, 4):
+        engine.cancel((1 + i // 48, i % 48))
+    cancel = (time.perf_counter() - started) / len(range(1, args.timers, 4))
+
+    print(f'''{len(engine)} pending: schedule {schedule * 1e6:.2f} us, replace {replace * 1e6:.2f} us, cancel {cancel * 1e6:.2f} us''')
+
+    started = cputime()
+    time.sleep(args.idle)
+    print(f'''CPU while waiting {(cputime() - started) / args.idle * 100:.3f}%''')
+
+    for i in range(0, args.fire):
+        engine.schedule(('fire', i), time.time() + 0.001 + random.random() * 0.5, 'on')
+    time.sleep(0.6)
+    engine.stop()
+    late.sort()
+    print(f'''fired {len(late)} timers late by median {late[len(late) // 2] * 1000:.3f} ms, maximum {late[-1] * 1000:.3f} ms''')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Timers for scheduled output changes
+
+Notes:
+    A DelayAction schedules an output change for a time given as a UTC timestamp. TimerEngine keeps the pending timers in a heap ordered by their deadline on the monotonic clock, so adding a timer is O(log n) and the next one due is always at the top.
+    Each timer has a key, for mqtt.py the (modbus address, output), and scheduling a key that has a timer replaces it. The replaced or cancelled timer is only marked in the dict of keys and dropped when it reaches the top of the heap, the heap is rebuilt when more than half of it is dropped timers.
+    The engine thread waits on a condition until the deadline at the top of the heap, or until a timer earlier than it is added, and then calls fire(key, value, timestamp) for each timer due. It wakes for nothing else, so pending timers cost no time while they wait however many there are.
+    The deadline is the UTC timestamp moved to the monotonic clock when the timer is added, so a change of the wall clock after that does not move it.
+'''
+
+import heapq
+import threading
+import time
+
+COMPACT_MINIMUM = 64
+
+
+class TimerEngine():
+    def __init__(self, fire, ):
+        '''
+        fire(key, value, timestamp) is called on the engine thread for each timer when it is due, in order of deadline
+        '''
+        self.__fire__ = fire
+        self.__heap__ = []
+        self.__timers__ = {}
+        self.__sequence__ = 0
+        self.__dropped__ = 0
+        self.__condition__ = threading.Condition()
+        self.__thread__ = None
+        self.__running__ = False
+
+        self.scheduled = 0
+        self.cancelled = 0
+        self.fired = 0
+        self.failures = 0
+
+    def __len__(self):
+        with self.__condition__:
+            return len(self.__timers__)
+
+    def start(self, name='TimerEngine'):
+        with self.__condition__:
+            if self.__thread__ is not None:
+                return None
+            self.__running__ = True
+            self.__thread__ = threading.Thread(target=self.__run__, name=name, daemon=True)
+        self.__thread__.start()
+
+    def stop(self, timeout=None):
+        '''
+        Stop the thread, the pending timers are kept and not fired
+        '''
+        with self.__condition__:
+            if self.__thread__ is None:
+                return None
+            self.__running__ = False
+            self.__condition__.notify()
+        self.__thread__.join(timeout)
+        self.__thread__ = None
+
+    def schedule(self, key, timestamp, value, createdat=None):
+        '''
+        Fire value for key at the UTC timestamp timestamp, replacing the timer key had
+        '''
+        now = time.time()
+        if createdat is None:
+            createdat = now
+        deadline = time.monotonic() + (timestamp - now)
+        with self.__condition__:
+            self.__drop__(key)
+            timer = [deadline, self.__sequence__, key, timestamp, createdat, value, True]
+            self.__sequence__ += 1
+            heapq.heappush(self.__heap__, timer)
+            self.__timers__[key] = timer
+            self.scheduled += 1
+            if self.__heap__[0] is timer:
+                self.__condition__.notify()
+
+    def cancel(self, key):
+        '''
+        Remove the timer of key, False when it had none
+        '''
+        with self.__condition__:
+            if self.__drop__(key):
+                self.cancelled += 1
+                return True
+            return False
+
+    def __drop__(self, key):
+        '''
+        Mark the timer of key as dropped, called holding the condition
+        '''
+        timer = self.__timers__.pop(key, None)
+        if timer is None:
+            return False
+        timer[6] = False
+        self.__dropped__ += 1
+        if self.__dropped__ > COMPACT_MINIMUM and self.__dropped__ * 2 > len(self.__heap__):
+            self.__heap__ = [timer for timer in self.__heap__ if timer[6]]
+            heapq.heapify(self.__heap__)
+            self.__dropped__ = 0
+        return True
+
+    def __top__(self):
+        '''
+        The first timer still pending, called holding the condition
+        '''
+        while self.__heap__ and not self.__heap__[0][6]:
+            heapq.heappop(self.__heap__)
+            self.__dropped__ -= 1
+        if self.__heap__:
+            return self.__heap__[0]
+        return None
+
+    def untilnext(self):
+        '''
+        Seconds until the next timer is due, None when there is none
+        '''
+        with self.__condition__:
+            timer = self.__top__()
+            if timer is None:
+                return None
+            return max(0.0, timer[0] - time.monotonic())
+
+    def pending(self, limit=None, keys=None):
+        '''
+        [(key, timestamp, createdat, value)] of the pending timers in order of deadline, the first limit of them for a limit
+        keys(key) selects the timers to list
+        '''
+        with self.__condition__:
+            timers = [timer for timer in self.__timers__.values() if keys is None or keys(timer[2])]
+        if limit is None:
+            timers.sort()
+        else:
+            timers = heapq.nsmallest(limit, timers)
+        return [(key, timestamp, createdat, value) for deadline, sequence, key, timestamp, createdat, value, active in timers]
+
+    def __due__(self, now):
+        '''
+        Remove and return the timers due by now, called holding the condition
+        '''
+        due = []
+        while True:
+            timer = self.__top__()
+            if timer is None or timer[0] > now:
+                break
+            heapq.heappop(self.__heap__)
+            del self.__timers__[timer[2]]
+            due.append(timer)
+        return due
+
+    def __run__(self):
+        while True:
+            with self.__condition__:
+                while self.__running__:
+                    now = time.monotonic()
+                    due = self.__due__(now)
+                    if due:
+                        break
+                    timer = self.__top__()
+                    timeout = None
+                    if timer is not None:
+                        timeout = timer[0] - now
+                    self.__condition__.wait(timeout)
+                if not self.__running__:
+                    break
+
+            for deadline, sequence, key, timestamp, createdat, value, active in due:
+                self.fired += 1
+                try:
+                    self.__fire__(key, value, timestamp)
+                except Exception:
+                    self.failures += 1
+
+    def stats(self):
+        with self.__condition__:
+            return {
+                    'pending':      len(self.__timers__),
+                    'heap':         len(self.__heap__),
+                    'scheduled':    self.scheduled,
+                    'cancelled':    self.cancelled,
+                    'fired':        self.fired,
+                    'failures':     self.failures,
+                    }
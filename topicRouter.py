@@ -0,0 +1,121 @@
+'''
+BSD 2-Clause License
+
+Copyright (c) 2024, bravobravo-au https://github.com/bravobravo-au/rs485-relay-module
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+1. Redistributions of source code must retain the above copyright notice, this
+   list of conditions and the following disclaimer.
+
+2. Redistributions in binary form must reproduce the above copyright notice,
+   this list of conditions and the following disclaimer in the documentation
+   and/or other materials provided with the distribution.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+rs485-relay-module for MODBUS relays from eletechsup 
+Documentation from https://485io.com/eletechsup/23IOA08_23IOB16_23IOC24_23IOD32_23IOE48.rar
+Routing of incoming MQTT topics to their handlers
+
+Notes:
+    Every configured output, command and status topic is added once when the configuration is read. A topic that has no wildcard is a key of a dict, so a message on it finds its handlers in one lookup however many outputs are configured.
+    Subscriptions with + or # are kept in a trie of topic levels. A message walks the trie one level at a time, following the exact level, + and #, so the cost grows with the depth of the topic and not the number of subscriptions.
+    The handlers of a topic are returned in the order they were added, from the exact dict and the trie together, so the first configuration in the file still wins.
+    As in MQTT a # also matches the level above it, a/# matches a, and topics starting with $ are not matched by a wildcard in the first level.
+'''
+
+
+class TopicNode():
+    __slots__ = ('children', 'handlers', 'multilevel', )
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = []
+        self.multilevel = []
+
+
+class TopicRouter():
+    def __init__(self, ):
+        self.__exact__ = {}
+        self.__root__ = TopicNode()
+        self.__wildcards__ = 0
+        self.__sequence__ = 0
+
+    def __len__(self):
+        return sum(len(handlers) for handlers in self.__exact__.values()) + self.__wildcards__
+
+    def add(self, subscription, handler):
+        '''
+        handler is returned by match for every topic the subscription matches
+        '''
+        entry = (self.__sequence__, handler)
+        self.__sequence__ += 1
+
+        if '+' not in subscription and '#' not in subscription:
+            self.__exact__.setdefault(subscription, []).append(entry)
+            return None
+
+        levels = subscription.split('/')
+        node = self.__root__
+        for index, level in enumerate(levels):
+            if level == '#':
+                if index != len(levels) - 1:
+                    raise ValueError(f'''# must be the last level of the MQTT subscription {subscription}''')
+                node.multilevel.append(entry)
+                break
+            if ('#' in level or '+' in level) and level != '+':
+                raise ValueError(f'''Wildcard must fill the whole level of the MQTT subscription {subscription}''')
+            node = node.children.setdefault(level, TopicNode())
+        else:
+            node.handlers.append(entry)
+        self.__wildcards__ += 1
+
+    def match(self, topic):
+        '''
+        The handlers of every subscription matching topic, in the order they were added
+        '''
+        exact = self.__exact__.get(topic)
+        if self.__wildcards__ == 0:
+            if exact is None:
+                return []
+            return [handler for sequence, handler in exact]
+
+        entries = []
+        if exact is not None:
+            entries.extend(exact)
+
+        levels = topic.split('/')
+        nodes = [self.__root__]
+        for index, level in enumerate(levels):
+            following = []
+            for node in nodes:
+                if index > 0 or not level.startswith('$'):
+                    entries.extend(node.multilevel)
+                    child = node.children.get('+')
+                    if child is not None:
+                        following.append(child)
+                child = node.children.get(level)
+                if child is not None:
+                    following.append(child)
+            nodes = following
+            if not nodes:
+                break
+        else:
+            for node in nodes:
+                entries.extend(node.handlers)
+                entries.extend(node.multilevel)
+
+        if exact is None or len(entries) > len(exact):
+            entries.sort(key=lambda entry: entry[0])
+        return [handler for sequence, handler in entries]